@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Iterator, Mapping, Optional
 
 class SignalStatus(Enum):
     """
@@ -7,3 +8,32 @@ class SignalStatus(Enum):
     NORMAL = "NORMAL"
     PAUSED = "PAUSED"
     CANCELLED = "CANCELLED"
+
+
+# 整个 trace 的信号对应的路径前缀
+TRACE_SIGNAL_PREFIX = "/"
+
+
+def subtree_prefix(node_path: Optional[str], task_id: str) -> str:
+    """节点作为子树根时的路径前缀，即其子节点的 node_path"""
+    return f"{node_path or TRACE_SIGNAL_PREFIX}{task_id}/"
+
+
+def ancestor_prefixes(path: str) -> Iterator[str]:
+    """由近及远列出 path 的所有前缀："/a/b/" -> "/a/b/", "/a/", "/" """
+    end = len(path)
+    while end > 0:
+        yield path[:end]
+        end = path.rfind("/", 0, end - 1) + 1
+
+
+def resolve_subtree_signal(signals: Mapping[str, str], path: str) -> Optional[str]:
+    """
+    按祖先前缀由近及远查找节点的信号，path 为节点自身的子树前缀
+    写入子树信号时会清除其下更深的前缀，因此最近的一条即最新的信号
+    """
+    for prefix in ancestor_prefixes(path):
+        signal = signals.get(prefix)
+        if signal is not None:
+            return signal
+    return None
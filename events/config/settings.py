@@ -72,6 +72,28 @@ class Settings(BaseSettings):
     task_timeout_sec: int = 300
     pending_timeout_sec: int = 3600
 
+    # Worker 汇报组提交配置
+    ingest_window_ms: int = 5       # 合并窗口（毫秒），0 表示只合并已排队的汇报
+    ingest_max_batch: int = 500     # 单批最多处理的事件数
+
+    # Redis Stream 事件总线消费配置
+    event_bus_read_count: int = 100         # 每次 XREADGROUP 最多读取的条数
+    event_bus_block_ms: int = 1000          # XREADGROUP 阻塞等待时长（毫秒）
+    event_bus_consumers: int = 1            # 每个订阅并行的消费者协程数，大于 1 时不保证全局顺序
+    event_bus_consumer_name: str = ""       # 消费者名前缀，需在重启间保持稳定，为空使用主机名
+    event_bus_claim_idle_ms: int = 60000    # 超过该时长未确认的消息由 XAUTOCLAIM 接管
+
+    # Agent 监控配置
+    agent_metric_flush_interval_sec: float = 5.0   # 日结统计先在内存中聚合，按该间隔批量写库
+    agent_duration_cache_ttl_sec: int = 300        # 任务平均耗时的本地缓存有效期（秒），过期后后台刷新
+
+    # 控制信号广播频道（tasks 服务订阅该频道维护本地信号表）
+    signal_channel: str = "trace_signals"
+
+    # WebSocket 推送配置
+    ws_send_queue_size: int = 256       # 每个连接的待发送消息上限，超过视为慢消费者并断开
+    ws_send_timeout_sec: float = 10.0   # 单条消息发送超时（秒），超时视为慢消费者并断开
+
     # 私有属性 - 使用 PrivateAttr
     _observer: Observer = PrivateAttr(default=None)
     _full_config_path: str = PrivateAttr(default=None)
@@ -6,11 +6,13 @@ from config.settings import settings
 from external.cache.redis_impl import RedisCacheClient
 from external.events.bus_impl_memory import MemoryEventBus
 from external.events.bus_impl_redis import RedisEventBus
+from external.events.fanout_impl_redis import RedisTraceFanout
 
 from external.db.base import EventDefinitionRepository, EventInstanceRepository, AgentTaskHistoryRepository, AgentDailyMetricRepository
 from external.db.impl import create_event_instance_repo, create_event_definition_repo, create_agent_task_history_repo, create_agent_daily_metric_repo
-from external.db.session import get_db_session, dialect
+from external.db.session import get_db_session, dialect, async_session
 from services.lifecycle_service import LifecycleService
+from services.event_ingestor import ExecutionEventIngestor
 from services.signal_service import SignalService
 from services.observer_service import ObserverService
 from services.agent_monitor_service import AgentMonitorService
@@ -70,7 +72,10 @@ def get_agent_daily_metric_repo(
 # ==============================
 
 # 创建单例的ConnectionManager实例
-connection_manager_instance = ConnectionManager()
+# 使用 Redis 时经 Pub/Sub 按 trace 跨副本转发，浏览器连到任意副本都能收到推送
+connection_manager_instance = ConnectionManager(
+    fanout=RedisTraceFanout(settings.redis_url) if settings.use_redis else None
+)
 
 def get_connection_manager() -> ConnectionManager:
     """
@@ -95,6 +100,25 @@ def get_lifecycle_service(
 
 
 
+# Worker 汇报的组提交写入器（单例，跨请求合并）
+_execution_ingestor_instance = None
+
+def get_execution_ingestor() -> ExecutionEventIngestor:
+    """
+    返回 Worker 汇报组提交写入器（单例模式）
+    """
+    global _execution_ingestor_instance
+    if _execution_ingestor_instance is None:
+        _execution_ingestor_instance = ExecutionEventIngestor(
+            lifecycle_svc=LifecycleService(event_bus=get_broker(), cache=get_cache()),
+            session_factory=async_session,
+            window_ms=settings.ingest_window_ms,
+            max_batch=settings.ingest_max_batch,
+        )
+    return _execution_ingestor_instance
+
+
+
 def get_signal_service(
     cache: RedisCacheClient = Depends(get_cache),
 ) -> SignalService:
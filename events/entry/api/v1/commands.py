@@ -6,8 +6,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 logger = logging.getLogger(__name__)
 
 # 导入依赖注入
-from ..deps import get_lifecycle_service, get_signal_service, get_db_session 
+from ..deps import get_lifecycle_service, get_signal_service, get_db_session, get_execution_ingestor
 from services.lifecycle_service import LifecycleService
+from services.event_ingestor import ExecutionEventIngestor
 from services.signal_service import SignalService
 from common.signal import SignalStatus
 
@@ -16,7 +17,8 @@ from ...schemas.request import (
     StartTraceRequest, 
     SplitTaskRequest, 
     ControlNodeRequest,
-    ExecutionEventRequest  # 新增：执行事件请求模型
+    ExecutionEventRequest,  # 新增：执行事件请求模型
+    ExecutionEventBatchRequest
 )
 
 
@@ -59,7 +61,7 @@ async def start_trace(
 @router.post("/events", status_code=status.HTTP_200_OK)
 async def report_execution_event(
     request: ExecutionEventRequest,
-    lifecycle_svc: LifecycleService = Depends(get_lifecycle_service),
+    ingestor: ExecutionEventIngestor = Depends(get_execution_ingestor),
     session: AsyncSession = Depends(get_db_session),
     signal_svc: SignalService = Depends(get_signal_service), # 引入信号服务用于返回指令
 ):
@@ -70,21 +72,15 @@ async def report_execution_event(
     try:
         # 1. 处理数据上报 (Write)
         # model_dump() 会将 Pydantic 对象转为纯 Dict，完美适配 Service 签名
-        await lifecycle_svc.sync_execution_state(
-            session=session,
-            execution_args=request.model_dump()
-        )
-
-        # 提交事务，确保数据持久化
-        await session.commit()
+        # 并发汇报由写入器合并为一批，在同一事务中提交后才返回
+        await ingestor.submit(request.model_dump())
 
         # 2. 检查是否有控制信号 (Read) - 顺便捎带回去
         # 优先查 Trace 级信号，再查 Node 级信号 (如果你的业务支持单节点控制)
         command = "CONTINUE"
 
-        # 假设 signal_svc 有个快速查缓存的方法 check_signal
-        # 如果 trace 被暂停或取消，这里立刻返回
-        signal = await signal_svc.check_signal(request.trace_id, session=session)
+        # 按节点路径解析信号：trace 或该节点所在子树被暂停/取消时立刻返回
+        signal = await signal_svc.check_signal(request.trace_id, session=session, task_id=request.task_id)
         if signal:
             command = signal # 例如 "CANCEL" 或 "PAUSE"
 
@@ -101,6 +97,54 @@ async def report_execution_event(
         raise HTTPException(status_code=500, detail=f"Event sync failed: {str(e)}")
 
 
+def _command_severity(command: str) -> int:
+    """指令的严格程度：取消 > 暂停 > 其他"""
+    if command == SignalStatus.CANCELLED.value:
+        return 2
+    if command == SignalStatus.PAUSED.value:
+        return 1
+    return 0
+
+
+@router.post("/events/batch", status_code=status.HTTP_200_OK)
+async def report_execution_events_batch(
+    request: ExecutionEventBatchRequest,
+    ingestor: ExecutionEventIngestor = Depends(get_execution_ingestor),
+    session: AsyncSession = Depends(get_db_session),
+    signal_svc: SignalService = Depends(get_signal_service),
+):
+    """
+    Worker 批量汇报接口。
+    按顺序处理一批事件并在同一事务中提交，Response 捎带控制指令：
+    - task_commands: trace_id -> task_id -> 指令，按节点路径解析（与单条接口一致）
+    - commands: trace_id -> 该 trace 内最严格的指令（CANCELLED > PAUSED > 其他）
+    """
+    try:
+        await ingestor.submit_many([event.model_dump() for event in request.events])
+
+        task_ids_by_trace: Dict[str, List[str]] = {}
+        for event in request.events:
+            task_ids_by_trace.setdefault(event.trace_id, []).append(event.task_id)
+
+        commands: Dict[str, str] = {}
+        task_commands: Dict[str, Dict[str, str]] = {}
+        for trace_id, task_ids in task_ids_by_trace.items():
+            signals = await signal_svc.check_signals(trace_id, task_ids, session=session)
+            task_commands[trace_id] = {task_id: signal or "CONTINUE" for task_id, signal in signals.items()}
+            commands[trace_id] = max(task_commands[trace_id].values(), key=_command_severity)
+
+        return {
+            "received": len(request.events),
+            "commands": commands,
+            "task_commands": task_commands
+        }
+
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Batch event sync failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Batch event sync failed: {str(e)}")
+
+
 @router.post("/{trace_id}/control/trace")
 async def control_whole_trace(
     trace_id: str,
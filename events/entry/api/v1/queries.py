@@ -34,6 +34,8 @@ class GraphEdge(BaseModel):
 
 class TraceGraphResponse(BaseModel):
     trace_id: str
+    version: int = 0        # 图版本号，下次请求作为 since 传回即可增量同步
+    full: bool = True       # False 表示只包含 since 之后变化的节点和边
     nodes: List[GraphNode]
     edges: List[GraphEdge]
 
@@ -54,6 +56,10 @@ class TraceByUserResponse(BaseModel):
     trace_id: str
     created_at: datetime
     status: str
+    updated_at: Optional[datetime] = None
+    root_name: Optional[str] = None
+    total_count: int = 0
+    status_counts: Dict[str, int] = {}
 
 
 class TraceListByUserResponse(BaseModel):
@@ -61,6 +67,18 @@ class TraceListByUserResponse(BaseModel):
     user_id: str
     count: int
     traces: List[TraceByUserResponse]
+    next_cursor: Optional[str] = None  # 传给下一次请求的 cursor，为空表示没有更多数据
+
+
+def _encode_trace_cursor(trace: Dict[str, Any]) -> str:
+    return f"{trace['created_at'].isoformat()}|{trace['trace_id']}"
+
+
+def _decode_trace_cursor(cursor: str):
+    created_at, sep, trace_id = cursor.partition("|")
+    if not sep or not trace_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return datetime.fromisoformat(created_at), trace_id
 
 
 @router.get("/{trace_id}/tasks", response_model=List[EventInstance])
@@ -119,15 +137,17 @@ async def list_tasks_in_trace(
 @router.get("/{trace_id}/graph", response_model=TraceGraphResponse)
 async def get_trace_topology(
     trace_id: str,
+    since: Optional[int] = Query(None, description="上次返回的 version，传入时只返回之后变化的节点和边"),
     observer_svc: ObserverService = Depends(get_observer_service),
     session: AsyncSession = Depends(get_db_session)
 ):
     """
     【新增接口】获取 Trace 的 DAG 拓扑结构。
     用于前端渲染任务执行流图。
+    传入 since 时为增量同步，前端按节点 id 合并返回的 nodes/edges。
     """
     try:
-        graph_data = await observer_svc.get_trace_graph(session, trace_id)
+        graph_data = await observer_svc.get_trace_graph(session, trace_id, since_version=since)
         if not graph_data:
              raise HTTPException(status_code=404, detail="Trace not found")
         return graph_data
@@ -216,12 +236,19 @@ async def get_traces_by_user_id(
     end_time: Optional[datetime] = Query(None, description="结束时间"),
     limit: int = Query(100, le=1000, description="每页数量"),
     offset: int = Query(0, description="偏移量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
     observer_svc: ObserverService = Depends(get_observer_service),
     session: AsyncSession = Depends(get_db_session)
 ):
     """
     根据user_id查询所有trace_id及其状态，支持时间范围过滤和分页
+    翻页推荐使用 cursor（键集分页），offset 仅为兼容保留
     """
+    try:
+        decoded_cursor = _decode_trace_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         traces = await observer_svc.find_traces_by_user_id(
             session=session,
@@ -229,13 +256,15 @@ async def get_traces_by_user_id(
             start_time=start_time,
             end_time=end_time,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=decoded_cursor
         )
         
         return {
             "user_id": user_id,
             "count": len(traces),
-            "traces": traces
+            "traces": traces,
+            "next_cursor": _encode_trace_cursor(traces[-1]) if len(traces) == limit and traces[-1]["created_at"] else None
         }
     except Exception as e:
         logger.error(f"Failed to get traces by user {user_id}: {str(e)}", exc_info=True)
@@ -72,6 +72,12 @@ class ExecutionEventRequest(BaseModel):
     # 额外信息
     realtime_info: Optional[Dict[str, Any]] = Field(None, description="实时信息，如当前的 step")
 
+class ExecutionEventBatchRequest(BaseModel):
+    """
+    批量上报的执行事件（按发送顺序处理）
+    """
+    events: List[ExecutionEventRequest] = Field(..., description="执行事件列表")
+
 # ==========================================
 # 4. 控制信号请求
 # ==========================================
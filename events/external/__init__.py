@@ -13,7 +13,7 @@ from .db import (
 )
 
 # Import components from events module
-from .events import EventBus, RedisEventBus, MemoryEventBus
+from .events import EventBus, RedisEventBus, MemoryEventBus, TraceFanout, RedisTraceFanout
 
 __all__ = [
     # Cache components
@@ -32,5 +32,7 @@ __all__ = [
     # Events components
     "EventBus",
     "RedisEventBus",
-    "MemoryEventBus"
+    "MemoryEventBus",
+    "TraceFanout",
+    "RedisTraceFanout"
 ]
\ No newline at end of file
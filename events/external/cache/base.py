@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Tuple, List
 
 
 class CacheClient(ABC):
@@ -8,6 +8,8 @@ class CacheClient(ABC):
     @abstractmethod
     async def set(self, key: str, value: str, ttl: Optional[int] = None, **kwargs) -> None: ...
     @abstractmethod
+    async def mset(self, mapping: Dict[str, str], ttl: Optional[int] = None) -> None: ...
+    @abstractmethod
     async def delete(self, key: str) -> None: ...
     @abstractmethod
     async def exists(self, key: str) -> bool: ...
@@ -16,14 +18,26 @@ class CacheClient(ABC):
     @abstractmethod
     async def xadd(self, stream_key: str, data: dict, maxlen: Optional[int] = None) -> None: ...
     @abstractmethod
+    async def xadd_many(self, stream_key: str, entries: list[dict], maxlen: Optional[int] = None) -> None: ...
+    @abstractmethod
     async def xgroup_create(self, stream_key: str, group_name: str, mkstream: bool = False) -> None: ...
     @abstractmethod
     async def xreadgroup(self, group_name: str, consumer_name: str, streams: Dict[str, str], count: int = 1, block: int = 0) -> list: ...
     @abstractmethod
+    async def xack(self, stream_key: str, group_name: str, message_ids: list[str]) -> int: ...
+    @abstractmethod
+    async def xautoclaim(self, stream_key: str, group_name: str, consumer_name: str, min_idle_ms: int, start_id: str = "0-0", count: int = 100) -> Tuple[str, list]: ...
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> int: ...
+    @abstractmethod
     async def lpush(self, key: str, value: str) -> None: ...
     @abstractmethod
     async def ltrim(self, key: str, start: int, end: int) -> None: ...
     @abstractmethod
     async def lrange(self, key: str, start: int, end: int) -> list[str]: ...
     @abstractmethod
-    async def expire(self, key: str, ttl: int) -> None: ...
\ No newline at end of file
+    async def expire(self, key: str, ttl: int) -> None: ...
+    @abstractmethod
+    async def hgetall_many(self, keys: list[str]) -> list[Dict[str, str]]: ...
+    @abstractmethod
+    async def run_script(self, script: str, keys: List[str], args: List[Any]) -> Any: ...
\ No newline at end of file
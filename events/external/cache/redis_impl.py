@@ -1,5 +1,5 @@
 import redis.asyncio as redis
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Tuple, List
 from .base import CacheClient
 from config.settings import settings
 
@@ -7,6 +7,8 @@ from config.settings import settings
 class RedisCacheClient(CacheClient):
     def __init__(self, redis_url: str = settings.redis_url):
         self.redis = redis.from_url(redis_url, decode_responses=True)
+        # 已注册的 Lua 脚本（按脚本内容缓存，后续调用走 EVALSHA）
+        self._scripts: Dict[str, Any] = {}
 
     async def get(self, key: str) -> Optional[str]:
         return await self.redis.get(key)
@@ -17,6 +19,15 @@ class RedisCacheClient(CacheClient):
             kwargs['ex'] = ttl
         await self.redis.set(key, value, **kwargs)
 
+    async def mset(self, mapping: Dict[str, str], ttl: Optional[int] = None) -> None:
+        """批量写入（一次管道往返），ttl 对所有键生效"""
+        if not mapping:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
     async def delete(self, key: str) -> None:
         await self.redis.delete(key)
 
@@ -33,6 +44,19 @@ class RedisCacheClient(CacheClient):
             kwargs['approximate'] = True  # 使用近似截断，提高性能
         await self.redis.xadd(stream_key, data, **kwargs)
     
+    async def xadd_many(self, stream_key: str, entries: list[dict], maxlen: Optional[int] = None) -> None:
+        """批量追加流消息（一次管道往返，保持顺序）"""
+        if not entries:
+            return
+        kwargs = {}
+        if maxlen is not None:
+            kwargs['maxlen'] = maxlen
+            kwargs['approximate'] = True
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for data in entries:
+                pipe.xadd(stream_key, data, **kwargs)
+            await pipe.execute()
+    
     async def xgroup_create(self, stream_key: str, group_name: str, mkstream: bool = False) -> None:
         """创建消费者组"""
         await self.redis.xgroup_create(stream_key, group_name, id="$", mkstream=mkstream)
@@ -41,6 +65,24 @@ class RedisCacheClient(CacheClient):
         """从消费者组读取消息"""
         return await self.redis.xreadgroup(group_name, consumer_name, streams, count=count, block=block)
 
+    async def xack(self, stream_key: str, group_name: str, message_ids: list[str]) -> int:
+        """确认消息（一条命令确认多条），返回确认成功的条数"""
+        if not message_ids:
+            return 0
+        return await self.redis.xack(stream_key, group_name, *message_ids)
+
+    async def xautoclaim(self, stream_key: str, group_name: str, consumer_name: str, min_idle_ms: int, start_id: str = "0-0", count: int = 100) -> Tuple[str, list]:
+        """
+        接管空闲超过 min_idle_ms 的待确认消息（需要 Redis 6.2+）
+        返回 (下次扫描起点, [(message_id, fields), ...])，起点为 "0-0" 表示已扫描完一轮
+        """
+        response = await self.redis.xautoclaim(stream_key, group_name, consumer_name, min_idle_ms, start_id=start_id, count=count)
+        return response[0], response[1]
+
+    async def publish(self, channel: str, message: str) -> int:
+        """向 Pub/Sub 频道发布消息，返回收到消息的订阅者数"""
+        return await self.redis.publish(channel, message)
+
     async def lpush(self, key: str, value: str) -> None:
         """将值添加到列表的开头"""
         await self.redis.lpush(key, value)
@@ -57,6 +99,23 @@ class RedisCacheClient(CacheClient):
         """设置键的过期时间"""
         await self.redis.expire(key, ttl)
 
+    async def hgetall_many(self, keys: list[str]) -> list[Dict[str, str]]:
+        """批量读取哈希（一次管道往返），不存在或类型不符的键返回空字典"""
+        if not keys:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            results = await pipe.execute(raise_on_error=False)
+        return [result if isinstance(result, dict) else {} for result in results]
+
+    async def run_script(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """执行 Lua 脚本（原子执行，一次往返）"""
+        registered = self._scripts.get(script)
+        if registered is None:
+            registered = self._scripts[script] = self.redis.register_script(script)
+        return await registered(keys=keys, args=args)
+
 
 # 创建全局 redis 客户端实例
 redis_client = RedisCacheClient()
\ No newline at end of file
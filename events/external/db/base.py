@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
 from common.event_definition import EventDefinition
 from common.event_instance import EventInstance
 from common.event_log import EventLog
@@ -30,6 +30,10 @@ class EventInstanceRepository(ABC):
     @abstractmethod
     async def find_by_trace_id(self, trace_id: str) -> List[EventInstance]: ...
     @abstractmethod
+    async def get_graph_version(self, trace_id: str) -> int: ...
+    @abstractmethod
+    async def find_changed_since(self, trace_id: str, since_version: int) -> List[EventInstance]: ...
+    @abstractmethod
     async def find_by_trace_id_with_filters(self, trace_id: str, filters: dict, limit: int = 100, offset: int = 0) -> List[EventInstance]: ...
     @abstractmethod
     async def lock_for_execution(self, instance_id: str, worker_id: str) -> bool: ...
@@ -50,9 +54,17 @@ class EventInstanceRepository(ABC):
     @abstractmethod
     async def update_signal_by_trace(self, trace_id: str, signal: str) -> None: ...
     @abstractmethod
-    async def find_traces_by_user_id(self, user_id: str, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 100, offset: int = 0) -> List[dict]: ...
+    async def set_subtree_signal(self, trace_id: str, path_prefix: str, signal: str) -> None: ...
+    @abstractmethod
+    async def find_subtree_signals(self, trace_id: str) -> Dict[str, str]: ...
+    @abstractmethod
+    async def find_traces_by_user_id(self, user_id: str, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 100, offset: int = 0, cursor: Optional[Tuple[datetime, str]] = None) -> List[dict]: ...
     @abstractmethod
     async def upsert_by_task_id(self, task_id: str, trace_id: str, **fields) -> str: ...
+    @abstractmethod
+    async def bulk_upsert_by_task_id(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, str]: ...
+    @abstractmethod
+    async def get_by_task_ids(self, task_ids: List[str]) -> List[EventInstance]: ...
 
 
 class EventLogRepository(ABC):
@@ -85,4 +97,6 @@ class AgentDailyMetricRepository(ABC):
     @abstractmethod
     async def update_daily_metric(self, agent_id: str, date_str: str, status: str, duration_ms: int) -> None: ...
     @abstractmethod
+    async def bulk_upsert_daily_metrics(self, rows: List[dict]) -> None: ...
+    @abstractmethod
     async def get_recent_metrics(self, agent_id: str, days: int = 7) -> List[dict]: ...
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+任务依赖索引（SQLite / PostgreSQL 实现共用）
+- depends_on 规范化为 event_dependencies 边表，按 depends_on_id 建索引
+- event_instances.pending_deps 记录尚未成功的依赖数，依赖状态变化时增量维护
+- 就绪任务 = status 为 PENDING 且 pending_deps 为 0，一次索引查询即可取出
+"""
+import uuid
+from typing import Any, Dict, Iterable, List, Set, Union
+
+from sqlalchemy import select, update, delete, insert, func, and_
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from ..models import EventInstanceDB, EventDependencyDB
+from common.enums import EventInstanceStatus
+
+InstanceIds = Union[List[str], Select]
+
+_CHUNK_SIZE = 500
+
+
+def _unique(depends_on: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(depends_on or []))
+
+
+def _build_edges(instance_id: str, depends_on: List[str], succeeded: Set[str]) -> List[Dict[str, Any]]:
+    return [
+        {"instance_id": instance_id, "depends_on_id": dep_id, "satisfied": dep_id in succeeded}
+        for dep_id in depends_on
+    ]
+
+
+class DependencyIndexMixin:
+    """
+    依赖索引维护逻辑，由各方言的 EventInstanceRepository 混入
+    所有方法只在当前 session 中执行语句，不提交事务
+    """
+
+    session: AsyncSession
+
+    async def _succeeded_ids(self, ids: Iterable[str]) -> Set[str]:
+        ids = list(ids)
+        succeeded: Set[str] = set()
+        for start in range(0, len(ids), _CHUNK_SIZE):
+            stmt = select(EventInstanceDB.id).where(
+                EventInstanceDB.id.in_(ids[start:start + _CHUNK_SIZE]),
+                EventInstanceDB.status == EventInstanceStatus.SUCCESS
+            )
+            succeeded.update((await self.session.execute(stmt)).scalars())
+        return succeeded
+
+    async def _index_dependencies(self, rows: List[EventInstanceDB]) -> None:
+        """
+        为即将插入的实例写入依赖边并初始化 pending_deps（在 session.add 之前调用）
+        同批中已是 SUCCESS 的实例也会满足其已存在的下游
+        """
+        for row in rows:
+            if row.id is None:
+                row.id = str(uuid.uuid4())
+
+        dep_rows = [row for row in rows if row.depends_on]
+        created_succeeded = {row.id for row in rows if row.status == EventInstanceStatus.SUCCESS}
+        if dep_rows:
+            dep_ids = {dep_id for row in dep_rows for dep_id in row.depends_on}
+            succeeded = created_succeeded | await self._succeeded_ids(dep_ids - created_succeeded)
+            edges = []
+            for row in dep_rows:
+                depends_on = _unique(row.depends_on)
+                row_edges = _build_edges(row.id, depends_on, succeeded)
+                row.pending_deps = sum(1 for edge in row_edges if not edge["satisfied"])
+                edges.extend(row_edges)
+            await self.session.execute(insert(EventDependencyDB), edges)
+        for row in rows:
+            if not row.depends_on:
+                row.pending_deps = 0
+
+        if created_succeeded:
+            await self._sync_dependents(list(created_succeeded), succeeded=True)
+
+    async def _replace_dependencies(self, instance_id: str, depends_on: List[str]) -> None:
+        """已有实例的 depends_on 被修改时重建其依赖边和计数"""
+        depends_on = _unique(depends_on)
+        await self.session.execute(delete(EventDependencyDB).where(EventDependencyDB.instance_id == instance_id))
+        edges = _build_edges(instance_id, depends_on, await self._succeeded_ids(depends_on))
+        if edges:
+            await self.session.execute(insert(EventDependencyDB), edges)
+        stmt = (
+            update(EventInstanceDB)
+            .where(EventInstanceDB.id == instance_id)
+            .values(pending_deps=sum(1 for edge in edges if not edge["satisfied"]))
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def _on_status_change(self, instance_ids: InstanceIds, status: Any) -> None:
+        """实例状态写入后调用，instance_ids 可以是 ID 列表或返回 ID 的子查询"""
+        if status is None:
+            return
+        await self._sync_dependents(instance_ids, succeeded=status == EventInstanceStatus.SUCCESS)
+
+    async def _sync_dependents(self, instance_ids: InstanceIds, succeeded: bool) -> None:
+        """
+        维护下游实例的 pending_deps
+        变为 SUCCESS：未满足的边标记为满足，下游计数减去对应边数
+        离开 SUCCESS（如重试）：已满足的边恢复为未满足，下游计数加回
+        只翻转 satisfied 与目标状态相反的边，因此重复上报同一状态不会重复计数
+        """
+        if isinstance(instance_ids, Select):
+            # 先取出 ID，避免子查询与 UPDATE 目标表互相关联
+            instance_ids = list((await self.session.execute(instance_ids)).scalars())
+        if not instance_ids:
+            return
+        edge = EventDependencyDB
+        flipped = and_(edge.depends_on_id.in_(instance_ids), edge.satisfied == (not succeeded))
+        delta = (
+            select(func.count())
+            .select_from(edge)
+            .where(edge.instance_id == EventInstanceDB.id, flipped)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(EventInstanceDB)
+            .where(EventInstanceDB.id.in_(select(edge.instance_id).where(flipped)))
+            .values(pending_deps=EventInstanceDB.pending_deps - delta if succeeded else EventInstanceDB.pending_deps + delta)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        await self.session.execute(
+            update(edge).where(flipped).values(satisfied=succeeded).execution_options(synchronize_session=False)
+        )
+
+
+def rebuild_dependency_index(conn: Connection) -> int:
+    """
+    根据 depends_on 全量重建依赖边表和 pending_deps（同步函数，配合 conn.run_sync 使用）
+    用于引入边表之前已存在的数据，返回写入的边数
+    """
+    rows = conn.execute(
+        select(EventInstanceDB.id, EventInstanceDB.depends_on).where(EventInstanceDB.depends_on.isnot(None))
+    ).all()
+    rows = [(instance_id, _unique(depends_on)) for instance_id, depends_on in rows if depends_on]
+
+    dep_ids = list({dep_id for _, depends_on in rows for dep_id in depends_on})
+    succeeded: Set[str] = set()
+    for start in range(0, len(dep_ids), _CHUNK_SIZE):
+        succeeded.update(conn.execute(
+            select(EventInstanceDB.id).where(
+                EventInstanceDB.id.in_(dep_ids[start:start + _CHUNK_SIZE]),
+                EventInstanceDB.status == EventInstanceStatus.SUCCESS
+            )
+        ).scalars())
+
+    conn.execute(delete(EventDependencyDB))
+    edges = []
+    for instance_id, depends_on in rows:
+        edges.extend(_build_edges(instance_id, depends_on, succeeded))
+    if edges:
+        conn.execute(insert(EventDependencyDB), edges)
+
+    conn.execute(update(EventInstanceDB).values(pending_deps=0))
+    if edges:
+        pending = (
+            select(func.count())
+            .select_from(EventDependencyDB)
+            .where(EventDependencyDB.instance_id == EventInstanceDB.id, EventDependencyDB.satisfied == False)
+            .scalar_subquery()
+        )
+        conn.execute(
+            update(EventInstanceDB)
+            .where(EventInstanceDB.id.in_(select(EventDependencyDB.instance_id)))
+            .values(pending_deps=pending)
+        )
+    return len(edges)
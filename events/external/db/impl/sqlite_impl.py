@@ -1,10 +1,14 @@
 from sqlalchemy import select, update, and_, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 import logging
 
 from ..base import EventInstanceRepository, EventDefinitionRepository, EventLogRepository, AgentTaskHistoryRepository, AgentDailyMetricRepository
+from .dependency_index import DependencyIndexMixin
+from .trace_summary import TraceSummaryMixin, TraceCursor
+from .subtree_signal import SubtreeSignalMixin
 from ..models import EventInstanceDB, EventDefinitionDB, EventLogDB, AgentTaskHistory, AgentDailyMetric
 from common.event_instance import EventInstance
 from common.event_definition import EventDefinition
@@ -12,40 +16,18 @@ from common.event_log import EventLog
 from common.enums import EventInstanceStatus, ActorType
 
 logger = logging.getLogger(__name__)
-class SQLiteEventInstanceRepository(EventInstanceRepository):
+class SQLiteEventInstanceRepository(DependencyIndexMixin, TraceSummaryMixin, SubtreeSignalMixin, EventInstanceRepository):
     def __init__(self, session: AsyncSession):
         self.session = session
 
     async def find_ready_tasks(self) -> List[EventInstance]:
-        # SQLite 不支持复杂的 array 函数和 JOIN 查询，使用 N+1 查询方式
-        # 先查所有 PENDING 状态的事件
-        stmt = select(EventInstanceDB).where(EventInstanceDB.status == EventInstanceStatus.PENDING)
+        # pending_deps 由依赖边表增量维护，就绪任务一次索引查询取出
+        stmt = select(EventInstanceDB).where(
+            EventInstanceDB.status == EventInstanceStatus.PENDING,
+            EventInstanceDB.pending_deps == 0
+        )
         result = await self.session.execute(stmt)
-        pending_tasks = result.scalars().all()
-        ready = []
-
-        for task_db in pending_tasks:
-            deps = task_db.depends_on or []
-            if not deps:
-                # 无依赖，直接就绪
-                ready.append(self._to_domain(task_db))
-            else:
-                # 查依赖事件状态
-                dep_ids = [d for d in deps]  # 假设 depends_on 是 list[str]
-                dep_stmt = select(EventInstanceDB).where(EventInstanceDB.id.in_(dep_ids))
-                dep_result = await self.session.execute(dep_stmt)
-                dep_map = {d.id: d.status for d in dep_result.scalars()}
-                
-                # 检查所有依赖是否都已成功
-                all_deps_success = True
-                for dep_id in deps:
-                    if dep_map.get(dep_id) != EventInstanceStatus.SUCCESS:
-                        all_deps_success = False
-                        break
-                
-                if all_deps_success:
-                    ready.append(self._to_domain(task_db))
-        return ready
+        return [self._to_domain(row) for row in result.scalars().all()]
 
     async def find_pending_with_deps_satisfied(self) -> List[EventInstance]:
         # 该方法与 find_ready_tasks 功能相同，复用实现
@@ -68,6 +50,10 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
                 .values(**all_updates)
             )
             await self.session.execute(stmt)
+            if "depends_on" in all_updates:
+                await self._replace_dependencies(instance_id, all_updates["depends_on"])
+            await self._on_status_change([instance_id], all_updates.get("status"))
+            await self._on_instances_changed(EventInstanceDB.id == instance_id)
             await self.session.commit()
     
     async def get_by_task_id(self, task_id: str) -> Optional[EventInstance]:
@@ -99,17 +85,17 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
         """
         批量更新指定路径模式下的所有事件实例的控制信号
         """
+        in_subtree = and_(
+            EventInstanceDB.trace_id == trace_id,
+            EventInstanceDB.node_path.like(path_pattern)
+        )
         stmt = (
             update(EventInstanceDB)
-            .where(
-                and_(
-                    EventInstanceDB.trace_id == trace_id,
-                    EventInstanceDB.node_path.like(path_pattern)
-                )
-            )
+            .where(in_subtree)
             .values(control_signal=signal)
         )
         await self.session.execute(stmt)
+        await self._on_instances_changed(in_subtree)
         await self.session.commit()
     
     async def update_signal_by_trace(
@@ -126,6 +112,7 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             .values(control_signal=signal)
         )
         await self.session.execute(stmt)
+        await self._on_instances_changed(EventInstanceDB.trace_id == trace_id)
         await self.session.commit()
 
     async def upsert_by_task_id(self, task_id: str, trace_id: str, **fields) -> str:
@@ -148,6 +135,8 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
         if result.rowcount > 0:
             # 更新成功，获取实例 ID
             get_stmt = select(EventInstanceDB.id).where(EventInstanceDB.task_id == task_id)
+            await self._on_status_change(get_stmt, fields.get("status"))
+            await self._on_instances_changed(EventInstanceDB.task_id == task_id)
             get_result = await self.session.execute(get_stmt)
             return get_result.scalar_one()
         
@@ -197,10 +186,111 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             error_detail=fields.get("error_detail")
         )
         
+        await self._index_dependencies([new_instance])
         self.session.add(new_instance)
+        await self.session.flush()
+        await self._on_instances_changed(EventInstanceDB.id == new_id)
         await self.session.commit()
         return new_id
 
+    async def bulk_upsert_by_task_id(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, str]:
+        """
+        批量 upsert，items 为 (task_id, trace_id, fields)，同一 task_id 只应出现一次
+        已存在的实例按主键批量 UPDATE，不存在的挂到各自 trace 的根节点下批量 INSERT
+        不提交事务，由调用方统一 commit
+        返回 task_id -> 实例 ID
+        """
+        import uuid
+        from datetime import datetime, timezone
+
+        if not items:
+            return {}
+
+        # 1. 一次查询定位已存在的实例
+        task_ids = [task_id for task_id, _, _ in items]
+        existing_stmt = select(EventInstanceDB.id, EventInstanceDB.task_id).where(EventInstanceDB.task_id.in_(task_ids))
+        existing: Dict[str, List[str]] = {}
+        for instance_id, task_id in (await self.session.execute(existing_stmt)).all():
+            existing.setdefault(task_id, []).append(instance_id)
+
+        # 2. 已存在的按主键批量更新（与 upsert_by_task_id 一致，同一 task_id 的所有实例都更新）
+        update_params = [
+            {"id": instance_id, **fields}
+            for task_id, _, fields in items if fields
+            for instance_id in existing.get(task_id, [])
+        ]
+        if update_params:
+            await self.session.execute(update(EventInstanceDB), update_params)
+            status_changes: Dict[bool, List[str]] = {}
+            for params in update_params:
+                if params.get("status") is not None:
+                    status_changes.setdefault(params["status"] == EventInstanceStatus.SUCCESS, []).append(params["id"])
+            for succeeded, instance_ids in status_changes.items():
+                await self._sync_dependents(instance_ids, succeeded)
+            await self._on_instances_changed(EventInstanceDB.id.in_([params["id"] for params in update_params]))
+
+        result = {task_id: ids[0] for task_id, ids in existing.items()}
+        to_create = [item for item in items if item[0] not in existing]
+        if not to_create:
+            return result
+
+        # 3. 不存在的实例：一次查询取出涉及 trace 的根节点
+        trace_ids = {trace_id for _, trace_id, _ in to_create}
+        root_stmt = select(EventInstanceDB).where(
+            EventInstanceDB.trace_id.in_(trace_ids),
+            EventInstanceDB.parent_id == None
+        )
+        roots: Dict[str, EventInstanceDB] = {}
+        for root in (await self.session.execute(root_stmt)).scalars():
+            roots.setdefault(root.trace_id, root)
+
+        now = datetime.now(timezone.utc)
+        new_instances = []
+        for task_id, trace_id, fields in to_create:
+            root_node = roots.get(trace_id)
+            if not root_node:
+                raise ValueError(f"Trace {trace_id} has no root node")
+            new_id = str(uuid.uuid4())
+            new_instances.append(EventInstanceDB(
+                id=new_id,
+                task_id=task_id,
+                trace_id=trace_id,
+                parent_id=root_node.task_id,
+                node_path=f"{root_node.node_path}{root_node.task_id}/",
+                depth=root_node.depth + 1,
+                actor_type=fields.get("actor_type", "AGENT"),
+                def_id=fields.get("def_id", "dynamic_task"),
+                status=fields.get("status", EventInstanceStatus.PENDING.value),
+                user_id=root_node.user_id,
+                name=fields.get("name", "Dynamic Task"),
+                created_at=now,
+                updated_at=now,
+                started_at=fields.get("started_at"),
+                finished_at=fields.get("finished_at"),
+                worker_id=fields.get("worker_id"),
+                input_params=fields.get("input_params"),
+                runtime_state_snapshot=fields.get("runtime_state_snapshot"),
+                progress=fields.get("progress", 0),
+                error_detail=fields.get("error_detail")
+            ))
+            result[task_id] = new_id
+
+        await self._index_dependencies(new_instances)
+        self.session.add_all(new_instances)
+        await self.session.flush()
+        await self._on_instances_changed(EventInstanceDB.id.in_([instance.id for instance in new_instances]))
+        return result
+
+    async def get_by_task_ids(self, task_ids: List[str]) -> List[EventInstance]:
+        """
+        根据一组 task_id 批量获取事件实例
+        """
+        if not task_ids:
+            return []
+        stmt = select(EventInstanceDB).where(EventInstanceDB.task_id.in_(task_ids))
+        result = await self.session.execute(stmt)
+        return [self._to_domain(row) for row in result.scalars().all()]
+
     def _to_domain(self, db: EventInstanceDB) -> EventInstance:
         return EventInstance(
             id=db.id,
@@ -272,7 +362,10 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             created_at=instance.created_at,
             updated_at=instance.updated_at
         )
+        await self._index_dependencies([db_instance])
         self.session.add(db_instance)
+        await self.session.flush()
+        await self._on_instances_changed(EventInstanceDB.id == db_instance.id)
         await self.session.commit()
 
     async def bulk_create(self, instances: List[EventInstance]) -> None:
@@ -322,7 +415,10 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             db_instances.append(db_instance)
         
         # 批量添加到会话
+        await self._index_dependencies(db_instances)
         self.session.add_all(db_instances)
+        await self.session.flush()
+        await self._on_instances_changed(EventInstanceDB.id.in_([db_instance.id for db_instance in db_instances]))
         await self.session.commit()
     
     async def get(self, instance_id: str) -> Optional[EventInstance]: 
@@ -343,6 +439,19 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
         rows = result.scalars().all()
         return [self._to_domain(row) for row in rows]
     
+    async def get_graph_version(self, trace_id: str) -> int:
+        """
+        获取 trace 当前的图版本号，trace 不存在时为 0
+        """
+        return await self._graph_version(trace_id)
+
+    async def find_changed_since(self, trace_id: str, since_version: int) -> List[EventInstance]:
+        """
+        获取图版本号大于 since_version 的实例（即该版本之后写入过的实例）
+        """
+        rows = await self._find_changed_instances(trace_id, since_version)
+        return [self._to_domain(row) for row in rows]
+    
     async def find_by_trace_id_with_filters(self, trace_id: str, filters: dict, limit: int = 100, offset: int = 0) -> List[EventInstance]:
         stmt = select(EventInstanceDB).where(EventInstanceDB.trace_id == trace_id)
         
@@ -373,8 +482,11 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             .returning(EventInstanceDB.id)
         )
         result = await self.session.execute(stmt)
+        locked = result.scalar_one_or_none() is not None
+        if locked:
+            await self._on_instances_changed(EventInstanceDB.id == instance_id)
         await self.session.commit()
-        return result.scalar_one_or_none() is not None
+        return locked
     
     async def update_status(self, instance_id: str, status: EventInstanceStatus, **kwargs) -> None: 
         update_data = {'status': status.value}
@@ -386,6 +498,8 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             .values(**update_data)
         )
         await self.session.execute(stmt)
+        await self._on_status_change([instance_id], status)
+        await self._on_instances_changed(EventInstanceDB.id == instance_id)
         await self.session.commit()
     
     async def bulk_update_status_by_trace(self, trace_id: str, status: EventInstanceStatus) -> None: 
@@ -395,60 +509,35 @@ class SQLiteEventInstanceRepository(EventInstanceRepository):
             .values(status=status.value)
         )
         await self.session.execute(stmt)
+        await self._on_status_change(select(EventInstanceDB.id).where(EventInstanceDB.trace_id == trace_id), status)
+        await self._on_instances_changed(EventInstanceDB.trace_id == trace_id)
         await self.session.commit()
     
-    async def find_traces_by_user_id(self, user_id: str, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 100, offset: int = 0) -> List[dict]:
+    async def find_traces_by_user_id(
+        self,
+        user_id: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[TraceCursor] = None
+    ) -> List[dict]:
         """
         根据user_id查询所有trace_id及其状态
-        
+
         Args:
             user_id: 用户ID
             start_time: 开始时间
             end_time: 结束时间
             limit: 每页数量
-            offset: 偏移量
-            
+            offset: 偏移量（兼容旧接口，翻页优先使用 cursor）
+            cursor: 上一页最后一条的 (created_at, trace_id)，从其之后继续
+
         Returns:
             List[dict]: trace_id列表及其状态信息
         """
-        # 使用SQLite兼容的查询方式
-        # 1. 首先获取所有唯一的trace_id
-        stmt = select(EventInstanceDB.trace_id).distinct().where(EventInstanceDB.user_id == user_id)
-        
-        # 添加时间范围过滤
-        if start_time:
-            stmt = stmt.where(EventInstanceDB.created_at >= start_time)
-        if end_time:
-            stmt = stmt.where(EventInstanceDB.created_at <= end_time)
-        
-        # 排序并分页
-        stmt = stmt.order_by(EventInstanceDB.created_at.desc()).limit(limit).offset(offset)
-        
-        result = await self.session.execute(stmt)
-        trace_ids = [row.trace_id for row in result.all()]
-        
-        traces = []
-        for trace_id in trace_ids:
-            # 2. 对于每个trace_id，获取最新状态
-            # 查询该trace下的所有实例
-            trace_stmt = select(EventInstanceDB).where(
-                EventInstanceDB.trace_id == trace_id,
-                EventInstanceDB.user_id == user_id
-            ).order_by(EventInstanceDB.updated_at.desc())
-            
-            trace_result = await self.session.execute(trace_stmt)
-            instances = trace_result.scalars().all()
-            
-            if instances:
-                # 获取最新状态
-                latest_instance = instances[0]
-                traces.append({
-                    "trace_id": trace_id,
-                    "created_at": latest_instance.created_at,
-                    "status": latest_instance.status
-                })
-        
-        return traces
+        # 直接读 trace_summary，(user_id, created_at) 索引范围扫描
+        return await self._find_trace_summaries(user_id, start_time, end_time, limit, offset, cursor)
 
 
 class SQLiteEventDefinitionRepository(EventDefinitionRepository):
@@ -709,40 +798,36 @@ class SQLiteAgentDailyMetricRepository(AgentDailyMetricRepository):
 
     async def update_daily_metric(self, agent_id: str, date_str: str, status: str, duration_ms: int) -> None:
         """
-        更新每日统计指标
+        更新每日统计指标（单条累加）
         """
-        # 先尝试获取现有记录
-        stmt = (
-            select(AgentDailyMetric)
-            .where(
-                AgentDailyMetric.agent_id == agent_id,
-                AgentDailyMetric.date_str == date_str
-            )
+        await self.bulk_upsert_daily_metrics([{
+            "agent_id": agent_id,
+            "date_str": date_str,
+            "total_tasks": 1,
+            "success_tasks": 1 if status == 'COMPLETED' else 0,
+            "failed_tasks": 1 if status == 'FAILED' else 0,
+            "total_duration_ms": duration_ms or 0
+        }])
+
+    async def bulk_upsert_daily_metrics(self, rows: List[dict]) -> None:
+        """
+        批量累加每日统计指标，一条 INSERT ... ON CONFLICT (agent_id, date_str) DO UPDATE
+        rows 中每个 (agent_id, date_str) 只应出现一次，计数字段为本批的增量
+        """
+        if not rows:
+            return
+        stmt = sqlite_insert(AgentDailyMetric).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AgentDailyMetric.agent_id, AgentDailyMetric.date_str],
+            set_={
+                "total_tasks": AgentDailyMetric.total_tasks + stmt.excluded.total_tasks,
+                "success_tasks": AgentDailyMetric.success_tasks + stmt.excluded.success_tasks,
+                "failed_tasks": AgentDailyMetric.failed_tasks + stmt.excluded.failed_tasks,
+                "total_duration_ms": AgentDailyMetric.total_duration_ms + stmt.excluded.total_duration_ms,
+                "updated_at": func.now()
+            }
         )
-        
-        result = await self.session.execute(stmt)
-        metric = result.scalar_one_or_none()
-        
-        if metric:
-            # 更新现有记录
-            metric.total_tasks += 1
-            if status == 'COMPLETED':
-                metric.success_tasks += 1
-            elif status == 'FAILED':
-                metric.failed_tasks += 1
-            metric.total_duration_ms += duration_ms
-        else:
-            # 创建新记录
-            metric = AgentDailyMetric(
-                agent_id=agent_id,
-                date_str=date_str,
-                total_tasks=1,
-                success_tasks=1 if status == 'COMPLETED' else 0,
-                failed_tasks=1 if status == 'FAILED' else 0,
-                total_duration_ms=duration_ms
-            )
-            self.session.add(metric)
-        
+        await self.session.execute(stmt)
         await self.session.commit()
 
     async def get_recent_metrics(self, agent_id: str, days: int = 7) -> List[dict]:
@@ -0,0 +1,81 @@
+"""
+子树控制信号（SQLite / PostgreSQL 实现共用）
+- subtree_signals 每个被控制的子树一行，主键 (trace_id, path_prefix)
+- 写入信号时删除该子树内更深的前缀再写入本行，行数只与发送过的信号数有关，与子树大小无关
+- 节点的信号由调用方按祖先前缀在内存中解析（common.signal.resolve_subtree_signal）
+"""
+from itertools import islice
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, delete, insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import EventInstanceDB, SubtreeSignalDB
+from common.signal import ancestor_prefixes, subtree_prefix
+
+
+class SubtreeSignalMixin:
+    """
+    子树信号读写，由各方言的 EventInstanceRepository 混入
+    所有方法只在当前 session 中执行语句，不提交事务
+    """
+
+    session: AsyncSession
+
+    async def set_subtree_signal(self, trace_id: str, path_prefix: str, signal: str) -> None:
+        """写入子树信号，覆盖该子树内此前发送给更深节点的信号"""
+        table = SubtreeSignalDB
+        # 只在该 trace 已有的信号行中按前缀匹配，走主键索引
+        await self.session.execute(
+            delete(table).where(
+                table.trace_id == trace_id,
+                table.path_prefix.startswith(path_prefix, autoescape=True)
+            )
+        )
+        await self.session.execute(
+            insert(table).values(trace_id=trace_id, path_prefix=path_prefix, signal=signal)
+        )
+
+    async def find_subtree_signals(self, trace_id: str) -> Dict[str, str]:
+        """返回 trace 下所有子树信号：path_prefix -> signal"""
+        stmt = select(SubtreeSignalDB.path_prefix, SubtreeSignalDB.signal).where(
+            SubtreeSignalDB.trace_id == trace_id
+        )
+        return {prefix: signal for prefix, signal in (await self.session.execute(stmt)).all()}
+
+
+def _compact(rows: List[Tuple[str, str, str]]) -> List[Dict[str, str]]:
+    """去掉被同信号祖先前缀覆盖的行（旧版级联写入的子孙）"""
+    signals: Dict[Tuple[str, str], str] = {}
+    for trace_id, prefix, signal in sorted(rows, key=lambda row: (row[0], len(row[1]))):
+        inherited = None
+        for parent in islice(ancestor_prefixes(prefix), 1, None):
+            inherited = signals.get((trace_id, parent))
+            if inherited is not None:
+                break
+        if inherited != signal:
+            signals[(trace_id, prefix)] = signal
+    return [
+        {"trace_id": trace_id, "path_prefix": prefix, "signal": signal}
+        for (trace_id, prefix), signal in signals.items()
+    ]
+
+
+def rebuild_subtree_signals(conn: Connection) -> int:
+    """
+    根据实例上的 control_signal 回填子树信号表（同步函数，配合 conn.run_sync 使用）
+    用于引入信号表之前已发送过的信号，返回写入的行数
+    """
+    inst = EventInstanceDB
+    rows = [
+        (trace_id, subtree_prefix(node_path, task_id), signal)
+        for trace_id, node_path, task_id, signal in conn.execute(
+            select(inst.trace_id, inst.node_path, inst.task_id, inst.control_signal)
+            .where(inst.control_signal.isnot(None))
+        ).all()
+    ]
+    values = _compact(rows)
+    if values:
+        conn.execute(insert(SubtreeSignalDB), values)
+    return len(values)
@@ -0,0 +1,278 @@
+"""
+链路摘要表维护（SQLite / PostgreSQL / MySQL 实现共用）
+- trace_summary 每个 trace 一行：最新状态、各状态实例数、最近更新时间、根节点名称、图版本号
+- 实例写入后只聚合被写入的行：按 summary_status（上次计入摘要的状态）与当前状态求各状态计数的增量，
+  upsert 时累加到摘要行上，写入开销与 trace 大小无关；随后把被写入行的 summary_status 更新为当前状态
+- 每次写入 graph_seq 加一，被写入的实例记下新版本号，拓扑接口据此只返回版本之后变化的节点
+- 用户历史列表只扫描 trace_summary 的 (user_id, created_at) 索引，按 (created_at, trace_id) 键集分页
+- 全量重建（rebuild_trace_summaries）按 trace 重新聚合全部实例，用于回填已有数据
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, case, or_, literal, true
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Select
+
+from ..models import EventInstanceDB, TraceSummaryDB
+from common.enums import EventInstanceStatus
+
+TraceCursor = Tuple[datetime, str]
+
+_CHUNK_SIZE = 500
+
+# 各状态与摘要表计数列的对应关系
+_STATUS_COUNT_COLUMNS = {
+    EventInstanceStatus.PENDING: "pending_count",
+    EventInstanceStatus.RUNNING: "running_count",
+    EventInstanceStatus.SUCCESS: "success_count",
+    EventInstanceStatus.FAILED: "failed_count",
+    EventInstanceStatus.CANCELLED: "cancelled_count",
+    EventInstanceStatus.SKIPPED: "skipped_count",
+}
+
+_SUMMARY_COLUMNS = [
+    "trace_id", "user_id", "root_name", "status", "total_count",
+    *_STATUS_COUNT_COLUMNS.values(),
+    "created_at", "updated_at", "graph_seq",
+]
+
+_DIALECT_INSERT = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+    "mysql": mysql.insert,
+}
+
+
+def _summary_select(source, total_count, status_counts: Dict[EventInstanceStatus, Any]) -> Select:
+    """
+    按 trace 聚合 source（需包含 rn 列：trace 内按更新时间倒序的行号），列顺序与 _SUMMARY_COLUMNS 一致
+    """
+    is_root = source.c.parent_id.is_(None)
+    return (
+        select(
+            source.c.trace_id,
+            # 动态挂载的实例继承根节点 user_id，以根节点为准
+            func.coalesce(func.max(case((is_root, source.c.user_id))), func.max(source.c.user_id)),
+            func.max(case((is_root, source.c.name))),
+            func.max(case((source.c.rn == 1, source.c.status))),
+            total_count,
+            *(status_counts[status] for status in _STATUS_COUNT_COLUMNS),
+            func.min(source.c.created_at),
+            func.max(source.c.updated_at),
+            literal(1),
+        )
+        # SQLite 的 INSERT ... SELECT ... ON CONFLICT 需要 WHERE 子句消除语法歧义
+        .where(true())
+        .group_by(source.c.trace_id)
+    )
+
+
+def _ranked(where: ColumnElement):
+    inst = EventInstanceDB
+    return (
+        select(
+            inst.trace_id,
+            inst.user_id,
+            inst.parent_id,
+            inst.name,
+            inst.status,
+            inst.summary_status,
+            inst.created_at,
+            inst.updated_at,
+            func.row_number().over(
+                partition_by=inst.trace_id,
+                order_by=(inst.updated_at.desc(), inst.id.desc())
+            ).label("rn"),
+        )
+        .where(where)
+        .subquery()
+    )
+
+
+def _full_select(trace_ids: Iterable[str]) -> Select:
+    """按 trace 聚合全部实例"""
+    ranked = _ranked(EventInstanceDB.trace_id.in_(list(trace_ids)))
+    return _summary_select(
+        ranked,
+        func.count(),
+        {status: func.sum(case((ranked.c.status == status, 1), else_=0)) for status in _STATUS_COUNT_COLUMNS}
+    )
+
+
+def _delta_select(changed: ColumnElement) -> Select:
+    """只聚合被写入的实例：计数列为相对上次计入摘要时的增量，summary_status 为空的行是新实例"""
+    ranked = _ranked(changed)
+    return _summary_select(
+        ranked,
+        func.sum(case((ranked.c.summary_status.is_(None), 1), else_=0)),
+        {
+            status: func.sum(
+                case((ranked.c.status == status, 1), else_=0)
+                - case((ranked.c.summary_status == status, 1), else_=0)
+            )
+            for status in _STATUS_COUNT_COLUMNS
+        }
+    )
+
+
+def _upsert(dialect_name: str, source: Select, set_: Dict[str, Any]):
+    insert = _DIALECT_INSERT[dialect_name]
+    stmt = insert(TraceSummaryDB).from_select(_SUMMARY_COLUMNS, source)
+    # MySQL 用 ON DUPLICATE KEY UPDATE，新值通过 inserted 引用，且按顺序赋值（后面的表达式看到的是已更新的列）
+    incoming = stmt.inserted if dialect_name == "mysql" else stmt.excluded
+    values = [(column, value(incoming) if callable(value) else value) for column, value in set_.items()]
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(values)
+    return stmt.on_conflict_do_update(index_elements=[TraceSummaryDB.trace_id], set_=dict(values))
+
+
+def _refresh_statements(dialect_name: str, trace_ids: List[str]):
+    """全量重建：按 trace 重新聚合并覆盖摘要行"""
+    # 按 trace_id 排序，多个 trace 一起刷新时加锁顺序一致
+    trace_ids = sorted(trace_ids)
+    set_ = {
+        column: (lambda incoming, column=column: incoming[column])
+        for column in _SUMMARY_COLUMNS if column not in ("trace_id", "graph_seq")
+    }
+    set_["graph_seq"] = TraceSummaryDB.graph_seq + 1
+    for start in range(0, len(trace_ids), _CHUNK_SIZE):
+        yield _upsert(dialect_name, _full_select(trace_ids[start:start + _CHUNK_SIZE]), set_)
+
+
+def _delta_statement(dialect_name: str, changed: ColumnElement):
+    """增量更新：计数累加增量，时间取两者的较早 / 较晚，最新状态取更新时间较晚的一方"""
+    summary = TraceSummaryDB
+    set_ = {
+        # 需在 updated_at 之前赋值（MySQL 按顺序赋值）
+        "status": lambda incoming: case(
+            (or_(summary.updated_at.is_(None), incoming.updated_at >= summary.updated_at), incoming.status),
+            else_=summary.status
+        ),
+        "user_id": lambda incoming: case((summary.user_id == "", incoming.user_id), else_=summary.user_id),
+        "root_name": lambda incoming: func.coalesce(incoming.root_name, summary.root_name),
+        "total_count": lambda incoming: summary.total_count + incoming.total_count,
+        **{
+            column: (lambda incoming, column=column: getattr(summary, column) + incoming[column])
+            for column in _STATUS_COUNT_COLUMNS.values()
+        },
+        "created_at": lambda incoming: case(
+            (or_(summary.created_at.is_(None), incoming.created_at < summary.created_at), incoming.created_at),
+            else_=summary.created_at
+        ),
+        "updated_at": lambda incoming: case(
+            (or_(summary.updated_at.is_(None), incoming.updated_at > summary.updated_at), incoming.updated_at),
+            else_=summary.updated_at
+        ),
+        # 已存在的行在冲突更新时持有行锁，同一 trace 的版本号严格按提交顺序递增
+        "graph_seq": summary.graph_seq + 1,
+    }
+    return _upsert(dialect_name, _delta_select(changed), set_)
+
+
+class TraceSummaryMixin:
+    """
+    链路摘要维护与查询，由各方言的 EventInstanceRepository 混入
+    所有方法只在当前 session 中执行语句，不提交事务
+    """
+
+    session: AsyncSession
+
+    async def _on_instances_changed(self, changed: ColumnElement) -> None:
+        """
+        实例写入后调用（新增实例需先 flush），changed 为被写入实例的筛选条件
+        把这些实例的状态变化累加到所在 trace 的摘要，并标记为 trace 的最新图版本
+        """
+        inst = EventInstanceDB
+        await self.session.execute(_delta_statement(self.session.bind.dialect.name, changed))
+        latest_seq = (
+            select(TraceSummaryDB.graph_seq)
+            .where(TraceSummaryDB.trace_id == inst.trace_id)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(inst)
+            .where(changed)
+            # 显式保留 updated_at，避免 onupdate 把版本标记也当成一次业务更新
+            .values(graph_seq=latest_seq, summary_status=inst.status, updated_at=inst.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def _graph_version(self, trace_id: str) -> int:
+        stmt = select(TraceSummaryDB.graph_seq).where(TraceSummaryDB.trace_id == trace_id)
+        return (await self.session.execute(stmt)).scalar_one_or_none() or 0
+
+    async def _find_changed_instances(self, trace_id: str, since_version: int) -> List[EventInstanceDB]:
+        stmt = select(EventInstanceDB).where(
+            EventInstanceDB.trace_id == trace_id,
+            EventInstanceDB.graph_seq > since_version
+        )
+        return list((await self.session.execute(stmt)).scalars().all())
+
+    async def _find_trace_summaries(
+        self,
+        user_id: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[TraceCursor] = None
+    ) -> List[Dict[str, Any]]:
+        summary = TraceSummaryDB
+        stmt = select(summary).where(summary.user_id == user_id)
+        if start_time:
+            stmt = stmt.where(summary.created_at >= start_time)
+        if end_time:
+            stmt = stmt.where(summary.created_at <= end_time)
+        if cursor:
+            # 键集分页：从上一页最后一条 (created_at, trace_id) 之后继续
+            cursor_created_at, cursor_trace_id = cursor
+            stmt = stmt.where(or_(
+                summary.created_at < cursor_created_at,
+                (summary.created_at == cursor_created_at) & (summary.trace_id < cursor_trace_id)
+            ))
+        stmt = stmt.order_by(summary.created_at.desc(), summary.trace_id.desc()).limit(limit)
+        if offset:
+            stmt = stmt.offset(offset)
+
+        result = await self.session.execute(stmt)
+        return [
+            {
+                "trace_id": row.trace_id,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+                "status": row.status,
+                "root_name": row.root_name,
+                "total_count": row.total_count,
+                "status_counts": {
+                    EventInstanceStatus.PENDING.value: row.pending_count,
+                    EventInstanceStatus.RUNNING.value: row.running_count,
+                    EventInstanceStatus.SUCCESS.value: row.success_count,
+                    EventInstanceStatus.FAILED.value: row.failed_count,
+                    EventInstanceStatus.CANCELLED.value: row.cancelled_count,
+                    EventInstanceStatus.SKIPPED.value: row.skipped_count,
+                },
+            }
+            for row in result.scalars().all()
+        ]
+
+
+def rebuild_trace_summaries(conn: Connection) -> int:
+    """
+    根据 event_instances 全量重建链路摘要表（同步函数，配合 conn.run_sync 使用）
+    用于引入摘要表之前已存在的数据，返回写入的 trace 数
+    重建后所有实例的 summary_status 与当前状态一致，之后的写入按增量累加
+    """
+    inst = EventInstanceDB
+    trace_ids = list(conn.execute(select(inst.trace_id).distinct()).scalars())
+    for stmt in _refresh_statements(conn.dialect.name, trace_ids):
+        conn.execute(stmt)
+    conn.execute(
+        update(inst)
+        .values(summary_status=inst.status, updated_at=inst.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    return len(trace_ids)
@@ -77,6 +77,8 @@ class EventInstanceDB(Base):
     control_signal = Column(String(32), nullable=True)
     
     depends_on = Column(JSON, nullable=True)
+    # 尚未成功的依赖数，由 event_dependencies 增量维护，为 0 且 PENDING 即可调度
+    pending_deps = Column(Integer, nullable=False, default=0, server_default=text("0"))
     split_count = Column(Integer, default=0)
     completed_children = Column(Integer, default=0)
 
@@ -101,13 +103,82 @@ class EventInstanceDB(Base):
     finished_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # 最近一次写入时所在 trace 的图版本号（trace_summary.graph_seq），用于增量拉取拓扑
+    graph_seq = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # 上次计入 trace_summary 计数的状态，写入时据此求计数增量；为空表示尚未计入
+    summary_status = Column(Enum(EventInstanceStatus), nullable=True)
 
     __table_args__ = (
         Index("idx_trace_status", "trace_id", "status"),
+        Index("idx_trace_graph_seq", "trace_id", "graph_seq"),  # 拓扑增量查询
         Index("idx_request_root", "request_id", "parent_id"),  # 支持高效查询某个请求下的根节点
+        Index("idx_task_id", "task_id"),  # Worker 汇报按 task_id 定位实例
+        Index("idx_status_pending_deps", "status", "pending_deps"),  # 就绪任务查询
     )
 
 
+class EventDependencyDB(Base):
+    """
+    依赖边表：depends_on 的规范化形式，一行表示 instance_id 依赖 depends_on_id
+    satisfied 记录该依赖当前是否已成功，用于幂等地维护 pending_deps
+    """
+    __tablename__ = "event_dependencies"
+
+    instance_id = Column(String(64), primary_key=True)
+    depends_on_id = Column(String(64), primary_key=True)
+    satisfied = Column(Boolean, nullable=False, default=False, server_default=text("false"))
+
+    __table_args__ = (
+        Index("idx_dependency_upstream", "depends_on_id", "satisfied"),
+    )
+
+
+class TraceSummaryDB(Base):
+    """
+    链路摘要表：每个 trace 一行，由实例写入时同步刷新（upsert）
+    用户历史列表按 (user_id, created_at) 索引做范围扫描 + 键集分页，无需再聚合 event_instances
+    """
+    __tablename__ = "trace_summary"
+
+    trace_id = Column(String(64), primary_key=True)
+    user_id = Column(String(64), nullable=False, server_default=text("''"))
+    root_name = Column(String(128), nullable=True)
+    # 最近一次更新的实例状态（与原列表接口的“最新状态”口径一致）
+    status = Column(String(32), nullable=True)
+
+    total_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    pending_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    running_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    success_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    failed_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    cancelled_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    skipped_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+    created_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    # 图版本号：trace 下任一实例写入时加一，并记到被写入的实例上
+    graph_seq = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+    __table_args__ = (
+        # trace_id 作为同一时间点的次序键，键集分页不需要额外排序
+        Index("idx_trace_summary_user_created", "user_id", "created_at", "trace_id"),
+    )
+
+
+class SubtreeSignalDB(Base):
+    """
+    子树控制信号表：一行表示 trace 下以 path_prefix 为根的整棵子树的信号
+    path_prefix 为子树根节点的完整路径 node_path + task_id + "/"，整个 trace 的信号记为 "/"
+    节点的信号取其祖先前缀中最长的一条，取消/暂停子树只写一行，不再改写子孙实例
+    """
+    __tablename__ = "subtree_signals"
+
+    trace_id = Column(String(64), primary_key=True)
+    path_prefix = Column(String(512), primary_key=True)
+    signal = Column(String(32), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
 class EventLogDB(Base):
     __tablename__ = "event_logs"
 
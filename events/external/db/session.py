@@ -1,4 +1,4 @@
-from sqlalchemy import text
+from sqlalchemy import text, inspect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
 import os
@@ -55,43 +55,77 @@ async def get_db_session() -> AsyncSession:
     async with AsyncSessionFactory() as session:
         yield session
 
+def _add_missing_columns(sync_conn) -> None:
+    """已有表上补齐模型中新增的列；非空列需要 server_default，否则跳过"""
+    inspector = inspect(sync_conn)
+    for table_name, table in Base.metadata.tables.items():
+        existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+
+        for column_name, column in table.columns.items():
+            if column_name in existing_columns:
+                continue
+
+            # ⚠️ 注意：已有数据的表不能直接添加没有默认值的非空列
+            if not column.nullable and column.server_default is None:
+                print(f"⚠️ 跳过添加非空列 '{column_name}' 到表 '{table_name}'：缺少默认值。")
+                continue
+
+            col_type = column.type.compile(sync_conn.dialect)
+            nullable = "NULL" if column.nullable else "NOT NULL"
+            default_clause = ""
+            if column.server_default is not None:
+                default_clause = f" DEFAULT {column.server_default.arg}"
+
+            alter_sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {col_type}{default_clause} {nullable}"
+            try:
+                sync_conn.execute(text(alter_sql))
+                print(f"✅ 已添加列: {table_name}.{column_name}")
+            except Exception as e:
+                print(f"❌ 添加列失败: {alter_sql} | 错误: {e}")
+                raise
+
+
 # 建表函数
 async def create_tables():
     async with engine.begin() as conn:
+        # 依赖边表是否为本次新建（需要根据已有数据回填）
+        has_dependency_table = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("event_dependencies"))
+        has_summary_table = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("trace_summary"))
+        has_signal_table = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("subtree_signals"))
+        # 摘要计数改为增量维护之前的实例没有 summary_status，需要全量重建一次摘要
+        has_summary_status = await conn.run_sync(
+            lambda sync_conn: not inspect(sync_conn).has_table("event_instances") or "summary_status" in {
+                column["name"] for column in inspect(sync_conn).get_columns("event_instances")
+            }
+        )
+
         # 1. 创建所有不存在的表
         await conn.run_sync(Base.metadata.create_all)
 
-        # 2. 检查并添加缺失的列（仅 SQLite 需要，MySQL/PostgreSQL 由 SQLAlchemy 自动处理）
-        if dialect == "sqlite":
-            for table_name, table in Base.metadata.tables.items():
-                # 查询当前表的列名（使用 PRAGMA）
-                result = await conn.execute(text(f"PRAGMA table_info({table_name})"))
-                existing_columns = {row[1] for row in result.fetchall()}  # 第2列是 name
-
-                for column_name, column in table.columns.items():
-                    if column_name not in existing_columns:
-                        # 构建 ADD COLUMN 语句
-                        col_type = column.type.compile(engine.dialect)
-                        nullable = "NULL" if column.nullable else "NOT NULL"
-
-                        # ⚠️ 注意：SQLite 不允许对已有表添加 NOT NULL 列（除非有 DEFAULT）
-                        if not column.nullable and column.default is None and column.server_default is None:
-                            print(f"⚠️ 跳过添加非空列 '{column_name}' 到表 '{table_name}'：缺少默认值，SQLite 不支持。")
-                            continue
-
-                        # 如果有 server_default，可以安全设为 NOT NULL
-                        if not column.nullable:
-                            nullable = "NOT NULL"
-
-                        # 处理默认值
-                        default_clause = ""
-                        if column.server_default is not None:
-                            default_clause = f" DEFAULT {column.server_default.arg}"
-
-                        alter_sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {col_type} {nullable}{default_clause}"
-
-                        try:
-                            await conn.execute(text(alter_sql))
-                            print(f"✅ 已添加列: {table_name}.{column_name}")
-                        except Exception as e:
-                            print(f"❌ 添加列失败: {alter_sql} | 错误: {e}")
\ No newline at end of file
+        # 2. 已有表上补齐新增的列（create_all 不会修改已存在的表，各方言都需要）
+        await conn.run_sync(_add_missing_columns)
+
+        # 2.1 已有表上补建新增的索引（create_all 只为新建的表建索引）
+        def _create_missing_indexes(sync_conn):
+            for table in Base.metadata.tables.values():
+                for index in table.indexes:
+                    index.create(sync_conn, checkfirst=True)
+        await conn.run_sync(_create_missing_indexes)
+
+        # 3. 根据已有实例的 depends_on 回填依赖边表和 pending_deps
+        if not has_dependency_table:
+            from .impl.dependency_index import rebuild_dependency_index
+            edge_count = await conn.run_sync(rebuild_dependency_index)
+            print(f"✅ 已回填依赖边: {edge_count}")
+
+        # 4. 根据已有实例回填链路摘要表
+        if not has_summary_table or not has_summary_status:
+            from .impl.trace_summary import rebuild_trace_summaries
+            trace_count = await conn.run_sync(rebuild_trace_summaries)
+            print(f"✅ 已回填链路摘要: {trace_count}")
+
+        # 5. 根据实例上已有的 control_signal 回填子树信号表
+        if not has_signal_table:
+            from .impl.subtree_signal import rebuild_subtree_signals
+            signal_count = await conn.run_sync(rebuild_subtree_signals)
+            print(f"✅ 已回填子树信号: {signal_count}")
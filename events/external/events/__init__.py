@@ -1,9 +1,13 @@
 from .bus import EventBus
 from .bus_impl_redis import RedisEventBus
 from .bus_impl_memory import MemoryEventBus
+from .fanout import TraceFanout
+from .fanout_impl_redis import RedisTraceFanout
 
 __all__ = [
     'EventBus',
     'RedisEventBus',
-    'MemoryEventBus'
+    'MemoryEventBus',
+    'TraceFanout',
+    'RedisTraceFanout'
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, AsyncIterator
+from typing import Dict, Any, Optional, AsyncIterator, List, Tuple
 
 class EventBus(ABC):
     """
@@ -18,11 +18,25 @@ class EventBus(ABC):
         """
         pass
     
+    async def publish_many(self, topic: str, events: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        按顺序批量发布事件，默认逐条调用 publish，实现类可以覆盖为一次往返
+        :param topic: 主题
+        :param events: (event_type, key, payload) 列表
+        :return: 发送成功的条数
+        """
+        sent = 0
+        for event_type, key, payload in events:
+            if await self.publish(topic, event_type, key, payload):
+                sent += 1
+        return sent
+    
     @abstractmethod
-    async def subscribe(self, topic: str) -> AsyncIterator[Dict[str, Any]]:
+    async def subscribe(self, topic: str, subscriber: str = "default") -> AsyncIterator[Dict[str, Any]]:
         """
         订阅事件
         :param topic: 主题 (对应 Redis Key 或 Kafka Topic)
+        :param subscriber: 订阅方标识，同一进程内订阅同一主题的不同订阅方需各不相同
         :return: 事件迭代器
         """
         pass
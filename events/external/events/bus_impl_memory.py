@@ -29,10 +29,11 @@ class MemoryEventBus(EventBus):
         print(f"[MockBus] Published to {topic}: {event_type} - {payload}")
         return True
     
-    async def subscribe(self, topic: str) -> AsyncIterator[Dict[str, Any]]:
+    async def subscribe(self, topic: str, subscriber: str = "default") -> AsyncIterator[Dict[str, Any]]:
         """
         订阅内存事件
         :param topic: 主题
+        :param subscriber: 订阅方标识（内存实现不区分）
         :return: 事件迭代器
         """
         # 简单实现，返回所有事件
@@ -1,18 +1,33 @@
 import json
+import socket
 import time
-from typing import Dict, Any, Optional, AsyncIterator
+from typing import Dict, Any, Optional, AsyncIterator, List, Set, Tuple
 from .bus import EventBus
 from ..cache.base import CacheClient
+from config.settings import settings
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 class RedisEventBus(EventBus):
-    def __init__(self, cache_client: CacheClient):
+    def __init__(
+        self,
+        cache_client: CacheClient,
+        read_count: Optional[int] = None,
+        consumers: Optional[int] = None,
+        consumer_name: Optional[str] = None,
+        claim_idle_ms: Optional[int] = None,
+        block_ms: Optional[int] = None,
+    ):
         self.cache = cache_client
         self.consumer_group = "event_bus_group"
-        self.consumer_name = f"consumer-{int(time.time())}"
+        # 消费者名必须在重启间保持稳定，重启后才能续上自己未确认的消息
+        self.consumer_name = consumer_name or settings.event_bus_consumer_name or socket.gethostname()
+        self.read_count = max(1, read_count or settings.event_bus_read_count)
+        self.consumers = max(1, consumers or settings.event_bus_consumers)
+        self.claim_idle_ms = claim_idle_ms or settings.event_bus_claim_idle_ms
+        self.block_ms = block_ms or settings.event_bus_block_ms
 
     async def publish(self, topic: str, event_type: str, key: str, payload: Dict[str, Any]) -> bool:
         """
@@ -41,70 +56,176 @@ class RedisEventBus(EventBus):
             # 记录日志: logger.error(f"Event bus publish failed: {e}")
             return False
     
-    async def subscribe(self, topic: str) -> AsyncIterator[Dict[str, Any]]:
+    async def publish_many(self, topic: str, events: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        使用 Redis 管道一次发布多条事件（保持顺序）
+        :param topic: 对应 Redis Stream 的 Key
+        :param events: (event_type, key, payload) 列表
+        :return: 发送成功的条数
+        """
+        if not self.cache or not events:
+            return 0
+
+        ts = int(time.time() * 1000)
+        entries = [
+            {
+                "type": event_type,
+                "key": key,
+                "ts": ts,
+                "data": json.dumps(payload)
+            }
+            for event_type, key, payload in events
+        ]
+        try:
+            await self.cache.xadd_many(topic, entries, maxlen=100000)
+            return len(entries)
+        except Exception as e:
+            logger.error(f"Event bus batch publish failed: {e}")
+            return 0
+    
+    async def subscribe(self, topic: str, subscriber: str = "default") -> AsyncIterator[Dict[str, Any]]:
         """
         订阅 Redis Stream 事件
+        - 启动 consumers 个消费者协程（名称为 "<consumer_name>:<topic>:<subscriber>-<序号>"），
+          每次 XREADGROUP 批量读取 read_count 条；名称带上主题和订阅方，不同订阅之间不会共用待确认列表
+        - 调用方处理完一条消息（迭代器被再次推进）后才确认，确认批量合并为一次 XACK
+        - 消费者启动时先重放自己未确认的消息，并定期用 XAUTOCLAIM 接管其他消费者遗留的超时消息
+        - 已在本地队列或正在处理的消息即使空闲超时也不会被重复投递
         :param topic: 对应 Redis Stream 的 Key
+        :param subscriber: 订阅方标识，同一进程内订阅同一主题的不同订阅方需各不相同
         :return: 事件迭代器
         """
-
-        
         if not self.cache:
             return
-        
+
+        # 创建消费者组（如果不存在）
         try:
-            # 检查并创建消费者组
-            # 创建消费者组（如果不存在）
-            try:
-                await self.cache.xgroup_create(topic, self.consumer_group, mkstream=True)
-            except Exception:
-                # 消费者组已存在，正常情况
-                pass
-            
-            # ✅ 关键修复：使用 ">" 而不是 "$"，表示只读取新消息
-            last_id = ">"
+            await self.cache.xgroup_create(topic, self.consumer_group, mkstream=True)
+        except Exception:
+            # 消费者组已存在，正常情况
+            pass
 
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.read_count * self.consumers)
+        # 已投递到本地（在队列中或正在处理）但尚未确认的消息 ID
+        in_flight: Set[str] = set()
+        readers = [
+            asyncio.create_task(self._consume(topic, f"{self.consumer_name}:{topic}:{subscriber}-{index}", queue, in_flight))
+            for index in range(self.consumers)
+        ]
+        acks: List[str] = []
+        try:
             while True:
-                # 阻塞等待新事件，超时时间 1 秒
-                try:
-                    response = await self.cache.xreadgroup(
-                        group_name=self.consumer_group,
-                        consumer_name=self.consumer_name,
-                        streams={topic: last_id},
-                        count=1,
-                        block=1000  # 1秒超时，避免永久卡死
-                    )
-                except Exception as e:
-                    logger.warning(f"XREADGROUP failed: {e}")
-                    await asyncio.sleep(1)
-                    continue
+                # 没有积压时先把已处理的消息确认掉，再等待下一条
+                if acks and queue.empty():
+                    await self._ack(topic, acks, in_flight)
+                    acks = []
+                message = await queue.get()
+                yield message
+                acks.append(message["message_id"])
+                if len(acks) >= self.read_count:
+                    await self._ack(topic, acks, in_flight)
+                    acks = []
+        except asyncio.CancelledError:
+            logger.info("Subscription cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Event bus subscribe failed: {e}", exc_info=True)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            if acks:
+                await self._ack(topic, acks, in_flight)
 
-                if response:
-                    for stream_name, messages in response:
-                        for message_id, message in messages:
-                            # 解析字段
-                            event_type = message.get("type", "")
-                            key = message.get("key", "")
-                            data = message.get("data", "{}")
+    async def _consume(self, topic: str, consumer_name: str, queue: asyncio.Queue, in_flight: Set[str]) -> None:
+        """单个消费者协程：批量读取消息放入队列"""
+        # "0" 表示先读取本消费者已投递但未确认的消息，读完后切换到 ">" 只读新消息
+        last_id = "0"
+        next_claim_at = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # 自己的积压重放完后再接管别人的，避免同一条消息在本进程内重复投递
+                if last_id == ">" and loop.time() >= next_claim_at:
+                    next_claim_at = loop.time() + self.claim_idle_ms / 1000
+                    await self._claim_stale(topic, consumer_name, queue, in_flight)
 
-                            try:
-                                payload = json.loads(data)
-                            except json.JSONDecodeError:
-                                payload = {}
+                response = await self.cache.xreadgroup(
+                    group_name=self.consumer_group,
+                    consumer_name=consumer_name,
+                    streams={topic: last_id},
+                    count=self.read_count,
+                    block=self.block_ms
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"XREADGROUP failed: {e}")
+                await asyncio.sleep(1)
+                continue
 
-                            yield {
-                                "key": key,
-                                "event_type": event_type,
-                                "payload": payload,
-                                "message_id": message_id
-                            }
+            messages = [message for _, stream_messages in response or [] for message in stream_messages]
+            if last_id != ">":
+                if not messages:
+                    last_id = ">"
+                    continue
+                last_id = messages[-1][0]
+            await self._enqueue(topic, messages, queue, in_flight)
 
-                            # 注意：在消费者组中，last_id 不需要手动更新！
-                            # 因为我们始终用 ">"，Redis 自动管理偏移
+    async def _claim_stale(self, topic: str, consumer_name: str, queue: asyncio.Queue, in_flight: Set[str]) -> None:
+        """
+        用 XAUTOCLAIM 接管空闲超过 claim_idle_ms 的消息（通常来自已下线的消费者）
+        本订阅积压在队列里的消息同样会空闲超时并被认领回来，这些消息由 _enqueue 跳过
+        """
+        start_id = "0-0"
+        while True:
+            try:
+                start_id, messages = await self.cache.xautoclaim(
+                    topic, self.consumer_group, consumer_name,
+                    min_idle_ms=self.claim_idle_ms, start_id=start_id, count=self.read_count
+                )
+            except Exception as e:
+                logger.warning(f"XAUTOCLAIM failed: {e}")
+                return
+            if messages:
+                logger.info(f"Consumer {consumer_name} claimed {len(messages)} stale messages on {topic}")
+                await self._enqueue(topic, messages, queue, in_flight)
+            if start_id in ("0-0", b"0-0"):
+                return
 
-        except asyncio.CancelledError:
-            logger.info("Subscription cancelled")
-            raise
+    async def _enqueue(self, topic: str, messages: list, queue: asyncio.Queue, in_flight: Set[str]) -> None:
+        deleted = []
+        for message_id, message in messages:
+            if message_id in in_flight:
+                # 已在本地队列或正在处理，避免重复投递
+                continue
+            if not message:
+                # 消息已被 MAXLEN 裁剪，只剩待确认记录
+                deleted.append(message_id)
+                continue
+            in_flight.add(message_id)
+            await queue.put(self._decode(message_id, message))
+        if deleted:
+            await self._ack(topic, deleted)
+
+    async def _ack(self, topic: str, message_ids: List[str], in_flight: Optional[Set[str]] = None) -> None:
+        if in_flight is not None:
+            in_flight.difference_update(message_ids)
+        try:
+            await self.cache.xack(topic, self.consumer_group, message_ids)
         except Exception as e:
-            logger.error(f"Event bus subscribe failed: {e}", exc_info=True)
-            pass
+            # 未确认的消息会在超时后被重新接管，这里只记录日志
+            logger.warning(f"XACK failed for {len(message_ids)} messages: {e}")
+
+    @staticmethod
+    def _decode(message_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            payload = json.loads(message.get("data", "{}"))
+        except json.JSONDecodeError:
+            payload = {}
+        return {
+            "key": message.get("key", ""),
+            "event_type": message.get("type", ""),
+            "payload": payload,
+            "message_id": message_id
+        }
@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+# 收到某个 trace 的推送时的回调: (trace_id, 已序列化的消息文本)
+FanoutHandler = Callable[[str, str], Awaitable[None]]
+
+
+class TraceFanout(ABC):
+    """
+    跨进程的 trace 推送广播层
+    每个副本只订阅本地有 WebSocket 连接的 trace，消息只送达这些副本
+    """
+
+    @abstractmethod
+    async def start(self, handler: FanoutHandler) -> None:
+        """
+        开始接收推送
+        :param handler: 收到消息时的回调
+        """
+        pass
+
+    @abstractmethod
+    async def publish(self, trace_id: str, text: str) -> int:
+        """
+        向订阅了该 trace 的所有副本推送消息
+        :param trace_id: 链路ID
+        :param text: 已序列化的消息文本
+        :return: 收到消息的副本数
+        """
+        pass
+
+    @abstractmethod
+    async def subscribe(self, trace_id: str) -> None:
+        """本副本开始关注某个 trace"""
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, trace_id: str) -> None:
+        """本副本不再关注某个 trace"""
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+
+from .fanout import TraceFanout, FanoutHandler
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisTraceFanout(TraceFanout):
+    """
+    基于 Redis Pub/Sub 的 trace 推送广播
+    每个 trace 一个频道，副本只订阅本地有连接的 trace，未订阅的副本不会收到任何消息
+    """
+
+    CHANNEL_PREFIX = "trace_ws:"
+
+    def __init__(self, redis_url: str = settings.redis_url):
+        # Pub/Sub 需要独占连接，不与 RedisCacheClient 共用
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._handler: Optional[FanoutHandler] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, trace_id: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{trace_id}"
+
+    async def start(self, handler: FanoutHandler) -> None:
+        self._handler = handler
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def publish(self, trace_id: str, text: str) -> int:
+        return await self.redis.publish(self._channel(trace_id), text)
+
+    async def subscribe(self, trace_id: str) -> None:
+        await self.pubsub.subscribe(self._channel(trace_id))
+
+    async def unsubscribe(self, trace_id: str) -> None:
+        await self.pubsub.unsubscribe(self._channel(trace_id))
+
+    async def _listen(self) -> None:
+        prefix_len = len(self.CHANNEL_PREFIX)
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    # 没有任何订阅时连接尚未建立，稍后再读
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self.pubsub.get_message(timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                await self._handler(message["channel"][prefix_len:], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Trace fanout listener error: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        try:
+            await self.pubsub.aclose()
+            await self.redis.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close trace fanout: {e}")
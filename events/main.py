@@ -134,6 +134,9 @@ async def lifespan(app: FastAPI):
 
     # 启动后台任务
     tasks = []
+
+    # 接收其他副本转发的 WebSocket 推送
+    await connection_manager.start()
     
     # 启动ObserverService的事件监听任务
     observer_task = asyncio.create_task(
@@ -154,6 +157,12 @@ async def lifespan(app: FastAPI):
         task.cancel()
     await asyncio.gather(*tasks, return_exceptions=True)
 
+    await connection_manager.close()
+
+    # 写入已排队的 Worker 汇报
+    from entry.api.deps import get_execution_ingestor
+    await get_execution_ingestor().close()
+
     # 关闭 AgentMonitorService 使用的 session
     await agent_monitor_session.close()
     print("✅ AgentMonitorService session closed")
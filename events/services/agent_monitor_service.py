@@ -1,8 +1,10 @@
+import asyncio
 import json
 import time
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
+from config.settings import settings
 from external.cache.base import CacheClient
 from external.client.agent_client import AgentClient
 from external.events.bus import EventBus
@@ -15,6 +17,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 默认预估耗时（秒），任务名没有历史记录时使用
+DEFAULT_ESTIMATED_DURATION = 60
+
+# Agent 状态迁移脚本：状态存为哈希，读-改-写在 Redis 端原子完成，每个事件一次往返
+# KEYS: [状态键, 历史列表键]
+# ARGV: [kind, now, agent_id, data, state_ttl, history_entry, max_history_len, history_ttl]
+#   kind = start:    data 为新的 current_task
+#   kind = progress: data 为 task_info，合并进 current_task；此前不是 BUSY 时以 data 作为新任务
+#   kind = finish:   data 为 last_completed_task，清空 current_task
+#   kind = history:  只写历史列表
+#   history_entry 非空时追加到历史列表头部并裁剪
+_APPLY_EVENT_SCRIPT = """
+local state_key, history_key = KEYS[1], KEYS[2]
+local kind, now = ARGV[1], ARGV[2]
+local status = false
+if kind ~= 'history' then
+    local key_type = redis.call('TYPE', state_key).ok
+    if key_type ~= 'hash' and key_type ~= 'none' then
+        redis.call('DEL', state_key)
+    end
+    redis.call('HSET', state_key, 'agent_id', ARGV[3], 'last_seen', now)
+    if kind == 'start' then
+        redis.call('HSET', state_key, 'status', 'BUSY', 'current_task', ARGV[4])
+    elseif kind == 'progress' then
+        local task = cjson.decode(ARGV[4])
+        local current = redis.call('HGET', state_key, 'current_task')
+        if current and redis.call('HGET', state_key, 'status') == 'BUSY' then
+            local merged = cjson.decode(current)
+            for k, v in pairs(task) do merged[k] = v end
+            task = merged
+        else
+            task['start_time'] = tonumber(now)
+        end
+        redis.call('HSET', state_key, 'status', 'BUSY', 'current_task', cjson.encode(task))
+    elseif kind == 'finish' then
+        redis.call('HSET', state_key, 'status', 'IDLE', 'last_completed_task', ARGV[4])
+        redis.call('HDEL', state_key, 'current_task')
+    end
+    redis.call('EXPIRE', state_key, ARGV[5])
+    status = redis.call('HGET', state_key, 'status')
+end
+if ARGV[6] ~= '' then
+    redis.call('LPUSH', history_key, ARGV[6])
+    redis.call('LTRIM', history_key, 0, tonumber(ARGV[7]) - 1)
+    redis.call('EXPIRE', history_key, ARGV[8])
+end
+return status
+"""
+
+
+class _DurationEstimator:
+    """
+    按任务名缓存的平均耗时（秒）
+    - 任务名首次出现时查一次库，之后直接用本地值，过期后在后台刷新，不阻塞事件处理
+    - 任务完成时用实际耗时滚动更新本地均值
+    """
+
+    MAX_SAMPLES = 100  # 滚动均值的样本上限，越小越偏向近期耗时
+
+    def __init__(self, loader: Callable[[str], Awaitable[float]], ttl: float):
+        self._loader = loader
+        self.ttl = ttl
+        # task_name -> (平均耗时秒数, 样本数, 加载时间)
+        self._entries: Dict[str, Tuple[float, int, float]] = {}
+        self._refreshing: Set[str] = set()
+
+    async def estimate(self, task_name: str) -> float:
+        entry = self._entries.get(task_name)
+        if entry is None:
+            await self._refresh(task_name)
+            entry = self._entries.get(task_name)
+        elif time.monotonic() - entry[2] > self.ttl and task_name not in self._refreshing:
+            self._refreshing.add(task_name)
+            asyncio.create_task(self._refresh(task_name))
+        return entry[0] if entry and entry[0] > 0 else DEFAULT_ESTIMATED_DURATION
+
+    def observe(self, task_name: str, duration_seconds: float) -> None:
+        if duration_seconds <= 0:
+            return
+        avg, samples, loaded_at = self._entries.get(task_name, (0.0, 0, time.monotonic()))
+        samples = min(samples + 1, self.MAX_SAMPLES)
+        self._entries[task_name] = (avg + (duration_seconds - avg) / samples, samples, loaded_at)
+
+    async def _refresh(self, task_name: str) -> None:
+        try:
+            avg_ms = await self._loader(task_name)
+            _, samples, _ = self._entries.get(task_name, (0.0, 0, 0.0))
+            self._entries[task_name] = ((avg_ms or 0) / 1000, max(samples, 1), time.monotonic())
+        except Exception as e:
+            logger.warning(f"Failed to load average duration for task {task_name}: {e}")
+            # 加载失败也记一条，ttl 内不再重复查库
+            self._entries.setdefault(task_name, (0.0, 0, time.monotonic()))
+        finally:
+            self._refreshing.discard(task_name)
+
 
 class AgentMonitorService:
     def __init__(self, cache: CacheClient, event_bus: EventBus, 
@@ -39,105 +136,85 @@ class AgentMonitorService:
         
         self.topic_name = "job_event_stream"
 
+        # 事件处理与后台刷新共用同一个 session，数据库访问需串行
+        self._db_lock = asyncio.Lock()
+        self.duration_estimator = _DurationEstimator(self._load_avg_duration, settings.agent_duration_cache_ttl_sec)
+        # (agent_id, date_str) -> 待写入的日结增量，定期批量 upsert
+        self._pending_metrics: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.metric_flush_interval = settings.agent_metric_flush_interval_sec
+
     def _key_state(self, agent_id: str) -> str:
         return f"{self.PREFIX_STATE}{agent_id}"
 
     def _key_history(self, agent_id: str) -> str:
         return f"{self.PREFIX_HISTORY}{agent_id}"
 
+    async def _apply_event(
+        self,
+        agent_id: str,
+        kind: str,
+        data: Optional[dict] = None,
+        history_entry: Optional[dict] = None
+    ) -> Optional[str]:
+        """执行一次状态迁移（见 _APPLY_EVENT_SCRIPT），返回迁移后的状态"""
+        return await self.cache.run_script(
+            _APPLY_EVENT_SCRIPT,
+            keys=[self._key_state(agent_id), self._key_history(agent_id)],
+            args=[
+                kind,
+                repr(time.time()),
+                agent_id,
+                json.dumps(data, default=str) if data is not None else "",
+                self.STATE_TTL,
+                json.dumps(history_entry, default=str) if history_entry is not None else "",
+                self.MAX_HISTORY_LEN,
+                self.HISTORY_TTL,
+            ]
+        )
+
     async def update_agent_state(self, agent_id: str, event_type: str, payload: dict):
         """
         统一更新 Agent 状态。
-        不仅记录在做什么，还计算'还要做多久'。
+        不仅记录在做什么，还计算'还要做多久'（ETA 在读取状态时按当前时间计算）。
         """
-        key = self._key_state(agent_id)
-        current_time = time.time()
-        
-        # 1. 获取旧状态 (用于继承一些字段，如开始时间)
-        raw_state = await self.cache.get(key)
-        old_state = json.loads(raw_state) if raw_state else {}
-        
-        # 2. 构建新状态基础
-        new_state = {
-            "last_seen": current_time,
-            "agent_id": agent_id,
-            "meta": old_state.get("meta", {})
-        }
+        status = None
 
-        # 3. 根据事件类型分支处理
+        # 根据事件类型分支处理
         if event_type in ["TASK_STARTED", "STARTED"]:
             # === 刚开始忙 ===
             task_name = payload.get("task_name", "Unknown Task")
             
-            # [关键] 异步查询历史平均耗时，用于预估
-            avg_duration = await self.task_history_repo.get_avg_duration(task_name)
+            # [关键] 历史平均耗时用于预估，取本地缓存，不在事件处理路径上查库
+            avg_duration = await self.duration_estimator.estimate(task_name)
             
-            new_state.update({
-                "status": "BUSY",
-                "current_task": {
-                    "task_id": payload.get("task_id"),
-                    "trace_id": payload.get("trace_id"),
-                    "name": task_name,
-                    "start_time": current_time,
-                    "progress": 0,
-                    # 预估总耗时 (如果没有历史，默认 60s 或其他逻辑)
-                    "estimated_total_duration": avg_duration if avg_duration else 60
-                }
+            status = await self._apply_event(agent_id, "start", {
+                "task_id": payload.get("task_id"),
+                "trace_id": payload.get("trace_id"),
+                "name": task_name,
+                "start_time": time.time(),
+                "progress": 0,
+                # 预估总耗时 (如果没有历史，默认 60s)
+                "estimated_total_duration": avg_duration
             })
             
         elif event_type in ["AGENT_HEARTBEAT", "TASK_PROGRESS"]:
             # === 正在忙 (心跳) ===
-            # 如果 Redis 里没有旧状态（比如重启了），我们需要尽量从 payload 恢复
-            if not old_state or old_state.get("status") != "BUSY":
-                 # 兜底：如果心跳来了但状态是空的，标记为 BUSY 但信息可能不全
-                 new_state["status"] = "BUSY"
-                 new_state["current_task"] = payload.get("task_info", {})
-                 new_state["current_task"]["start_time"] = current_time # 无法追溯，暂用当前
-            else:
-                # 继承旧任务信息，只更新进度
-                current_task = old_state.get("current_task", {})
-                
-                # 更新进度
-                if "task_info" in payload:
-                    current_task.update(payload["task_info"]) # 覆盖进度
-                
-                # [关键] 计算 ETA (剩余时间)
-                start_time = current_task.get("start_time", current_time)
-                elapsed = current_time - start_time
-                total_est = current_task.get("estimated_total_duration", 60)
-                
-                # 简单的 ETA 逻辑：剩余 = 总预估 - 已过去
-                # 也可以根据当前进度推算: (elapsed / progress) * (100 - progress)
-                remaining = max(0, total_est - elapsed)
-                
-                current_task["metrics"] = {
-                    "elapsed_seconds": int(elapsed),
-                    "estimated_remaining_seconds": int(remaining),
-                    "is_overtime": elapsed > total_est # 是否超时
-                }
-                
-                new_state["status"] = "BUSY"
-                new_state["current_task"] = current_task
+            # 已是 BUSY 时合并进度到当前任务；否则（比如重启了）以心跳里的任务信息兜底，开始时间暂用当前
+            status = await self._apply_event(agent_id, "progress", payload.get("task_info") or {})
 
         elif event_type in ["TASK_COMPLETED", "TASK_FAILED"]:
             # === 刚做完 (闲) ===
             # 我们不立即删除 key，而是置为 IDLE，保留最后一次任务的结果供前端展示
             # 前端看到 IDLE，就知道现在没活，但可以看到"刚做完了 Task A"
-            new_state.update({
-                "status": "IDLE",
-                "current_task": None, # 清空当前
-                "last_completed_task": {
-                    "task_id": payload.get("task_id"),
-                    "name": payload.get("task_name"),
-                    "finished_at": current_time,
-                    "status": "SUCCESS" if event_type == "TASK_COMPLETED" else "FAILED",
-                    "result_summary": str(payload.get("result", ""))[:50]
-                }
+            status = await self._apply_event(agent_id, "finish", {
+                "task_id": payload.get("task_id"),
+                "name": payload.get("task_name"),
+                "finished_at": time.time(),
+                "status": "SUCCESS" if event_type == "TASK_COMPLETED" else "FAILED",
+                "result_summary": str(payload.get("result", ""))[:50]
             })
 
-        # 4. 写入 Redis
-        await self.cache.set(key, json.dumps(new_state), ex=self.STATE_TTL)
-        logger.info(f"Updated state for agent {agent_id}, new status: {new_state['status']}")
+        logger.info(f"Updated state for agent {agent_id}, new status: {status}")
 
     async def report_task_result(self, agent_id: str, task_result: dict):
         """
@@ -155,16 +232,8 @@ class AgentMonitorService:
         }
         """
         logger.info(f"Received task result from agent {agent_id}, task_result: {json.dumps(task_result)}")
-        key = self._key_history(agent_id)
-        
-        # 1. 存入 Redis List (左进)
-        await self.cache.lpush(key, json.dumps(task_result))
-        
-        # 2. 裁剪 List 长度 (保持最近 N 条)，防止无限增长
-        await self.cache.ltrim(key, 0, self.MAX_HISTORY_LEN - 1)
-        
-        # 3. 刷新过期时间 (只要有活动，历史就保留)
-        await self.cache.expire(key, self.HISTORY_TTL)
+        # 存入 Redis List (左进)、裁剪到最近 N 条、刷新过期时间，一次往返完成
+        await self._apply_event(agent_id, "history", history_entry=task_result)
         logger.info(f"Saved task result to history for agent {agent_id}, task_id: {task_result.get('task_id')}")
         
     async def get_agent_backlog(self, agent_id: str) -> List[dict]:
@@ -200,6 +269,65 @@ class AgentMonitorService:
         
         return [json.loads(item) for item in raw_list]
 
+    def _decode_state(self, raw: Dict[str, str], current_time: float) -> Optional[dict]:
+        """把状态哈希还原为字典，BUSY 时按当前时间补充 current_task 的 ETA"""
+        if not raw:
+            return None
+        state = {
+            "agent_id": raw.get("agent_id"),
+            "last_seen": float(raw.get("last_seen") or 0),
+            "status": raw.get("status", "IDLE"),
+            "meta": json.loads(raw["meta"]) if raw.get("meta") else {},
+            "current_task": json.loads(raw["current_task"]) if raw.get("current_task") else None,
+            "last_completed_task": json.loads(raw["last_completed_task"]) if raw.get("last_completed_task") else None,
+        }
+        current_task = state["current_task"]
+        if state["status"] == "BUSY" and current_task:
+            # [关键] 计算 ETA (剩余时间)
+            start_time = current_task.get("start_time") or current_time
+            elapsed = current_time - start_time
+            total_est = current_task.get("estimated_total_duration", DEFAULT_ESTIMATED_DURATION)
+            
+            # 简单的 ETA 逻辑：剩余 = 总预估 - 已过去
+            # 也可以根据当前进度推算: (elapsed / progress) * (100 - progress)
+            remaining = max(0, total_est - elapsed)
+            
+            current_task["metrics"] = {
+                "elapsed_seconds": int(elapsed),
+                "estimated_remaining_seconds": int(remaining),
+                "is_overtime": elapsed > total_est # 是否超时
+            }
+        return state
+
+    async def _get_states(self, agent_ids: List[str]) -> Dict[str, Optional[dict]]:
+        """批量读取 Agent 状态 (一次网络 IO)"""
+        raw_values = await self.cache.hgetall_many([self._key_state(aid) for aid in agent_ids])
+        current_time = time.time()
+        return {aid: self._decode_state(raw, current_time) for aid, raw in zip(agent_ids, raw_values)}
+
+    def _status_entry(self, data: Optional[dict], current_time: float) -> dict:
+        if not data:
+            return {
+                "is_alive": True,
+                "status_label": "ONLINE",
+                "last_seen_seconds_ago": None,
+                "current_task": None
+            }
+        last_seen = data.get("last_seen", 0)
+        time_diff = current_time - last_seen
+        
+        # 简单判定：超过 TTL 说明 Redis key 本该消失，这里再做一层逻辑兜底
+        status_label = data.get("status", "IDLE")
+        if time_diff > self.STATE_TTL:
+            status_label = "ONLINE"
+
+        return {
+            "is_alive": status_label != "ONLINE",
+            "status_label": status_label,
+            "last_seen_seconds_ago": int(time_diff),
+            "current_task": data.get("current_task")
+        }
+
     async def get_agents_status_map(self, agent_ids: List[str]) -> Dict[str, dict]:
         """
         批量获取 Agent 的实时状态 (用于列表页/树状图)
@@ -207,37 +335,9 @@ class AgentMonitorService:
         if not agent_ids:
             return {}
             
-        keys = [self._key_state(aid) for aid in agent_ids]
-        raw_values = await self.cache.mget(keys)
-        
-        result = {}
+        states = await self._get_states(agent_ids)
         current_time = time.time()
-        
-        for agent_id, raw_val in zip(agent_ids, raw_values):
-            if not raw_val:
-                result[agent_id] = {
-                    "is_alive": True,
-                    "status_label": "ONLINE",
-                    "last_seen_seconds_ago": None,
-                    "current_task": None
-                }
-            else:
-                data = json.loads(raw_val)
-                last_seen = data.get("last_seen", 0)
-                time_diff = current_time - last_seen
-                
-                # 简单判定：超过 TTL 说明 Redis key 本该消失，这里再做一层逻辑兜底
-                status_label = data.get("status", "IDLE")
-                if time_diff > self.STATE_TTL:
-                    status_label = "ONLINE"
-
-                result[agent_id] = {
-                    "is_alive": status_label != "ONLINE",
-                    "status_label": status_label,
-                    "last_seen_seconds_ago": int(time_diff),
-                    "current_task": data.get("current_task")
-                }
-        return result
+        return {aid: self._status_entry(states[aid], current_time) for aid in agent_ids}
 
     async def enrich_subtree_with_status(self, subtree_root: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -367,9 +467,9 @@ class AgentMonitorService:
             # 容错处理，如果agent_client不支持get_agent_metadata方法
             pass
         
-        # 2. 实时状态 (Redis)
-        status_map = await self.get_agents_status_map([agent_id])
-        current_state = status_map.get(agent_id, {})
+        # 2. 实时状态 (Redis)，同时用于下面的任务信息和 ETA
+        state_data = (await self._get_states([agent_id]))[agent_id]
+        current_state = self._status_entry(state_data, time.time())
         
         # 3. 历史履历 (Database) - 相比Redis List，用DB我们可以做分页、按时间筛选
         history_list = await self.task_history_repo.get_recent_tasks(agent_id, limit=50)
@@ -384,12 +484,7 @@ class AgentMonitorService:
         # 5. 最近7天的趋势数据 (可选)
         recent_metrics = await self.daily_metric_repo.get_recent_metrics(agent_id, days=7)
         
-        # 6. 获取实时状态数据（用于获取更详细的任务信息和ETA）
-        key = self._key_state(agent_id)
-        raw_state = await self.cache.get(key)
-        state_data = json.loads(raw_state) if raw_state else None
-        
-        # 7. 判断真实状态
+        # 6. 判断真实状态
         status_label = "OFFLINE"
         current_task_display = None
         metrics_display = None
@@ -405,10 +500,10 @@ class AgentMonitorService:
                 }
                 metrics_display = current_task.get("metrics") # 包含 ETA
         
-        # 8. 获取积压任务 (Next Steps)
+        # 7. 获取积压任务 (Next Steps)
         backlog = await self.get_agent_backlog(agent_id)
 
-        # 9. 组装看板数据结构
+        # 8. 组装看板数据结构
         return {
             "agent_id": agent_id,
             # 卡片头部：身份信息
@@ -445,12 +540,57 @@ class AgentMonitorService:
             }
         }
     
+    async def _load_avg_duration(self, task_name: str) -> float:
+        async with self._db_lock:
+            return await self.task_history_repo.get_avg_duration(task_name)
+
+    def _record_daily_metric(self, agent_id: str, date_str: str, status: str, duration_ms: int) -> None:
+        """日结统计先在内存中累加，由 flush_daily_metrics 批量写库"""
+        metric = self._pending_metrics.setdefault((agent_id, date_str), {
+            "total_tasks": 0, "success_tasks": 0, "failed_tasks": 0, "total_duration_ms": 0
+        })
+        metric["total_tasks"] += 1
+        if status == "COMPLETED":
+            metric["success_tasks"] += 1
+        elif status == "FAILED":
+            metric["failed_tasks"] += 1
+        metric["total_duration_ms"] += duration_ms or 0
+
+    async def flush_daily_metrics(self) -> None:
+        """把内存中累计的日结增量一次批量 upsert 到数据库，失败时保留到下一次"""
+        if not self._pending_metrics:
+            return
+        pending, self._pending_metrics = self._pending_metrics, {}
+        rows = [
+            {"agent_id": agent_id, "date_str": date_str, **counts}
+            for (agent_id, date_str), counts in pending.items()
+        ]
+        try:
+            async with self._db_lock:
+                await self.daily_metric_repo.bulk_upsert_daily_metrics(rows)
+            logger.info(f"Flushed daily metrics for {len(rows)} agent-days")
+        except BaseException as e:
+            # 写库失败或被取消时放回缓冲区，由下一次 flush 重试
+            for key, counts in pending.items():
+                merged = self._pending_metrics.setdefault(key, dict.fromkeys(counts, 0))
+                for field, value in counts.items():
+                    merged[field] += value
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Failed to flush daily metrics, will retry: {e}", exc_info=True)
+
+    async def _flush_metrics_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.metric_flush_interval)
+            await self.flush_daily_metrics()
+
     async def handle_task_completed_event(self, payload: Dict[str, Any]):
         """
         处理任务完成/失败事件
         这是一个"归档"动作：
-        1. 清理/更新 Redis 里的当前状态
+        1. 更新 Redis 里的当前状态并写入历史列表（一次往返）
         2. 将完整记录写入 Database
+        3. 日结统计在内存中累计，定期批量写库
         """
         agent_id = payload.get("agent_id")
         if not agent_id:
@@ -461,30 +601,17 @@ class AgentMonitorService:
         status = payload.get("status")
         logger.info(f"Handling task completed event for agent {agent_id}, task_id: {task_id}, status: {status}")
 
-        # 1. 更新 Redis 状态 (可选：也可以等下一次心跳覆盖，但主动更新更实时)
-        # 任务结束了，Agent 理论上变回 IDLE，或者保留 Last Result
-        key = self._key_state(agent_id)
-        # 我们不仅要把它变闲，最好把上一个任务的结果稍微缓存一下，方便前端弹窗"刚刚完成了啥"
-        raw_state = await self.cache.get(key)
-        if raw_state:
-            state = json.loads(raw_state)
-            state["status"] = "IDLE"
-            state["last_completed_task"] = payload # 暂存一下最后的结果
-            # 清空 current_task
-            state["current_task"] = None
-            await self.cache.set(key, json.dumps(state), ex=self.STATE_TTL)
-            logger.info(f"Updated agent {agent_id} state to IDLE after task completion")
-        else:
-            logger.info(f"No existing state found for agent {agent_id} when handling task completion")
-
-        # 2. 写入 Redis 历史列表 (用于快速查询最近记录)
-        await self.report_task_result(agent_id, payload)
+        # 1. 任务结束了，Agent 变回 IDLE，并把这次任务的结果缓存下来，方便前端弹窗"刚刚完成了啥"；
+        #    同时写入 Redis 历史列表 (用于快速查询最近记录)
+        await self._apply_event(agent_id, "finish", payload, history_entry=payload)
+        logger.info(f"Updated agent {agent_id} state to IDLE and saved task {task_id} to history")
 
-        # 3. 写入数据库 (持久化)
-        await self.task_history_repo.create(payload)
+        # 2. 写入数据库 (持久化)
+        async with self._db_lock:
+            await self.task_history_repo.create(payload)
         logger.info(f"Saved task {task_id} result to database for agent {agent_id}")
 
-        # 4. 更新日结统计表 (可选，但推荐)
+        # 3. 更新日结统计 (可选，但推荐)
         end_time = payload.get("end_time")
         if end_time:
             if isinstance(end_time, str):
@@ -507,13 +634,9 @@ class AgentMonitorService:
                 else:
                     duration_ms = 0
             
-            await self.daily_metric_repo.update_daily_metric(
-                agent_id=agent_id,
-                date_str=end_date.isoformat(),
-                status=payload.get("status", "COMPLETED"),
-                duration_ms=duration_ms
-            )
-            logger.info(f"Updated daily metrics for agent {agent_id} on {end_date.isoformat()}")
+            self._record_daily_metric(agent_id, end_date.isoformat(), payload.get("status", "COMPLETED"), duration_ms)
+            if payload.get("task_name"):
+                self.duration_estimator.observe(payload["task_name"], duration_ms / 1000)
 
     async def handle_event(self, message: Dict[str, Any]):
         """
@@ -528,12 +651,8 @@ class AgentMonitorService:
             logger.warning(f"Event {event_type} received without agent_id, payload: {json.dumps(payload)}")
             return
 
-        # 统一路由到状态更新逻辑
-        if event_type in ["TASK_STARTED", "TASK_COMPLETED", "TASK_FAILED", "AGENT_HEARTBEAT", "TASK_PROGRESS"]:
-             await self.update_agent_state(agent_id, event_type, payload)
-        
-        # 只有完成事件才归档历史
         if event_type in ["TASK_COMPLETED", "TASK_FAILED"]:
+            # 完成事件：状态迁移与归档历史合并处理
             # 确保payload包含status字段
             if event_type == "TASK_COMPLETED":
                 payload["status"] = "COMPLETED"
@@ -541,6 +660,8 @@ class AgentMonitorService:
                 payload["status"] = "FAILED"
             # 处理任务完成/失败事件
             await self.handle_task_completed_event(payload)
+        elif event_type in ["TASK_STARTED", "AGENT_HEARTBEAT", "TASK_PROGRESS"]:
+            await self.update_agent_state(agent_id, event_type, payload)
         else:
             logger.info(f"Event {event_type} for agent {agent_id} not handled")
     
@@ -549,8 +670,9 @@ class AgentMonitorService:
         启动事件监听
         """
         logger.info(f"Starting event listener for topic: {self.topic_name}")
+        flush_task = asyncio.create_task(self._flush_metrics_periodically())
         try:
-            async for message in self.event_bus.subscribe(self.topic_name):
+            async for message in self.event_bus.subscribe(self.topic_name, subscriber="agent_monitor"):
                 try:
                     await self.handle_event(message)
                 except Exception as e:
@@ -558,4 +680,7 @@ class AgentMonitorService:
         except Exception as e:
             logger.critical(f"Event listener failed with exception: {e}", exc_info=True)
         finally:
+            flush_task.cancel()
+            # 停止前写入尚未落库的日结统计
+            await self.flush_daily_metrics()
             logger.info(f"Event listener stopped for topic: {self.topic_name}")
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .lifecycle_service import LifecycleService
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionEventIngestor:
+    """
+    Worker 汇报的组提交写入器
+
+    并发到达的汇报在一个很短的窗口内合并为一批，交给 LifecycleService.sync_execution_states
+    在一个会话/事务中写入；调用方等待所在批次提交后才返回，因此接口响应时数据已经持久化。
+    整批失败时回退为逐个请求单独提交，避免一条坏数据拖垮同批的其他请求。
+    """
+
+    def __init__(
+        self,
+        lifecycle_svc: LifecycleService,
+        session_factory: Callable[[], AsyncSession],
+        window_ms: int = 5,
+        max_batch: int = 500,
+    ):
+        self.lifecycle_svc = lifecycle_svc
+        self.session_factory = session_factory
+        self.window = max(0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, execution_args: dict) -> None:
+        """提交一条汇报，等待其所在批次提交"""
+        await self.submit_many([execution_args])
+
+    async def submit_many(self, events: List[dict]) -> None:
+        """提交一组汇报（组内保持顺序），等待其所在批次提交"""
+        if not events:
+            return
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((events, future))
+        # 请求被取消时批次仍会照常写入
+        await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """停止后台任务，并写入已排队的汇报"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        if self._queue is not None:
+            pending = self._drain([])
+            if pending:
+                await self._flush(pending)
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def _drain(self, batch: List[Tuple[List[dict], asyncio.Future]]) -> List[Tuple[List[dict], asyncio.Future]]:
+        count = sum(len(events) for events, _ in batch)
+        while count < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            # 先等一个合并窗口，再一次性取走已排队的汇报
+            if self.window and len(first[0]) < self.max_batch:
+                await asyncio.sleep(self.window)
+            batch = self._drain([first])
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Event ingest batch crashed: {e}", exc_info=True)
+
+    async def _flush(self, batch: List[Tuple[List[dict], asyncio.Future]]) -> None:
+        events = [event for group, _ in batch for event in group]
+        try:
+            await self._write(events)
+            self._resolve(batch, None)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch, e)
+                return
+            logger.warning(f"Batch of {len(events)} events failed, retrying per request: {e}")
+
+        for group, future in batch:
+            try:
+                await self._write(group)
+                self._resolve([(group, future)], None)
+            except Exception as e:
+                self._resolve([(group, future)], e)
+
+    async def _write(self, events: List[dict]) -> None:
+        async with self.session_factory() as session:
+            try:
+                apply_side_effects = await self.lifecycle_svc.sync_execution_states(session, events)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        if apply_side_effects is None:
+            return
+        # 提交成功后才更新缓存、发布事件；此处失败不影响已提交的写入，也不能触发逐条重试（否则流水重复）
+        try:
+            await apply_side_effects()
+        except Exception as e:
+            logger.error(f"Failed to apply side effects for {len(events)} committed events: {e}", exc_info=True)
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[List[dict], asyncio.Future]], error: Optional[BaseException]) -> None:
+        for _, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
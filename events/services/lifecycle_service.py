@@ -3,7 +3,7 @@ import uuid
 import json
 import logging
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Awaitable, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
@@ -15,6 +15,8 @@ from external.cache.base import CacheClient
 from external.db.session import dialect
 from external.db.impl import create_event_instance_repo
 from external.events.bus import EventBus
+from common.signal import SignalStatus
+from .signal_service import SignalService
 
 ##TODO:这里有双写一致性问题，后期再解决
 ##TODO：这里的定义可能不需要，后期考虑移除
@@ -26,6 +28,7 @@ class LifecycleService:
     ):
         self.event_bus = event_bus
         self.cache = cache
+        self.signal_service = SignalService(cache)
         self.topic_name = "job_event_stream"
         # 定义 Redis Key 前缀
         self.CACHE_PREFIX = "ev:inst:"
@@ -104,10 +107,20 @@ class LifecycleService:
              raw = await self.cache.get(key)
              if raw:
                  current_data = json.loads(raw) if isinstance(raw, str) else raw
-             else:
-                 # 极端情况：缓存没了，不处理或仅更新现有字段
-                 # 这里选择仅写入 update_fields，虽然不完整，但包含了最新状态
-                 current_data = {"task_id": task_id} # 至少保证 task_id 存在
+
+        current_data = self._merge_cache_data(task_id, current_data, update_fields)
+        await self.cache.set(key, json.dumps(current_data), ex=self.CACHE_TTL)
+
+    def _merge_cache_data(self, task_id: str, current_data: Optional[dict], update_fields: dict) -> dict:
+        """
+        将更新字段合并到缓存中的实例数据（返回新字典）
+        """
+        if current_data:
+            current_data = dict(current_data)
+        else:
+            # 极端情况：缓存没了，不处理或仅更新现有字段
+            # 这里选择仅写入 update_fields，虽然不完整，但包含了最新状态
+            current_data = {"task_id": task_id} # 至少保证 task_id 存在
 
         # 合并数据
         # 注意：处理 datetime 对象的序列化
@@ -120,8 +133,7 @@ class LifecycleService:
         
         current_data.update(safe_updates)
         current_data["task_id"] = task_id # 确保 task_id 存在
-        
-        await self.cache.set(key, json.dumps(current_data), ex=self.CACHE_TTL)
+        return current_data
 
     async def _create_log_entry(
         self,
@@ -287,14 +299,6 @@ class LifecycleService:
            {"id": "external-id-2", "def_id": "AGG_GROUP", "name": "Group B", "params": {...}}
         ]
         """
-        # 【修改点 1】: 快速失败 (Fast Fail)
-        # 在查数据库之前，先查缓存。如果整个 Trace 已经被杀掉，直接抛异常，省一次 DB 查询。
-        if trace_id and self.cache:
-            # 这里的 key 必须和 SignalService 里的 key 保持绝对一致
-            cached_signal = await self.cache.get(f"trace_signal:{trace_id}")
-            if cached_signal == "CANCEL":
-                raise ValueError(f"Trace {trace_id} has been cancelled (Cache Hit)")
-
         # 1. 【读取优化】从缓存获取 Parent
         # 这避免了一次 DB SELECT
         parent_data = await self._get_instance_with_cache(session, parent_id)
@@ -306,7 +310,11 @@ class LifecycleService:
         if trace_id and parent_data['trace_id'] != trace_id:
              raise ValueError(f"Parent node {parent_id} does not belong to trace {trace_id}")
         
-        if parent_data.get('control_signal') == "CANCEL":
+        # 按子树信号表解析父节点的信号（最长前缀匹配），被取消的 trace 或子树下的任意节点都会命中
+        parent_signal = (await self.signal_service.resolve_signals(
+            parent_data['trace_id'], [(parent_data.get('node_path'), parent_data.get('task_id'))], session
+        )).get(parent_data.get('task_id'))
+        if parent_signal == SignalStatus.CANCELLED.value:
             raise ValueError("Parent event is cancelled")
 
         new_instances = []
@@ -348,7 +356,7 @@ class LifecycleService:
                 created_at=datetime.now(timezone.utc),
                 # 【修改点 3】: 状态继承 (Inheritance)
                 # 关键！如果父节点有信号（比如 PAUSE），子节点必须继承。
-                control_signal=parent_data.get('control_signal')
+                control_signal=parent_signal
             )
             new_instances.append(child)
             
@@ -405,26 +413,106 @@ class LifecycleService:
         """
         【核心方法】接收 Worker 汇报 -> 记流水 -> 更新状态
         execution_args 包含: task_id, event_type, data, error, worker_id, agent_id...
+        返回值同 sync_execution_states，调用方 commit 成功后执行
+        """
+        return await self.sync_execution_states(session, [execution_args])
+
+    async def sync_execution_states(
+        self,
+        session: AsyncSession,
+        events: List[dict]
+    ) -> Optional[Callable[[], Awaitable[None]]]:
+        """
+        【组提交】按顺序处理一批 Worker 汇报，调用方负责 commit
+        - 同一 task 的多条事件按顺序合并为一次实例投影，批量 UPSERT
+        - 每条事件各记一条流水，多行 INSERT（与实例更新在同一事务）
+        - 缓存一次 MGET 读取、一次管道写回，流事件一次管道发布
+
+        缓存写回和流事件发布不在这里执行，而是作为返回的回调交给调用方：
+        只有 commit 成功后才应执行，事务回滚时缓存与事件流不会出现未生效的状态
         """
-        task_id = execution_args.get("task_id")
-        event_type = execution_args.get("event_type")
-        trace_id = execution_args.get("trace_id") # 最好由 Worker 透传，否则要查
-        
         # =========================================
         # 0. 防御性检查：如果没有 trace_id，几乎无法挽救
         # =========================================
-        if not trace_id:
-            # 尝试最后一次努力：查缓存（虽然此时还没创建，但万一有其他并发？）
-            instance_cache = await self._get_instance_with_cache(session, task_id)
-            trace_id = instance_cache.get('trace_id') if instance_cache else None
-            if not trace_id:
-                print(f"CRITICAL: Task {task_id} has no trace_id and not found in DB.")
-                return
+        resolved = []
+        for execution_args in events:
+            task_id = execution_args.get("task_id")
+            if not execution_args.get("trace_id"):
+                # 尝试最后一次努力：查缓存（虽然此时还没创建，但万一有其他并发？）
+                instance_cache = await self._get_instance_with_cache(session, task_id)
+                trace_id = instance_cache.get('trace_id') if instance_cache else None
+                if not trace_id:
+                    print(f"CRITICAL: Task {task_id} has no trace_id and not found in DB.")
+                    continue
+                execution_args = {**execution_args, "trace_id": trace_id}
+            resolved.append((execution_args, self._project_update_fields(execution_args)))
+
+        if not resolved:
+            return None
 
         # =========================================
-        # B. 第一步：状态投影 (State Projection)
-        # 根据事件类型，计算 Instance 应该变成什么样
+        # C. 执行批量 UPSERT（同一 task 的更新按到达顺序合并）
         # =========================================
+        merged: Dict[str, tuple] = {}
+        for execution_args, update_fields in resolved:
+            task_id = execution_args["task_id"]
+            if task_id in merged:
+                merged[task_id][1].update(update_fields)
+            else:
+                merged[task_id] = (execution_args["trace_id"], dict(update_fields))
+
+        inst_repo = create_event_instance_repo(session, dialect)
+        instance_ids = await inst_repo.bulk_upsert_by_task_id(
+            [(task_id, trace_id, fields) for task_id, (trace_id, fields) in merged.items()]
+        )
+        await session.flush()
+
+        # 读取实例快照：Redis 一次 MGET，未命中的从 DB 批量加载
+        task_ids = list(merged)
+        raw_values = await self.cache.mget([self._cache_key(task_id) for task_id in task_ids])
+        states: Dict[str, Optional[dict]] = {}
+        missing = []
+        for task_id, raw in zip(task_ids, raw_values):
+            if raw:
+                states[task_id] = json.loads(raw) if isinstance(raw, str) else raw
+            else:
+                missing.append(task_id)
+        if missing:
+            for instance in await inst_repo.get_by_task_ids(missing):
+                states.setdefault(instance.task_id, self._serialize(instance))
+
+        # =========================================
+        # A. 记流水 & 准备推送（逐条事件，按顺序推进内存中的实例快照）
+        # =========================================
+        log_rows = []
+        stream_events = []
+        for execution_args, update_fields in resolved:
+            task_id = execution_args["task_id"]
+            trace_id = execution_args["trace_id"]
+            instance_cache = states.get(task_id)
+
+            log_rows.append(self._build_log_row(instance_ids[task_id], trace_id, execution_args))
+            stream_events.extend(self._build_stream_events(execution_args, update_fields, instance_cache))
+            states[task_id] = self._merge_cache_data(task_id, instance_cache, update_fields)
+
+        await self._create_log_entries(session, log_rows)
+
+        # =========================================
+        # E. 更新缓存 & 推送通知 (Side Effects，提交后由调用方执行)
+        # =========================================
+        cache_values = {self._cache_key(task_id): json.dumps(states[task_id]) for task_id in task_ids}
+
+        async def apply_side_effects() -> None:
+            await self.cache.mset(cache_values, ttl=self.CACHE_TTL)
+            await self.event_bus.publish_many(self.topic_name, stream_events)
+
+        return apply_side_effects
+
+    def _project_update_fields(self, execution_args: dict) -> dict:
+        """
+        状态投影 (State Projection)：根据事件类型，计算 Instance 应该变成什么样
+        """
+        event_type = execution_args.get("event_type")
         update_fields = {"updated_at": datetime.now(timezone.utc)}
 
         # 提取常用字段
@@ -468,77 +556,52 @@ class LifecycleService:
         if "enriched_context_snapshot" in execution_args:
              update_fields["runtime_state_snapshot"] = execution_args["enriched_context_snapshot"]
 
-        # =========================================
-        # C. 第二步：执行 UPDATE 或 UPSERT
-        # 现在使用封装好的 upsert_by_task_id 方法
-        # =========================================
-        # 创建仓库实例
-        inst_repo = create_event_instance_repo(session, dialect)
-        
-        # 执行 upsert 操作，返回实例 ID
-        instance_uuid = await inst_repo.upsert_by_task_id(
-            task_id=task_id,
-            trace_id=trace_id,
-            **update_fields
-        )
-        await session.flush()
-        # 确保 instance_cache 有值（用于后续日志和缓存更新）
-        instance_cache = await self._get_instance_with_cache(session, task_id)
-        if not instance_cache:
-            # 如果缓存没命中，说明是新建的实例，需要手动构建缓存数据
-            # 使用仓库层的 get 方法获取实例
-            instance = await inst_repo.get(instance_uuid)
-            
-            # 构建缓存数据
-            instance_cache = {
-                "id": instance.id,
-                "task_id": instance.task_id,
-                "trace_id": instance.trace_id,
-                "parent_id": instance.parent_id,
-                "node_path": instance.node_path,
-                "depth": instance.depth,
-                "actor_type": instance.actor_type.value if hasattr(instance.actor_type, 'value') else instance.actor_type,
-                "def_id": instance.def_id,
-                "name": instance.name,
-                "status": instance.status.value if hasattr(instance.status, 'value') else instance.status,
-                "created_at": instance.created_at.isoformat() if instance.created_at else None,
-                "started_at": instance.started_at.isoformat() if instance.started_at else None,
-                "finished_at": instance.finished_at.isoformat() if instance.finished_at else None,
-                "updated_at": instance.updated_at.isoformat() if instance.updated_at else None,
-                "user_id": instance.user_id,
-                "input_params": instance.input_params,
-                "worker_id": instance.worker_id,
-                "progress": instance.progress
-            }
+        return update_fields
 
-        # =========================================
-        # A. 第三步：记流水 (Event Log)
-        # 这是“发生过什么”的绝对事实
-        # =========================================
+    def _build_log_row(self, instance_id: str, trace_id: str, execution_args: dict) -> dict:
+        """
+        构建一条流水 (Event Log)，这是“发生过什么”的绝对事实
+        """
         error_info = None
         if execution_args.get("error"):
             error_info = {"msg": execution_args.get("error")}
-            
-        await self._create_log_entry(
-            session,
-            instance_id=instance_uuid, # Log 关联内部 UUID
-            trace_id=trace_id,
-            event_type=event_type,
-            level="ERROR" if error_info else "INFO",
-            content=execution_args.get("description", f"State change: {event_type}"),
+
+        event_type = execution_args.get("event_type")
+        return {
+            "id": str(uuid.uuid4()),
+            "instance_id": instance_id,  # Log 关联内部 UUID
+            "trace_id": trace_id,
+            "event_type": event_type,
+            "level": "ERROR" if error_info else "INFO",
+            "content": execution_args.get("description", f"State change: {event_type}"),
             # 将大字段放入 payload_snapshot
-            payload_snapshot=execution_args.get("enriched_context_snapshot") or execution_args.get("data"),
-            execution_node=execution_args.get("worker_id"), # 映射 worker
-            agent_id=execution_args.get("agent_id"),        # 映射 agent
-            error_detail=error_info
-        )
+            "payload_snapshot": execution_args.get("enriched_context_snapshot") or execution_args.get("data"),
+            "execution_node": execution_args.get("worker_id"),  # 映射 worker
+            "agent_id": execution_args.get("agent_id"),         # 映射 agent
+            "error_detail": error_info,
+            "created_at": datetime.now(timezone.utc)
+        }
 
-        # =========================================
-        # E. 第四步：更新缓存 & 推送通知 (Side Effects)
-        # =========================================
+    async def _create_log_entries(self, session: AsyncSession, rows: List[dict]):
+        """
+        批量写流水（多行 INSERT），不 commit，与 Instance 更新在同一事务
+        """
+        if not rows:
+            return
+        from sqlalchemy import insert
+        from external.db.models import EventLogDB
+
+        await session.execute(insert(EventLogDB), rows)
 
-        # 1. 更新 Redis 缓存
-        await self._update_instance_cache(task_id, update_fields, original_data=instance_cache)
+    def _build_stream_events(self, execution_args: dict, update_fields: dict, instance_cache: Optional[dict]) -> List[tuple]:
+        """
+        构建一条汇报对应的流事件 (event_type, key, payload)：Agent 心跳 + 任务状态变更
+        instance_cache 为处理该事件前的实例快照
+        """
+        task_id = execution_args.get("task_id")
+        event_type = execution_args.get("event_type")
+        trace_id = execution_args.get("trace_id")
+        stream_events = []
 
         # -------------------------------------------------------
         # [通用准备] 提前准备好通用数据 (时间、名称)，供心跳和事件使用
@@ -581,11 +644,10 @@ class LifecycleService:
         # -------------------------------------------------------
         # 只有这些状态才代表 Agent 在忙，需要心跳
         if execution_args.get("agent_id") and event_type in ["STARTED", "RUNNING", "PROGRESS"]:
-             await self.event_bus.publish(
-                topic=self.topic_name,
-                event_type="AGENT_HEARTBEAT",
-                key=execution_args["agent_id"],
-                payload={
+            stream_events.append((
+                "AGENT_HEARTBEAT",
+                execution_args["agent_id"],
+                {
                     "agent_id": execution_args["agent_id"],
                     # 必须嵌套 task_info
                     "task_info": {
@@ -597,7 +659,7 @@ class LifecycleService:
                         "started_at": start_time_obj.timestamp() if start_time_obj else None # 建议转成 timestamp 或 ISO
                     }
                 }
-            )
+            ))
 
         # -------------------------------------------------------
         # [修正 2] 任务状态变更推送：Task Event
@@ -622,10 +684,5 @@ class LifecycleService:
         # 添加调试日志
         logger.info(f"Publishing event to {self.topic_name}: event_type=TASK_{event_type}, agent_id={payload.get('agent_id')}, task_id={task_id}")
 
-        await self.event_bus.publish(
-            topic=self.topic_name,
-            event_type=f"TASK_{event_type}",
-            key=trace_id,
-            payload=payload
-        )
-
+        stream_events.append((f"TASK_{event_type}", trace_id, payload))
+        return stream_events
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any, Set
+from typing import List, Optional, Dict, Any, Set, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -16,6 +16,7 @@ from external.db.impl import create_event_instance_repo
 from external.events.bus import EventBus
 # 导入WebSocket管理器
 from .websocket_manager import ConnectionManager
+from .signal_service import SignalService
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,7 @@ class ObserverService:
         self.event_bus = event_bus
         self.connection_manager = connection_manager
         self.cache = cache
+        self.signal_service = SignalService(cache)
         self.webhook_registry = webhook_registry
         self.topic_name = "job_event_stream"
 
@@ -37,24 +39,52 @@ class ObserverService:
     # 1. 核心：对外查询服务 (Query API)
     # ==========================================
 
-    async def get_trace_graph(self, session: AsyncSession, trace_id: str) -> Dict[str, Any]:
+    async def get_trace_graph(
+        self,
+        session: AsyncSession,
+        trace_id: str,
+        since_version: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         【核心】获取 Trace 的 DAG 结构树 (供前端 ReactFlow/X6 渲染)
         
         关键逻辑：
-        数据库中 parent_id 存储的是父节点的【内部 UUID】，
-        但前端展示通常需要【业务 task_id】作为节点的 ID。
-        这里需要做一次映射。
+        parent_id 存储的是父节点的 task_id，前端也以【业务 task_id】作为节点 ID，边直接用 task_id 连接。
+
+        增量同步：
+        返回结果带 version（trace 的图版本号）。前端把上次拿到的 version 作为 since_version 传回，
+        只返回该版本之后写入过的节点及其入边（full=False），前端按节点 id 合并即可；
+        未传 since_version 或版本号无效时返回全量（full=True）。
         """
         inst_repo = create_event_instance_repo(session, dialect)
-        instances = await inst_repo.find_by_trace_id(trace_id)
-        
-        if not instances:
-            return {"trace_id": trace_id, "nodes": [], "edges": []}
+        # 先读版本号再读节点：期间新写入的节点会在下一次增量中重复出现，但不会丢失
+        version = await inst_repo.get_graph_version(trace_id)
+
+        full = not since_version or since_version < 0 or since_version > version
+        if full:
+            instances = await inst_repo.find_by_trace_id(trace_id)
+        elif since_version == version:
+            instances = []
+        else:
+            instances = await inst_repo.find_changed_since(trace_id, since_version)
+
+        if full and not instances:
+            return {"trace_id": trace_id, "version": version, "full": True, "nodes": [], "edges": []}
+
+        # 本次结果中的节点 task_id 集合，O(1) 判断父节点是否存在
+        known_task_ids: Set[str] = {inst.task_id for inst in instances}
+        if not full:
+            # 增量结果里可能只有子节点，父节点未变化时需要确认其存在
+            missing_parents = list({inst.parent_id for inst in instances if inst.parent_id} - known_task_ids)
+            if missing_parents:
+                parents = await inst_repo.get_by_task_ids(missing_parents)
+                known_task_ids.update(parent.task_id for parent in parents if parent.trace_id == trace_id)
+
+        # 节点信号按子树信号表解析（最长前缀匹配），子树根之下的节点同样带上信号
+        signals = await self.signal_service.resolve_signals(
+            trace_id, [(inst.node_path, inst.task_id) for inst in instances], session
+        )
 
-        # 1. 建立 内部UUID -> 外部TaskID 的映射表
-        uuid_to_task_id = {inst.id: inst.task_id for inst in instances} # 假设 inst.id 是PK
-        
         nodes = []
         edges = []
         
@@ -70,27 +100,27 @@ class ObserverService:
                 "worker_id": inst.worker_id,
                 "depth": inst.depth,
                 # 将控制信号透传给前端，前端可显示"暂停"图标
-                "signal": inst.control_signal if hasattr(inst, 'control_signal') else None,
+                "signal": signals.get(inst.task_id),
                 "created_at": inst.created_at.isoformat() if inst.created_at else None
                 
             }
             nodes.append(node_data)
             
             # --- 边信息 (构建树状关系) ---
-            if inst.parent_id:
-                # 只有当父节点也在本次查询结果中时，才画边
-                if inst.parent_id in uuid_to_task_id.values():
-                    # parent_task_id = uuid_to_task_id[inst.parent_id]
-                    parent_task_id = inst.parent_id
-                    edges.append({
-                        "id": f"e-{parent_task_id}-{inst.task_id}",
-                        "source": parent_task_id,  # 必须是 task_id
-                        "target": inst.task_id,    # 必须是 task_id
-                        "animated": inst.status == EventInstanceStatus.RUNNING
-                    })
+            # 只有当父节点也存在时，才画边
+            if inst.parent_id and inst.parent_id in known_task_ids:
+                parent_task_id = inst.parent_id
+                edges.append({
+                    "id": f"e-{parent_task_id}-{inst.task_id}",
+                    "source": parent_task_id,  # 必须是 task_id
+                    "target": inst.task_id,    # 必须是 task_id
+                    "animated": inst.status == EventInstanceStatus.RUNNING
+                })
         
         return {
             "trace_id": trace_id,
+            "version": version,
+            "full": full,
             "nodes": nodes,
             "edges": edges
         }
@@ -120,6 +150,11 @@ class ObserverService:
             "duration": 0
         }
 
+        # 链路的控制状态取根节点按子树信号表解析出的信号
+        root_signals = await self.signal_service.resolve_signals(
+            trace_id, [(inst.node_path, inst.task_id) for inst in instances if inst.depth == 0], session
+        )
+
         timestamps = []
         
         for inst in instances:
@@ -133,8 +168,8 @@ class ObserverService:
             
             # 3. 检查控制信号 (只要有一个节点被取消，往往意味着子树被取消)
             # 这里取根节点或当前节点的信号作为 trace 信号的参考
-            if inst.depth == 0 and hasattr(inst, 'control_signal') and inst.control_signal:
-                summary["control_state"] = inst.control_signal
+            if inst.depth == 0 and root_signals.get(inst.task_id):
+                summary["control_state"] = root_signals[inst.task_id]
 
             # 4. 时间范围
             if inst.created_at: timestamps.append(inst.created_at)
@@ -192,7 +227,8 @@ class ObserverService:
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[Tuple[datetime, str]] = None
     ) -> List[Dict[str, Any]]:
         """
         根据user_id查询所有trace_id及其状态，支持时间范围过滤
@@ -203,12 +239,13 @@ class ObserverService:
             end_time: 结束时间，可选
             limit: 每页数量，默认100
             offset: 偏移量，默认0
+            cursor: 键集分页游标 (created_at, trace_id)，可选
             
         Returns:
-            List[Dict[str, Any]]: trace列表，包含trace_id、创建时间和最新状态
+            List[Dict[str, Any]]: trace列表，包含trace_id、创建时间、最新状态和各状态实例数
         """
         inst_repo = create_event_instance_repo(session, dialect)
-        return await inst_repo.find_traces_by_user_id(user_id, start_time, end_time, limit, offset)
+        return await inst_repo.find_traces_by_user_id(user_id, start_time, end_time, limit, offset, cursor)
     
     # ==========================================
     # 2. 核心：WebSocket 消息泵 (Event Pump)
@@ -222,7 +259,7 @@ class ObserverService:
         logger.info(f"ObserverService started listening on topic: {self.topic_name}")
         
         # 订阅 LifecycleService 发出的事件
-        async for message in self.event_bus.subscribe(self.topic_name):
+        async for message in self.event_bus.subscribe(self.topic_name, subscriber="observer"):
             try:
                 event_type = message.get("event_type")
                 trace_id = message.get("key") # key 通常是 trace_id
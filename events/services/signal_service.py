@@ -1,9 +1,54 @@
-from typing import Optional
+import json
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
+from config.settings import settings
 from external.cache.base import CacheClient
 from external.db.session import dialect
 from external.db.impl import create_event_instance_repo
-from common.signal import SignalStatus
+from common.signal import SignalStatus, TRACE_SIGNAL_PREFIX, subtree_prefix, resolve_subtree_signal
+
+logger = logging.getLogger(__name__)
+
+
+# 写入子树信号（数据库提交之后执行）：先递增信号版本，使提交前读库的加载失效；
+# 哈希已加载时删除被覆盖的更深前缀并写入本前缀，未加载时不写，读取方会从数据库整体加载
+_APPLY_SUBTREE_SIGNAL_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local prefix = ARGV[1]
+for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if string.sub(field, 1, string.len(prefix)) == prefix then
+        redis.call('HDEL', KEYS[1], field)
+    end
+end
+redis.call('HSET', KEYS[1], prefix, ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# 从数据库加载整棵信号表：只在哈希不存在且读库前后信号版本未变时写入，
+# 避免用读库之后才提交的信号之前的旧数据覆盖缓存
+_LOAD_SUBTREE_SIGNALS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 信号哈希中的占位字段，区分“已加载但没有子树信号”与“未加载”
+_LOADED_FIELD = "#"
+
+_SIGNAL_TTL = 3600
 
 
 class SignalService:
@@ -14,6 +59,14 @@ class SignalService:
         """获取缓存键，确保与 LifecycleService 保持一致"""
         return f"trace_signal:{trace_id}"
 
+    def _get_tree_key(self, trace_id: str) -> str:
+        """子树信号哈希：path_prefix -> signal"""
+        return f"trace_signal_tree:{trace_id}"
+
+    def _get_generation_key(self, trace_id: str) -> str:
+        """子树信号版本：每次发送信号后递增"""
+        return f"trace_signal_gen:{trace_id}"
+
     async def send_signal(
         self,
         session: AsyncSession,
@@ -25,6 +78,9 @@ class SignalService:
         发送控制信号，支持两种模式：
         1. 整个 trace 控制：当 instance_id 为 None 时，向整个 trace 发送信号
         2. 级联控制：当提供 instance_id 时，向该节点及其所有子孙发送信号
+
+        两种模式都只在 subtree_signals 中写一行（整个 trace 的前缀为 "/"），
+        子孙节点的信号由 check_signal 按祖先前缀解析，不再逐行改写子孙实例
         
         Args:
             session: 数据库会话
@@ -37,7 +93,7 @@ class SignalService:
         
         if instance_id:
             # 模式1：级联控制 - 向节点及其所有子孙发送信号
-            # 1. 获取当前节点信息，用于校验和后续级联更新
+            # 1. 获取当前节点信息，用于校验和计算子树前缀
             current_node = await inst_repo.get(instance_id)
             if not current_node:
                 raise ValueError(f"Instance {instance_id} not found")
@@ -46,32 +102,54 @@ class SignalService:
             if trace_id and current_node.trace_id != trace_id:
                 raise ValueError(f"Instance {instance_id} does not belong to trace {trace_id}")
             
-            # 2. 更新当前节点
-            await inst_repo.update(instance_id, {"control_signal": signal.value})
-            
             trace_id = current_node.trace_id
-            
-            # 3. 【级联更新】利用 node_path 快速更新所有子孙
-            path_pattern = f"{current_node.node_path}{current_node.id}/%"
-            await inst_repo.bulk_update_signal_by_path(
-                trace_id=trace_id,
-                path_pattern=path_pattern,
-                signal=signal.value
-            )
+            # 子节点的 node_path 由父节点的 task_id 拼接而成
+            path_prefix = subtree_prefix(current_node.node_path, current_node.task_id)
+            targets = [current_node]
         else:
             # 模式2：整个 trace 控制 - 向整个 trace 发送信号
             if not trace_id:
                 raise ValueError("Either trace_id or instance_id must be provided")
             
-            # 更新该 trace 下所有任务的信号
-            await inst_repo.update_signal_by_trace(
-                trace_id,
-                signal=signal.value
-            )
-        
-        # 4. 同时发送缓存信号
+            path_prefix = TRACE_SIGNAL_PREFIX
+            # 根节点的信号作为链路的控制状态展示
+            targets = await inst_repo.find_by_trace_id_with_filters(trace_id, {"depth": 0})
+
+        # 2. 写入子树信号（一行），并在子树根节点上记录信号供拓扑展示
+        await inst_repo.set_subtree_signal(trace_id, path_prefix, signal.value)
+        for node in targets:
+            await inst_repo.update_fields(node.id, {"control_signal": signal.value})
+        await session.commit()
+
+        # 3. 同步缓存：trace 级信号键（兼容只按 trace 检查的调用方）与子树信号哈希
         cache_key = self._get_cache_key(trace_id)
-        await self.cache.set(cache_key, signal.value, ttl=3600)
+        await self.cache.set(cache_key, signal.value, ttl=_SIGNAL_TTL)
+        try:
+            await self.cache.run_script(
+                _APPLY_SUBTREE_SIGNAL_SCRIPT,
+                [self._get_tree_key(trace_id), self._get_generation_key(trace_id)],
+                [path_prefix, signal.value, _SIGNAL_TTL]
+            )
+        except Exception as e:
+            # 删除哈希，下次检查时从数据库重新加载
+            logger.warning(f"Failed to update subtree signals for trace {trace_id}: {e}")
+            await self.cache.delete(self._get_tree_key(trace_id))
+
+        # 4. 广播信号，订阅方（tasks 服务）据此更新本地信号表
+        await self._publish_signal(trace_id, instance_id, signal)
+
+    async def _publish_signal(self, trace_id: str, instance_id: Optional[str], signal: SignalStatus) -> None:
+        message = json.dumps({
+            "trace_id": trace_id,
+            "instance_id": instance_id,
+            "signal": signal.value,
+            "ts": time.time()
+        })
+        try:
+            await self.cache.publish(settings.signal_channel, message)
+        except Exception as e:
+            # 广播失败不影响信号生效：订阅方的表项过期后会从缓存键重新读取
+            logger.warning(f"Failed to publish signal for trace {trace_id}: {e}")
     
     # 兼容旧接口
     async def cancel_trace(self, session: AsyncSession, trace_id: str):
@@ -85,8 +163,22 @@ class SignalService:
         """
         await self.send_signal(session, trace_id=trace_id, signal=SignalStatus.CANCELLED)
 
-    async def check_signal(self, trace_id: str, session: Optional[AsyncSession] = None) -> Optional[str]:
-        """供内部服务调用（如调度器预检）"""
+    async def check_signal(
+        self,
+        trace_id: str,
+        session: Optional[AsyncSession] = None,
+        task_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        供内部服务调用（如调度器预检）
+        传入 task_id 时返回该节点的信号：按节点路径由近及远查找子树信号，
+        只有 trace 下存在子树信号时才需要查询节点路径
+        """
+        if task_id:
+            signals = await self._get_subtree_signals(trace_id, session)
+            if signals is not None:
+                return await self._resolve_node_signal(trace_id, task_id, signals, session)
+
         key = self._get_cache_key(trace_id)
         signal = await self.cache.get(key)
         
@@ -96,25 +188,130 @@ class SignalService:
         # 降级：查数据库（避免 Redis 故障导致无法取消）
         if session:
             try:
-                # 使用现有的 repo 创建方法，避免循环依赖
                 inst_repo = create_event_instance_repo(session, dialect)
-                # 查询该 trace 下的所有实例，获取最新的信号
-                instances = await inst_repo.find_by_trace_id(trace_id)
-                if instances:
-                    # 从实例中提取信号，优先使用非空信号
-                    for instance in instances:
-                        if instance.control_signal:
-                            signal = instance.control_signal
-                            break
-                    if signal:
-                        await self.cache.set(key, signal, ttl=3600)  # 回填缓存
-                        return signal
+                signal = (await inst_repo.find_subtree_signals(trace_id)).get(TRACE_SIGNAL_PREFIX)
+                if signal is None:
+                    # 信号表之前写入的信号只记录在实例上
+                    instances = await inst_repo.find_by_trace_id(trace_id)
+                    signal = next((inst.control_signal for inst in instances if inst.control_signal), None)
+                if signal:
+                    await self.cache.set(key, signal, ttl=_SIGNAL_TTL)  # 回填缓存
+                    return signal
             except Exception as e:
                 # 避免数据库查询失败导致整个方法出错
                 pass
         
         return None
 
+    async def resolve_signals(
+        self,
+        trace_id: str,
+        nodes: Iterable[Tuple[Optional[str], str]],
+        session: Optional[AsyncSession] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        批量解析已知路径的节点信号：nodes 为 (node_path, task_id)，返回 task_id -> 信号
+        只读取一次子树信号表，按节点路径的最长前缀匹配（与 check_signal(task_id=…) 一致）
+        """
+        nodes = list(nodes)
+        signals = await self._get_subtree_signals(trace_id, session)
+        if signals is None:
+            signal = await self.check_signal(trace_id, session)
+            return {task_id: signal for _, task_id in nodes}
+        return {
+            task_id: resolve_subtree_signal(signals, subtree_prefix(node_path, task_id))
+            for node_path, task_id in nodes
+        }
+
+    async def check_signals(
+        self,
+        trace_id: str,
+        task_ids: Iterable[str],
+        session: Optional[AsyncSession] = None
+    ) -> Dict[str, Optional[str]]:
+        """批量版的 check_signal(task_id=…)：一次读取子树信号表，最多一次查询节点路径"""
+        task_ids = list(dict.fromkeys(task_ids))
+        signals = await self._get_subtree_signals(trace_id, session)
+        if signals is None:
+            signal = await self.check_signal(trace_id, session)
+            return {task_id: signal for task_id in task_ids}
+        trace_signal = signals.get(TRACE_SIGNAL_PREFIX)
+        if not session or not any(prefix != TRACE_SIGNAL_PREFIX for prefix in signals):
+            return {task_id: trace_signal for task_id in task_ids}
+
+        inst_repo = create_event_instance_repo(session, dialect)
+        # task_id 只在 trace 内唯一
+        nodes = [node for node in await inst_repo.get_by_task_ids(task_ids) if node.trace_id == trace_id]
+        resolved = {
+            node.task_id: resolve_subtree_signal(signals, subtree_prefix(node.node_path, node.task_id))
+            for node in nodes
+        }
+        return {task_id: resolved.get(task_id, trace_signal) for task_id in task_ids}
+
+    async def _get_subtree_signals(self, trace_id: str, session: Optional[AsyncSession]) -> Optional[Dict[str, str]]:
+        """读取 trace 的子树信号，缓存未命中时从数据库加载；无法获取时返回 None"""
+        tree_key = self._get_tree_key(trace_id)
+        try:
+            signals = (await self.cache.hgetall_many([tree_key]))[0]
+        except Exception as e:
+            logger.warning(f"Failed to read subtree signals for trace {trace_id}: {e}")
+            signals = {}
+        if signals:
+            signals.pop(_LOADED_FIELD, None)
+            return signals
+        if not session:
+            return None
+
+        # 先读版本再读库：读库期间有新信号提交时版本会变化，加载脚本据此放弃写入
+        generation_key = self._get_generation_key(trace_id)
+        try:
+            generation = await self.cache.get(generation_key) or ""
+        except Exception as e:
+            logger.warning(f"Failed to read signal generation for trace {trace_id}: {e}")
+            generation = None
+
+        try:
+            inst_repo = create_event_instance_repo(session, dialect)
+            signals = await inst_repo.find_subtree_signals(trace_id)
+        except Exception as e:
+            logger.warning(f"Failed to load subtree signals for trace {trace_id}: {e}")
+            return None
+        if generation is None:
+            return signals
+        fields = [_LOADED_FIELD, "1"]
+        for prefix, signal in signals.items():
+            fields.extend((prefix, signal))
+        try:
+            await self.cache.run_script(
+                _LOAD_SUBTREE_SIGNALS_SCRIPT,
+                [tree_key, generation_key],
+                [_SIGNAL_TTL, generation, *fields]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache subtree signals for trace {trace_id}: {e}")
+        return signals
+
+    async def _resolve_node_signal(
+        self,
+        trace_id: str,
+        task_id: str,
+        signals: Dict[str, str],
+        session: Optional[AsyncSession]
+    ) -> Optional[str]:
+        trace_signal = signals.get(TRACE_SIGNAL_PREFIX)
+        if not any(prefix != TRACE_SIGNAL_PREFIX for prefix in signals):
+            return trace_signal
+        if not session:
+            return trace_signal
+
+        inst_repo = create_event_instance_repo(session, dialect)
+        # task_id 只在 trace 内唯一
+        nodes = await inst_repo.find_by_trace_id_with_filters(trace_id, {"task_id": task_id}, limit=1)
+        if not nodes:
+            return trace_signal
+        node = nodes[0]
+        return resolve_subtree_signal(signals, subtree_prefix(node.node_path, node.task_id))
+
     async def check_trace_signal(self, trace_id: str) -> bool:
         """检查跟踪是否被取消（兼容旧版接口）"""
         signal = await self.check_signal(trace_id)
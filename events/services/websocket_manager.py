@@ -1,6 +1,67 @@
-from typing import Dict, List
+import asyncio
+import itertools
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
 from fastapi import WebSocket
 
+from config.settings import settings
+from external.events.fanout import TraceFanout
+
+logger = logging.getLogger(__name__)
+
+# 慢消费者被断开时使用的关闭码（1013: Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class _Connection:
+    """
+    单个 WebSocket 连接的发送队列
+    - 队列中存放已序列化的文本，由独立的写协程逐条发送
+    - 同一节点尚未发出的 node_updated 会被新消息原位替换
+    """
+
+    def __init__(self, websocket: WebSocket, trace_id: str, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.trace_id = trace_id
+        self.manager = manager
+        self.pending: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.writer: Optional[asyncio.Task] = None
+
+    def enqueue(self, key: Hashable, text: str) -> bool:
+        """放入待发送队列，返回 False 表示队列已满（慢消费者）"""
+        if key in self.pending:
+            self.pending[key] = text
+            return True
+        if len(self.pending) >= self.manager.max_queue:
+            return False
+        self.pending[key] = text
+        self.wakeup.set()
+        return True
+
+    async def run(self) -> None:
+        """写协程：按入队顺序发送，单条发送超时视为慢消费者"""
+        try:
+            while not self.closed:
+                if not self.pending:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                _, text = self.pending.popitem(last=False)
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=self.manager.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out for trace {self.trace_id}, dropping slow consumer")
+            self.manager._drop(self, SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:
+            logger.info(f"WebSocket send failed for trace {self.trace_id}: {e}")
+            self.manager._drop(self)
+
+
 class ConnectionManager:
     """
     WebSocket连接管理器，用于管理前端的WebSocket连接
@@ -8,42 +69,139 @@ class ConnectionManager:
     1. 维护trace_id到WebSocket连接列表的映射
     2. 处理连接的建立和断开
     3. 向特定trace的所有连接推送事件
+
+    推送不会等待任何一个连接：消息只序列化一次，放入每个连接的有界发送队列后立即返回，
+    队列满或单条发送超时的连接会被断开，不会拖慢其他连接和事件消费。
+
+    多副本部署时传入 fanout：推送先经广播层发给订阅了该 trace 的副本，
+    每个副本只订阅本地有连接的 trace，再由各副本投递给本地连接。
     """
-    def __init__(self):
-        # 存储trace_id到WebSocket连接列表的映射
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        fanout: Optional[TraceFanout] = None
+    ):
+        # 存储trace_id到WebSocket连接的映射
+        self.active_connections: Dict[str, Dict[WebSocket, _Connection]] = {}
+        self.max_queue = max_queue or settings.ws_send_queue_size
+        self.send_timeout = send_timeout or settings.ws_send_timeout_sec
+        self.fanout = fanout
+        self._seq = itertools.count()
+
+    async def start(self):
+        """开始接收其他副本转发的推送"""
+        if self.fanout:
+            await self.fanout.start(self._on_fanout_message)
+
+    async def close(self):
+        if self.fanout:
+            await self.fanout.close()
 
     async def connect(self, websocket: WebSocket, trace_id: str):
         """
         建立WebSocket连接，并将其添加到指定trace_id的连接列表中
         """
         await websocket.accept()
-        if trace_id not in self.active_connections:
-            self.active_connections[trace_id] = []
-        self.active_connections[trace_id].append(websocket)
+        connection = _Connection(websocket, trace_id, self)
+        connection.writer = asyncio.create_task(connection.run())
+        is_first = trace_id not in self.active_connections
+        self.active_connections.setdefault(trace_id, {})[websocket] = connection
+        if is_first and self.fanout:
+            try:
+                await self.fanout.subscribe(trace_id)
+            except Exception as e:
+                logger.error(f"Failed to subscribe trace {trace_id} on fanout: {e}")
 
     def disconnect(self, websocket: WebSocket, trace_id: str):
         """
         断开WebSocket连接，并将其从连接列表中移除
         """
-        if trace_id in self.active_connections:
-            self.active_connections[trace_id].remove(websocket)
-            # 如果该trace_id下没有连接了，清理该条目
-            if not self.active_connections[trace_id]:
-                del self.active_connections[trace_id]
+        connection = self.active_connections.get(trace_id, {}).get(websocket)
+        if connection:
+            self._remove(connection)
 
     async def broadcast_to_trace(self, trace_id: str, message: dict):
         """
-        向指定trace_id的所有连接推送消息
+        向指定trace_id的所有连接推送消息（只入队，不等待发送完成）
         """
+        if not self.fanout and trace_id not in self.active_connections:
+            return
+
+        # 与 send_json 的编码方式保持一致，所有连接共用同一份文本
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+        if self.fanout:
+            try:
+                # 本副本也通过订阅收到这条消息，不再直接投递
+                await self.fanout.publish(trace_id, text)
+                return
+            except Exception as e:
+                logger.error(f"Fanout publish failed for trace {trace_id}, delivering locally only: {e}")
+        await self._deliver(trace_id, self._coalesce_key(message), text)
+
+    async def _on_fanout_message(self, trace_id: str, text: str):
+        if trace_id not in self.active_connections:
+            return
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"Dropping malformed fanout message for trace {trace_id}")
+            return
+        await self._deliver(trace_id, self._coalesce_key(message), text)
+
+    async def _deliver(self, trace_id: str, key: Hashable, text: str):
+        """投递给本副本上该 trace 的所有连接"""
+        connections = self.active_connections.get(trace_id)
+        if not connections:
+            return
+        for connection in list(connections.values()):
+            if not connection.enqueue(key, text):
+                logger.warning(
+                    f"WebSocket send queue full ({self.max_queue}) for trace {trace_id}, dropping slow consumer"
+                )
+                self._drop(connection, SLOW_CONSUMER_CLOSE_CODE)
+        # 让出一次事件循环，连续推送时写协程也能及时把队列排空
+        await asyncio.sleep(0)
+
+    def _coalesce_key(self, message: Dict[str, Any]) -> Hashable:
+        # 同一节点的状态更新只需要发送最新的一条，其余消息各自独立
+        if message.get("event") == "node_updated":
+            node_id = (message.get("data") or {}).get("node_id")
+            if node_id is not None:
+                return ("node_updated", node_id)
+        return next(self._seq)
+
+    def _remove(self, connection: _Connection) -> None:
+        connection.closed = True
+        connections = self.active_connections.get(connection.trace_id)
+        if connections is not None:
+            connections.pop(connection.websocket, None)
+            # 如果该trace_id下没有连接了，清理该条目
+            if not connections:
+                del self.active_connections[connection.trace_id]
+                if self.fanout:
+                    asyncio.create_task(self._unsubscribe(connection.trace_id))
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _unsubscribe(self, trace_id: str) -> None:
+        # 期间可能又有新连接加入，此时保留订阅
         if trace_id in self.active_connections:
-            # 遍历连接列表，发送消息
-            for websocket in self.active_connections[trace_id]:
-                try:
-                    await websocket.send_json(message)
-                except Exception:
-                    # 如果发送失败，将该连接从列表中移除
-                    self.active_connections[trace_id].remove(websocket)
-                    # 如果该trace_id下没有连接了，清理该条目
-                    if not self.active_connections[trace_id]:
-                        del self.active_connections[trace_id]
+            return
+        try:
+            await self.fanout.unsubscribe(trace_id)
+        except Exception as e:
+            logger.warning(f"Failed to unsubscribe trace {trace_id} on fanout: {e}")
+
+    def _drop(self, connection: _Connection, code: int = 1000) -> None:
+        """服务端主动断开连接（发送失败或慢消费者）"""
+        if connection.closed:
+            return
+        self._remove(connection)
+        asyncio.create_task(self._close(connection.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
@@ -1,5 +1,7 @@
 import logging
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Set
 from thespian.actors import Actor, ActorAddress, ActorExitRequest,ChildActorExited
@@ -30,6 +32,14 @@ from external.message_queue.rabbitmq_client import RabbitMQClient
 
 logger = logging.getLogger(__name__)
 
+# 规划阶段的并行判断并发数（同一进程内的所有 AgentActor 共享）
+PLANNING_WORKERS = int(os.getenv("AGENT_PLANNING_WORKERS", "8"))
+
+# 并行判断线程池：各子任务的 LLM 判断并发发出
+_planning_executor = ThreadPoolExecutor(max_workers=PLANNING_WORKERS, thread_name_prefix="agent-planning")
+# 记忆写回线程：单线程保证同一进程内写入顺序，不阻塞任务处理
+_memory_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-memory-writer")
+
 
 ##后台
 
@@ -168,27 +178,20 @@ class AgentActor(Actor):
         )
 
 
-        # 写入记忆（按单节点存储，检索按 scope 聚合）
-        try:
-            memory_input = task.content or task.description or user_input
-            node_scope = self._build_node_memory_scope(self.current_user_id, task.task_path)
-            root_scope = self._build_memory_scope(self.current_user_id, task.task_path)
-            metadata = {
-                "root_scope": root_scope,
-                "agent_id": self.agent_id,
-                "task_path": task.task_path
-            }
-            self.memory_cap.add_memory_intelligently(node_scope, memory_input, metadata)
-        except Exception as e:
-            self.log.warning(f"Memory write skipped: {e}")
-
+        # 规划阶段各子阶段耗时（毫秒）
+        timings: Dict[str, float] = {}
+        stage_start = time.perf_counter()
 
+        # 写入记忆（按单节点存储，检索按 scope 聚合），交给后台线程，不阻塞规划
+        self._submit_memory_write(task, user_input)
 
         # 构建对话上下文
+        phase_start = time.perf_counter()
         conversation_context = self.memory_cap.build_conversation_context(
             self._build_memory_scope(self.current_user_id, task.task_path),
             task.content or ""
         )
+        timings["context_ms"] = (time.perf_counter() - phase_start) * 1000
         
         # --- 流程 ⑤: 任务规划 ---
         event_bus.publish_task_event(
@@ -206,17 +209,21 @@ class AgentActor(Actor):
         )
         
         # 生成执行计划
-        plans = self._plan_task_execution(user_input, conversation_context)  
+        phase_start = time.perf_counter()
+        plans = self._plan_task_execution(user_input, conversation_context)
+        timings["plan_ms"] = (time.perf_counter() - phase_start) * 1000
         if plans:
-            for plan in plans:
-                # 仅对 AGENT 类型的节点进行判断，MCP 通常是确定性工具
-                if plan.get('type') == 'AGENT':
-                    self._llm_decide_should_execute_in_parallel(plan, conversation_context)
-                else:
-                    # MCP 默认单次执行
-                    plan['is_parallel'] = False      
+            # --- 流程 ⑥: 并行判断（各子任务并发判断） ---
+            phase_start = time.perf_counter()
+            self._decide_parallelism(plans, conversation_context)
+            timings["parallel_decision_ms"] = (time.perf_counter() - phase_start) * 1000
+            timings["planning_total_ms"] = (time.perf_counter() - stage_start) * 1000
 
             logger.info(f"[AgentActor] Task planning result:\n{plans}")
+            self.log.info(
+                f"[AgentActor] Planning timings for {task_id}: "
+                + ", ".join(f"{k}={v:.1f}" for k, v in timings.items())
+            )
             # --- 流程 ⑦: 构建TaskGroupRequest ---
             task_group_request = self._build_task_group_request(plans, task)
 
@@ -233,7 +240,8 @@ class AgentActor(Actor):
                 agent_id=self.agent_id,
                 data={
                     "plans": plans,
-                    "message": "任务已分发给子Agent"
+                    "message": "任务已分发给子Agent",
+                    "planning_timings": {k: round(v, 1) for k, v in timings.items()}
                 },
                 user_id=self.current_user_id
             )
@@ -256,6 +264,59 @@ class AgentActor(Actor):
             )
 
 
+    def _submit_memory_write(self, task: AgentTaskMessage, user_input: str):
+        """
+        将记忆写回提交到后台线程（写入失败只记录日志）
+        """
+        memory_input = task.content or task.description or user_input
+        node_scope = self._build_node_memory_scope(self.current_user_id, task.task_path)
+        root_scope = self._build_memory_scope(self.current_user_id, task.task_path)
+        metadata = {
+            "root_scope": root_scope,
+            "agent_id": self.agent_id,
+            "task_path": task.task_path
+        }
+        memory_cap = self.memory_cap
+        log = self.log
+
+        def write():
+            try:
+                memory_cap.add_memory_intelligently(node_scope, memory_input, metadata)
+            except Exception as e:
+                log.warning(f"Memory write skipped: {e}")
+
+        try:
+            _memory_writer.submit(write)
+        except RuntimeError as e:
+            # 解释器退出时线程池已关闭
+            self.log.warning(f"Memory write skipped: {e}")
+
+    def _decide_parallelism(self, plans: List[Dict[str, Any]], context: str):
+        """
+        ⑥ 并行判断：对所有 AGENT 类型的子任务并发发起判断，结果写回 plan
+        （规划结果中已经带有 is_parallel 的子任务保持不变）
+        """
+        futures = {}
+        for index, plan in enumerate(plans):
+            # 仅对 AGENT 类型的节点进行判断，MCP 通常是确定性工具
+            if plan.get('type') == 'AGENT':
+                task_desc = plan.get('description') or plan.get('content') or str(plan)
+                futures[index] = _planning_executor.submit(
+                    self._llm_decide_should_execute_in_parallel, task_desc, context
+                )
+            else:
+                # MCP 默认单次执行
+                plan['is_parallel'] = False
+
+        for index, future in futures.items():
+            try:
+                decision = future.result() or {}
+            except Exception as e:
+                self.log.warning(f"Parallel decision failed for step {index}: {e}")
+                continue
+            plans[index].setdefault('is_parallel', decision.get('is_parallel', False))
+            plans[index].setdefault('strategy_reasoning', decision.get('reasoning', ""))
+
     def _handle_resume_task(self, message: ResumeTaskMessage, sender: ActorAddress):
         """
         处理来自前台的resume_task消息并执行恢复任务链
@@ -9,6 +9,8 @@ from .relationship_service import (RelationshipService)
 
 from .tree_manager import (TreeManager)
 
+from .tree_snapshot import (TreeSnapshot, TreeSnapshotCache)
+
 __all__ = [
     # 节点服务
     'NodeService',
@@ -17,7 +19,11 @@ __all__ = [
     'RelationshipService',
     
     # 树管理器
-    'TreeManager'
+    'TreeManager',
+    
+    # 树邻接快照
+    'TreeSnapshot',
+    'TreeSnapshotCache'
 ]
 
 __version__ = '1.0.0'
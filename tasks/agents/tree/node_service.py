@@ -207,9 +207,12 @@ class NodeService:
                 return None
             
             # 在数据库中创建节点
-            # 注意：这里需要确保structure实现了创建节点的方法
-            # 如果结构管理器支持直接创建节点，我们可以调用它
+            # 如果结构管理器支持直接创建节点，先写入数据库
             # 否则我们先更新缓存，在关闭时同步到数据库
+            if hasattr(self.structure, 'create_node'):
+                if not self.structure.create_node(node_data):
+                    self.logger.error(f"节点 {node_id} 写入数据库失败")
+                    return None
             
             # 更新缓存
             self.node_cache[node_id] = node_data
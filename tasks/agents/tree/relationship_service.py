@@ -3,6 +3,7 @@ from typing import Dict, Any, Optional, List
 import logging
 from datetime import datetime, timedelta
 from external.repositories.agent_structure_repo import AgentStructureRepository
+from .tree_snapshot import TreeSnapshot, TreeSnapshotCache
 
 
 
@@ -13,15 +14,21 @@ class RelationshipService:
     基于现有AgentRegistry功能重构
     """
     
-    def __init__(self, structure: Optional[AgentStructureRepository] = None):
+    def __init__(
+        self,
+        structure: Optional[AgentStructureRepository] = None,
+        tree_snapshot_cache: Optional[TreeSnapshotCache] = None
+    ):
         """
         初始化关系服务
         
         Args:
             structure: Agent结构管理器实例，如果为None则自动创建
+            tree_snapshot_cache: 树快照缓存，提供时遍历操作在内存中完成
         """
         self.logger = logging.getLogger(__name__)
         self.structure = structure
+        self.tree_snapshot_cache = tree_snapshot_cache
         self._initialize_structure()
         self.relationship_cache = {}  # 缓存格式: {node_id: {'data': ..., 'timestamp': ...}}
         self.cache_ttl = timedelta(seconds=60)  # 缓存有效期60秒
@@ -101,6 +108,17 @@ class RelationshipService:
         
         return MemoryAgentStructure()
     
+    def _get_snapshot(self, *node_ids: str) -> Optional[TreeSnapshot]:
+        """
+        获取包含指定节点的树快照，不可用时返回None（回退到逐节点查询）
+        """
+        if self.tree_snapshot_cache is None:
+            return None
+        snapshot = self.tree_snapshot_cache.get()
+        if snapshot is None or any(node_id not in snapshot for node_id in node_ids):
+            return None
+        return snapshot
+    
     def get_children(self, node_id: str) -> List[str]:
         """
         获取节点的子节点
@@ -112,6 +130,10 @@ class RelationshipService:
         Returns:
             List[str]: 子节点ID列表
         """
+        snapshot = self._get_snapshot(node_id)
+        if snapshot is not None:
+            return snapshot.get_children(node_id)
+        
         # 先从缓存获取
         if node_id in self.relationship_cache:
             cached = self.relationship_cache[node_id]
@@ -143,6 +165,10 @@ class RelationshipService:
         Returns:
             str: 父节点ID，如果没有则返回None
         """
+        snapshot = self._get_snapshot(node_id)
+        if snapshot is not None:
+            return snapshot.get_parent(node_id)
+        
         # 先从缓存获取
         if node_id in self.relationship_cache:
             cached = self.relationship_cache[node_id]
@@ -203,7 +229,12 @@ class RelationshipService:
             
             # 尝试使用结构管理器的add_agent_relationship方法
             if hasattr(self.structure, 'add_agent_relationship'):
-                return self.structure.add_agent_relationship(parent_id, child_id, 'HAS_CHILD')
+                if not self.structure.add_agent_relationship(parent_id, child_id, 'HAS_CHILD'):
+                    return False
+            
+            # 写入成功后再增量更新树快照
+            if self.tree_snapshot_cache is not None:
+                self.tree_snapshot_cache.apply_edge_added(parent_id, child_id)
             
             self.logger.info(f"添加关系成功: {parent_id} -> {child_id}")
             return True
@@ -244,6 +275,9 @@ class RelationshipService:
                 if child_id in self.structure.relationships:
                     self.structure.relationships[child_id]['parent'] = None
             
+            if self.tree_snapshot_cache is not None:
+                self.tree_snapshot_cache.apply_edge_removed(parent_id, child_id)
+            
             self.logger.info(f"移除关系成功: {parent_id} -> {child_id}")
             return True
         except Exception as e:
@@ -278,6 +312,10 @@ class RelationshipService:
         Returns:
             List[str]: 祖先节点ID列表（从父节点到根节点）
         """
+        snapshot = self._get_snapshot(node_id)
+        if snapshot is not None:
+            return snapshot.get_ancestors(node_id)
+        
         ancestors = []
         current = self.get_parent(node_id)
         
@@ -297,6 +335,10 @@ class RelationshipService:
         Returns:
             List[str]: 后代节点ID列表
         """
+        snapshot = self._get_snapshot(node_id)
+        if snapshot is not None:
+            return snapshot.get_descendants(node_id)
+        
         descendants = []
         children = self.get_children(node_id)
         
@@ -321,6 +363,10 @@ class RelationshipService:
         if ancestor_id == descendant_id:
             return False  # 自己不是自己的后代
         
+        snapshot = self._get_snapshot(ancestor_id, descendant_id)
+        if snapshot is not None:
+            return snapshot.is_descendant(ancestor_id, descendant_id)
+        
         descendants = self.get_descendants(ancestor_id)
         return descendant_id in descendants
     
@@ -348,6 +394,10 @@ class RelationshipService:
         Returns:
             List[str]: 路径节点ID列表，如果不存在路径则返回None
         """
+        snapshot = self._get_snapshot(start_id, end_id)
+        if snapshot is not None:
+            return snapshot.get_path_between(start_id, end_id)
+        
         # 检查是否有祖先关系
         if self.is_ancestor(start_id, end_id):
             # 从start到end是向上的路径
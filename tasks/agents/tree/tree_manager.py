@@ -3,6 +3,7 @@ from typing import Dict, Any, Optional, List
 import logging
 from .node_service import NodeService
 from .relationship_service import RelationshipService
+from .tree_snapshot import TreeSnapshot, get_tree_snapshot_cache
 from external.repositories.agent_structure_repo import AgentStructureRepository
 
 
@@ -25,9 +26,11 @@ class TreeManager:
         
 
         self.agent_structure_repo = AgentStructureRepository()
+        # 进程内共享的树邻接快照，遍历操作不再逐节点访问Neo4j
+        self.tree_snapshot_cache = get_tree_snapshot_cache(self.agent_structure_repo)
         # 初始化节点服务和关系服务
         self.node_service = NodeService(self.agent_structure_repo)
-        self.relationship_service = RelationshipService(self.agent_structure_repo)
+        self.relationship_service = RelationshipService(self.agent_structure_repo, self.tree_snapshot_cache)
         
         # Actor引用管理
         self.actor_refs = {}
@@ -72,6 +75,15 @@ class TreeManager:
         """
         return self.relationship_service.get_parent(agent_id)
     
+    def get_tree_snapshot(self) -> Optional[TreeSnapshot]:
+        """
+        获取当前的树邻接快照
+        
+        Returns:
+            TreeSnapshot: 快照，不可用时返回None
+        """
+        return self.tree_snapshot_cache.get()
+    
     def get_actor_ref(self, agent_id: str) -> Optional[Any]:
         """
         获取Agent的Actor引用
@@ -111,6 +123,10 @@ class TreeManager:
         Returns:
             List[str]: 根节点Agent ID列表
         """
+        snapshot = self.get_tree_snapshot()
+        if snapshot is not None:
+            return snapshot.get_roots()
+        
         root_agents = []
         all_agents = self.node_service.get_all_nodes()
         
@@ -149,6 +165,10 @@ class TreeManager:
         Returns:
             List[str]: 路径节点ID列表
         """
+        snapshot = self.get_tree_snapshot()
+        if snapshot is not None and agent_id in snapshot:
+            return list(reversed(snapshot.get_ancestors(agent_id))) + [agent_id]
+        
         path = [agent_id]
         current = agent_id
         
@@ -253,13 +273,16 @@ class TreeManager:
         agent_id = self.node_service.create_node(agent_data)
         if not agent_id:
             return None
+        # 写入成功后再加入树快照
+        self.tree_snapshot_cache.apply_node_added(agent_id)
         
         # 添加父子关系
         if parent_id:
             success = self.relationship_service.add_relationship(parent_id, agent_id)
             if not success:
                 # 如果关系添加失败，删除节点
-                self.node_service.delete_node(agent_id)
+                if self.node_service.delete_node(agent_id):
+                    self.tree_snapshot_cache.apply_node_removed(agent_id)
                 return None
         
         self.logger.info(f"Agent {agent_id} 添加成功")
@@ -308,6 +331,8 @@ class TreeManager:
         if parent_id:
             self.relationship_service.remove_relationship(parent_id, agent_id)
         
+        self.tree_snapshot_cache.apply_node_removed(agent_id)
+        
         # 移除Actor引用
         self.remove_actor_ref(agent_id)
         
@@ -324,6 +349,10 @@ class TreeManager:
         Returns:
             int: 深度
         """
+        snapshot = self.get_tree_snapshot()
+        if snapshot is not None and agent_id in snapshot:
+            return snapshot.get_depth(agent_id)
+        
         depth = 0
         current = agent_id
         
@@ -346,6 +375,10 @@ class TreeManager:
         Returns:
             List[str]: Agent ID列表
         """
+        snapshot = self.get_tree_snapshot()
+        if snapshot is not None:
+            return snapshot.get_level(level)
+        
         level_agents = []
         all_agents = self.node_service.get_all_nodes()
         
@@ -362,6 +395,7 @@ class TreeManager:
         """
         self.node_service.refresh_cache()
         self.relationship_service.refresh_cache()
+        self.tree_snapshot_cache.refresh()
         self.logger.info("树形结构缓存已刷新")
     
     def close(self):
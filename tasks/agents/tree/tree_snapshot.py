@@ -0,0 +1,470 @@
+"""Agent树邻接快照"""
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
+from collections import deque
+import logging
+import threading
+import time
+
+
+class TreeSnapshot:
+    """
+    Agent树的只读邻接快照
+
+    将整个 HAS_CHILD 图压缩为整数下标表示：
+    - parent: 父节点下标数组（-1 表示没有父节点）
+    - children: 每个节点的子节点下标列表
+    - depth: 节点深度（根节点为0）
+
+    快照不可变，更新时生成新快照并整体替换引用，读取方无需加锁。
+    增删边时只复制外层数组、替换受影响节点的子节点列表和深度，其余部分与旧快照共享。
+    """
+
+    __slots__ = ("version", "ids", "index", "parent", "children", "depth", "agent_count")
+
+    def __init__(
+        self,
+        version: int,
+        ids: List[str],
+        index: Dict[str, int],
+        parent: List[int],
+        children: List[List[int]],
+        depth: List[int],
+        agent_count: int
+    ):
+        self.version = version
+        self.ids = ids
+        self.index = index
+        self.parent = parent
+        self.children = children
+        self.depth = depth
+        # 前 agent_count 个节点是 Agent 节点，其余只作为边的端点出现
+        self.agent_count = agent_count
+
+    @classmethod
+    def build(cls, node_ids: Iterable[str], edges: Iterable[Tuple[str, str]], version: int = 0) -> "TreeSnapshot":
+        """
+        根据节点和边构建快照
+
+        Args:
+            node_ids: Agent节点ID列表
+            edges: (parent_id, child_id) 边列表
+            version: 快照对应的结构版本号
+
+        Returns:
+            TreeSnapshot: 新快照
+        """
+        ids: List[str] = []
+        index: Dict[str, int] = {}
+        for node_id in node_ids:
+            if node_id is not None and node_id not in index:
+                index[node_id] = len(ids)
+                ids.append(node_id)
+        agent_count = len(ids)
+
+        edge_pairs: List[Tuple[int, int]] = []
+        seen_edges = set()
+        for parent_id, child_id in edges:
+            if parent_id is None or child_id is None:
+                continue
+            for node_id in (parent_id, child_id):
+                if node_id not in index:
+                    index[node_id] = len(ids)
+                    ids.append(node_id)
+            pair = (index[parent_id], index[child_id])
+            if pair not in seen_edges:
+                seen_edges.add(pair)
+                edge_pairs.append(pair)
+
+        n = len(ids)
+        parent = [-1] * n
+        children: List[List[int]] = [[] for _ in range(n)]
+        for p, c in edge_pairs:
+            children[p].append(c)
+            # 多个父节点时保留第一个（与 get_agent_relationship 的 LIMIT 1 一致）
+            if parent[c] == -1:
+                parent[c] = p
+
+        depth = cls._compute_depth(parent)
+        return cls(version, ids, index, parent, children, depth, agent_count)
+
+    @staticmethod
+    def _compute_depth(parent: List[int]) -> List[int]:
+        """沿父指针计算深度（带记忆化，遇到环时截断）"""
+        n = len(parent)
+        depth = [-1] * n
+        for start in range(n):
+            if depth[start] != -1:
+                continue
+            chain = []
+            on_chain = set()
+            current = start
+            while current != -1 and depth[current] == -1 and current not in on_chain:
+                chain.append(current)
+                on_chain.add(current)
+                current = parent[current]
+            base = depth[current] if current != -1 and depth[current] != -1 else -1
+            for node in reversed(chain):
+                base += 1
+                depth[node] = base
+        return depth
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def edges(self) -> Iterator[Tuple[str, str]]:
+        """遍历所有 (parent_id, child_id) 边"""
+        for p, child_list in enumerate(self.children):
+            for c in child_list:
+                yield self.ids[p], self.ids[c]
+
+    def _children_idx(self, i: int) -> List[int]:
+        return self.children[i]
+
+    def get_children(self, node_id: str) -> List[str]:
+        i = self.index.get(node_id)
+        if i is None:
+            return []
+        return [self.ids[c] for c in self._children_idx(i)]
+
+    def get_parent(self, node_id: str) -> Optional[str]:
+        i = self.index.get(node_id)
+        if i is None or self.parent[i] == -1:
+            return None
+        return self.ids[self.parent[i]]
+
+    def get_depth(self, node_id: str) -> int:
+        i = self.index.get(node_id)
+        return self.depth[i] if i is not None else 0
+
+    def get_ancestors(self, node_id: str) -> List[str]:
+        """祖先列表（从父节点到根节点）"""
+        i = self.index.get(node_id)
+        if i is None:
+            return []
+        ancestors = []
+        seen = {i}
+        current = self.parent[i]
+        while current != -1 and current not in seen:
+            ancestors.append(self.ids[current])
+            seen.add(current)
+            current = self.parent[current]
+        return ancestors
+
+    def get_descendants(self, node_id: str) -> List[str]:
+        """后代列表（先序遍历）"""
+        i = self.index.get(node_id)
+        if i is None:
+            return []
+        result = []
+        visited = {i}
+        stack = list(reversed(self._children_idx(i)))
+        while stack:
+            current = stack.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            result.append(self.ids[current])
+            stack.extend(reversed(self._children_idx(current)))
+        return result
+
+    def is_descendant(self, ancestor_id: str, descendant_id: str) -> bool:
+        if ancestor_id == descendant_id:
+            return False
+        return ancestor_id in self.get_ancestors(descendant_id) or descendant_id in self.get_descendants(ancestor_id)
+
+    def get_path_between(self, start_id: str, end_id: str) -> Optional[List[str]]:
+        """
+        两个节点之间沿树边的路径
+
+        Returns:
+            List[str]: 路径节点ID列表，不连通时返回None
+        """
+        if start_id not in self.index or end_id not in self.index:
+            return None
+        if start_id == end_id:
+            return [start_id]
+
+        start_chain = [start_id] + self.get_ancestors(start_id)
+        end_chain = [end_id] + self.get_ancestors(end_id)
+
+        # end 是 start 的祖先：向上的路径
+        if end_id in start_chain:
+            return start_chain[:start_chain.index(end_id) + 1]
+        # end 是 start 的后代：沿父指针反向
+        if start_id in end_chain:
+            return list(reversed(end_chain[:end_chain.index(start_id) + 1]))
+        # 多父节点时后代可能不在父指针链上，退化为 BFS
+        if self.is_descendant(start_id, end_id):
+            return self._bfs_down(start_id, end_id)
+
+        # 最近公共祖先
+        end_positions = {node: pos for pos, node in enumerate(end_chain)}
+        for pos, node in enumerate(start_chain):
+            if node in end_positions:
+                return start_chain[:pos + 1] + list(reversed(end_chain[:end_positions[node]]))
+        return None
+
+    def _bfs_down(self, start_id: str, end_id: str) -> Optional[List[str]]:
+        start, end = self.index[start_id], self.index[end_id]
+        previous = {start: -1}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            if current == end:
+                path = []
+                while current != -1:
+                    path.append(self.ids[current])
+                    current = previous[current]
+                return list(reversed(path))
+            for child in self._children_idx(current):
+                if child not in previous:
+                    previous[child] = current
+                    queue.append(child)
+        return None
+
+    def get_roots(self) -> List[str]:
+        """没有父节点的 Agent 节点"""
+        return [self.ids[i] for i in range(self.agent_count) if self.parent[i] == -1]
+
+    def get_level(self, level: int) -> List[str]:
+        """指定深度的 Agent 节点"""
+        return [self.ids[i] for i in range(self.agent_count) if self.depth[i] == level]
+
+    def agent_ids(self) -> List[str]:
+        return self.ids[:self.agent_count]
+
+    def with_node(self, node_id: str, version: Optional[int] = None) -> "TreeSnapshot":
+        """
+        返回增加一个 Agent 节点后的新快照
+
+        Args:
+            node_id: 节点ID
+            version: 新快照的版本号，默认沿用当前版本号
+        """
+        version = self.version if version is None else version
+        i = self.index.get(node_id)
+        if node_id is None or (i is not None and i < self.agent_count):
+            return self._replace(version)
+        if i is not None or self.agent_count < len(self.ids):
+            # Agent 节点必须位于前 agent_count 个下标，插入会移动其后的端点下标，需要重新构建
+            return TreeSnapshot.build([*self.agent_ids(), node_id], self.edges(), version)
+
+        index = dict(self.index)
+        index[node_id] = len(self.ids)
+        return TreeSnapshot(
+            version, self.ids + [node_id], index, self.parent + [-1], self.children + [[]],
+            self.depth + [0], self.agent_count + 1
+        )
+
+    def with_edge(self, parent_id: str, child_id: str, version: Optional[int] = None) -> "TreeSnapshot":
+        """
+        返回增加一条边后的新快照（增量更新，不重新构建）
+
+        HAS_CHILD 边只在 Agent 节点之间写入，快照中不存在的端点按新 Agent 节点加入。
+
+        Args:
+            parent_id: 父节点ID
+            child_id: 子节点ID
+            version: 新快照的版本号，默认沿用当前版本号
+        """
+        version = self.version if version is None else version
+        if parent_id is None or child_id is None:
+            return self._replace(version)
+
+        snapshot = self
+        for node_id in dict.fromkeys((parent_id, child_id)):
+            if node_id not in snapshot.index:
+                snapshot = snapshot.with_node(node_id)
+        ids, index = snapshot.ids, snapshot.index
+        parent = list(snapshot.parent)
+        children = list(snapshot.children)
+        depth = list(snapshot.depth)
+
+        p, c = index[parent_id], index[child_id]
+        if c in children[p]:
+            return snapshot._replace(version)
+        children[p] = children[p] + [c]
+        if parent[c] == -1:
+            parent[c] = p
+            if not self._update_depths(parent, children, depth, c):
+                return TreeSnapshot.build(snapshot.agent_ids(), [*snapshot.edges(), (parent_id, child_id)], version)
+        return TreeSnapshot(version, ids, index, parent, children, depth, snapshot.agent_count)
+
+    def without_edge(self, parent_id: str, child_id: str, version: Optional[int] = None) -> "TreeSnapshot":
+        """返回删除一条边后的新快照（增量更新，不重新构建）"""
+        version = self.version if version is None else version
+        p, c = self.index.get(parent_id), self.index.get(child_id)
+        if p is None or c is None or c not in self.children[p]:
+            return self._replace(version)
+
+        children = list(self.children)
+        children[p] = [x for x in children[p] if x != c]
+        parent, depth = self.parent, self.depth
+        if parent[c] == p:
+            # 与 build 一致：剩余的父节点中取下标最小的一个
+            parent, depth = list(parent), list(depth)
+            parent[c] = next((q for q, child_list in enumerate(children) if c in child_list), -1)
+            if not self._update_depths(parent, children, depth, c):
+                return TreeSnapshot.build(
+                    self.agent_ids(), [e for e in self.edges() if e != (parent_id, child_id)], version
+                )
+        return TreeSnapshot(version, self.ids, self.index, parent, children, depth, self.agent_count)
+
+    def without_node(self, node_id: str, version: Optional[int] = None) -> "TreeSnapshot":
+        """返回删除节点及其所有边后的新快照（节点下标会变化，需要重新构建）"""
+        edges = [e for e in self.edges() if node_id not in e]
+        return TreeSnapshot.build(
+            [a for a in self.agent_ids() if a != node_id], edges, self.version if version is None else version
+        )
+
+    def _replace(self, version: int, **fields) -> "TreeSnapshot":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(fields, version=version)
+        return TreeSnapshot(**values)
+
+    @staticmethod
+    def _update_depths(parent: List[int], children: List[List[int]], depth: List[int], node: int) -> bool:
+        """
+        父指针变化后原地更新 node 及其（沿父指针的）子树深度
+
+        Returns:
+            bool: 父指针链上出现环时返回False，由调用方退化为整体重建
+        """
+        seen = {node}
+        current = parent[node]
+        while current != -1:
+            if current in seen:
+                return False
+            seen.add(current)
+            current = parent[current]
+
+        depth[node] = depth[parent[node]] + 1 if parent[node] != -1 else 0
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for child in children[current]:
+                if parent[child] == current:
+                    depth[child] = depth[current] + 1
+                    stack.append(child)
+        return True
+
+
+class TreeSnapshotCache:
+    """
+    带版本号的树快照缓存
+
+    首次访问时通过一次批量查询加载整个 HAS_CHILD 图；之后最多每隔
+    check_interval 秒读取一次结构版本号，版本变化时才重新加载。
+    本进程内的结构修改在写入成功后增量应用到快照上，并同步递增快照版本号，
+    只有其他进程的修改才会触发重新加载。
+    """
+
+    def __init__(self, structure: Any, check_interval: float = 5.0):
+        """
+        Args:
+            structure: Agent结构仓储，需要提供 load_tree_adjacency / get_structure_version
+            check_interval: 版本号检查间隔（秒）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.structure = structure
+        self.check_interval = check_interval
+        self._snapshot: Optional[TreeSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def supported(self) -> bool:
+        return hasattr(self.structure, "load_tree_adjacency")
+
+    def get(self) -> Optional[TreeSnapshot]:
+        """
+        获取当前快照，必要时检查版本并重新加载
+
+        Returns:
+            TreeSnapshot: 快照；结构仓储不支持或加载失败时返回None
+        """
+        if not self.supported:
+            return None
+
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            # 双重检查，避免并发时重复加载
+            if self._snapshot is not None and time.monotonic() - self._last_check < self.check_interval:
+                return self._snapshot
+            try:
+                if self._snapshot is None:
+                    self._reload()
+                else:
+                    version = self.structure.get_structure_version()
+                    if version != self._snapshot.version:
+                        self.logger.info(f"树结构版本变化 {self._snapshot.version} -> {version}，重新加载快照")
+                        self._reload()
+                self._last_check = time.monotonic()
+            except Exception as e:
+                self.logger.error(f"加载树快照失败: {e}")
+                self._last_check = time.monotonic()
+            return self._snapshot
+
+    def _reload(self) -> None:
+        # 先读版本号再读边，期间发生的修改会在下一次检查时被发现
+        version = self.structure.get_structure_version()
+        adjacency = self.structure.load_tree_adjacency()
+        self._snapshot = TreeSnapshot.build(adjacency.get("nodes", []), adjacency.get("edges", []), version)
+        self.logger.info(f"树快照已加载: {len(self._snapshot)} 个节点, 版本 {version}")
+
+    def refresh(self) -> Optional[TreeSnapshot]:
+        """强制重新加载快照"""
+        with self._lock:
+            self._snapshot = None
+        return self.get()
+
+    def invalidate(self) -> None:
+        """丢弃快照，下次访问时重新加载"""
+        with self._lock:
+            self._snapshot = None
+
+    def apply_node_added(self, node_id: str) -> None:
+        """本进程已创建一个节点（写入使结构版本号 +1）"""
+        self._apply(lambda s, version: s.with_node(node_id, version), written=True)
+
+    def apply_edge_added(self, parent_id: str, child_id: str) -> None:
+        """本进程已写入一条边（写入使结构版本号 +1）"""
+        self._apply(lambda s, version: s.with_edge(parent_id, child_id, version), written=True)
+
+    def apply_edge_removed(self, parent_id: str, child_id: str) -> None:
+        """只更新快照；数据库中的边随节点一起删除，版本号变化由 apply_node_removed 记录"""
+        self._apply(lambda s, version: s.without_edge(parent_id, child_id, version), written=False)
+
+    def apply_node_removed(self, node_id: str) -> None:
+        """本进程已删除一个节点（写入使结构版本号 +1）"""
+        self._apply(lambda s, version: s.without_node(node_id, version), written=True)
+
+    def _apply(self, change, written: bool) -> None:
+        with self._lock:
+            if self._snapshot is not None:
+                # 同步本进程写入带来的版本号变化，避免下次检查时把自己的写入当成外部修改而整体重新加载
+                version = self._snapshot.version + 1 if written else None
+                self._snapshot = change(self._snapshot, version)
+
+
+_SHARED_TREE_SNAPSHOT_CACHE: Optional[TreeSnapshotCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_tree_snapshot_cache(structure: Any) -> TreeSnapshotCache:
+    """
+    获取进程内共享的树快照缓存
+
+    AgentActor 会为每个任务创建 TreeManager，共享快照避免重复加载。
+    """
+    global _SHARED_TREE_SNAPSHOT_CACHE
+    with _SHARED_LOCK:
+        if _SHARED_TREE_SNAPSHOT_CACHE is None:
+            _SHARED_TREE_SNAPSHOT_CACHE = TreeSnapshotCache(structure)
+        return _SHARED_TREE_SNAPSHOT_CACHE
@@ -0,0 +1,308 @@
+# embedding_index.py
+"""规划缓存的向量索引"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # 可选依赖，未安装时仅使用矩阵检索
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# 条目数达到该阈值后启用 HNSW 近似检索（需要安装 hnswlib）
+DEFAULT_ANN_THRESHOLD = 2000
+# HNSW 召回的候选数量，再在候选集上做精确打分
+DEFAULT_ANN_CANDIDATES = 64
+
+
+class AgentEmbeddingIndex:
+    """
+    单个 Agent 的 embedding 索引
+
+    所有向量按行存放在一个预分配的矩阵中，行向量已做 L2 归一化，
+    查询时一次矩阵乘法即可得到全部余弦相似度；置信度、禁用状态和用户等
+    打分所需的元数据以并行数组保存，整个打分过程都是向量化的。
+    删除采用"末行填补"方式，保证矩阵始终紧凑。
+    条目数超过 ann_threshold 且安装了 hnswlib 时，额外维护 HNSW 索引做亚线性召回。
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        ann_threshold: int = DEFAULT_ANN_THRESHOLD,
+        ann_candidates: int = DEFAULT_ANN_CANDIDATES
+    ):
+        self.dim = dim
+        self.ann_threshold = ann_threshold
+        self.ann_candidates = ann_candidates
+
+        self._matrix = np.zeros((16, dim), dtype=np.float32)
+        self._confidence = np.zeros(16, dtype=np.float32)
+        self._enabled = np.zeros(16, dtype=bool)
+        self._users = np.empty(16, dtype=object)
+        self._size = 0
+        # cache_id <-> 行号
+        self._row_of: Dict[str, int] = {}
+        self._ids: List[str] = []
+
+        # HNSW 索引（延迟构建）: label 与 cache_id 的映射独立于行号
+        self._ann = None
+        self._label_of: Dict[str, int] = {}
+        self._id_of_label: Dict[int, str] = {}
+        self._next_label = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, cache_id: str) -> bool:
+        return cache_id in self._row_of
+
+    @staticmethod
+    def normalize(vector: np.ndarray) -> np.ndarray:
+        """L2 归一化"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / (norm + 1e-8)
+
+    @property
+    def ids(self) -> List[str]:
+        """按行号排列的 cache_id 列表"""
+        return self._ids
+
+    def upsert(
+        self,
+        cache_id: str,
+        vector: np.ndarray,
+        confidence: float = 1.0,
+        enabled: bool = True,
+        user_id: str = ""
+    ):
+        """新增或更新一条向量"""
+        vector = self.normalize(vector)
+        row = self._row_of.get(cache_id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._row_of[cache_id] = row
+            self._ids.append(cache_id)
+        self._matrix[row] = vector
+        self._confidence[row] = confidence
+        self._enabled[row] = enabled
+        self._users[row] = user_id or ""
+
+        if self._ann is not None:
+            self._ann_add(cache_id, vector)
+        elif hnswlib is not None and self._size >= self.ann_threshold:
+            self._build_ann()
+
+    def remove(self, cache_id: str) -> bool:
+        """删除一条向量（用末行填补空位）"""
+        row = self._row_of.pop(cache_id, None)
+        if row is None:
+            return False
+
+        last = self._size - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._confidence[row] = self._confidence[last]
+            self._enabled[row] = self._enabled[last]
+            self._users[row] = self._users[last]
+            self._ids[row] = moved_id
+            self._row_of[moved_id] = row
+        self._ids.pop()
+        self._users[last] = None
+        self._size -= 1
+
+        if self._ann is not None:
+            label = self._label_of.pop(cache_id, None)
+            if label is not None:
+                self._id_of_label.pop(label, None)
+                try:
+                    self._ann.mark_deleted(label)
+                except Exception as e:
+                    logger.debug(f"HNSW mark_deleted failed for {cache_id}: {e}")
+        return True
+
+    def update_meta(self, cache_id: str, confidence: float, enabled: bool) -> bool:
+        """更新打分元数据（不涉及向量）"""
+        row = self._row_of.get(cache_id)
+        if row is None:
+            return False
+        self._confidence[row] = confidence
+        self._enabled[row] = enabled
+        return True
+
+    def vector(self, cache_id: str) -> Optional[np.ndarray]:
+        """返回单个条目的（已归一化）向量"""
+        row = self._row_of.get(cache_id)
+        return None if row is None else self._matrix[row]
+
+    def vectors(self) -> np.ndarray:
+        """返回当前有效的向量矩阵视图"""
+        return self._matrix[:self._size]
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        """计算查询向量与所有条目的余弦相似度（按行号排列）"""
+        if self._size == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self.vectors() @ self.normalize(query)
+
+    def candidates(self, query: np.ndarray, min_confidence: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        召回候选条目
+
+        传入 min_confidence 时只召回未禁用且置信度 >= min_confidence 的条目。
+        HNSW 检索时在图搜索过程中过滤，而不是先取 top-k 再过滤，
+        避免禁用或低置信度的条目把有效条目挤出候选集。
+
+        Returns:
+            (行号数组, 相似度数组)。未启用 HNSW 时返回全部条目。
+        """
+        query = self.normalize(query)
+        if self._ann is None or self._size <= self.ann_candidates:
+            rows = np.arange(self._size)
+            return rows, (self.vectors() @ query if self._size else np.zeros(0, dtype=np.float32))
+
+        k = min(self.ann_candidates, self._size)
+        if min_confidence is not None:
+            eligible = np.flatnonzero(self._valid_mask(min_confidence))
+            if eligible.size <= k:
+                # 有效条目不多于召回数量时直接精确打分
+                return eligible, self._matrix[eligible] @ query
+        try:
+            labels = self._ann_query(query, k, min_confidence)
+        except Exception as e:
+            logger.warning(f"HNSW query failed: {e}, falling back to full scan")
+            rows = np.arange(self._size)
+            return rows, self.vectors() @ query
+
+        rows = np.array(
+            [self._row_of[self._id_of_label[int(label)]]
+             for label in labels if int(label) in self._id_of_label],
+            dtype=np.int64
+        )
+        # 在召回集上重新做精确内积
+        return rows, self._matrix[rows] @ query
+
+    def _valid_mask(self, min_confidence: float) -> np.ndarray:
+        return self._enabled[:self._size] & (self._confidence[:self._size] >= min_confidence)
+
+    def _ann_query(self, query: np.ndarray, k: int, min_confidence: Optional[float]) -> List[int]:
+        """HNSW 检索 k 个 label；指定 min_confidence 时只返回满足条件的条目"""
+        if min_confidence is None:
+            return list(self._ann.knn_query(query, k=k)[0][0])
+
+        def accept(label) -> bool:
+            cache_id = self._id_of_label.get(int(label))
+            row = self._row_of.get(cache_id) if cache_id is not None else None
+            return row is not None and bool(self._enabled[row]) and self._confidence[row] >= min_confidence
+
+        try:
+            return list(self._ann.knn_query(query, k=k, filter=accept)[0][0])
+        except TypeError:
+            pass
+
+        # 旧版 hnswlib 不支持 filter 参数：逐步扩大召回数量，直到过滤后的候选足够
+        fetch = k
+        while True:
+            fetch = min(fetch * 2, self._size)
+            kept = [label for label in self._ann.knn_query(query, k=fetch)[0][0] if accept(label)]
+            if len(kept) >= k or fetch >= self._size:
+                return kept[:k]
+
+    def best_match(
+        self,
+        query: np.ndarray,
+        user_id: str = "",
+        min_confidence: float = 0.3,
+        user_bonus: float = 0.1
+    ) -> Tuple[Optional[str], float]:
+        """
+        查找加权得分最高的条目
+
+        得分 = (余弦相似度 + 用户匹配加分) * 置信度，
+        只考虑未禁用且置信度 >= min_confidence 的条目。
+
+        Returns:
+            (cache_id, 得分)，没有候选时返回 (None, 0.0)
+        """
+        if self._size == 0:
+            return None, 0.0
+
+        rows, sims = self.candidates(query, min_confidence=min_confidence)
+        if rows.size == 0:
+            return None, 0.0
+
+        confidence = self._confidence[rows]
+        valid = self._enabled[rows] & (confidence >= min_confidence)
+        if not valid.any():
+            return None, 0.0
+
+        scores = sims.astype(np.float32, copy=True)
+        if user_id:
+            scores += user_bonus * (self._users[rows] == user_id)
+        scores *= confidence
+        scores[~valid] = -np.inf
+
+        best = int(np.argmax(scores))
+        return self._ids[int(rows[best])], float(scores[best])
+
+    def _grow(self):
+        """容量翻倍（摊还 O(1) 插入）"""
+        capacity = self._matrix.shape[0] * 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        confidence = np.zeros(capacity, dtype=np.float32)
+        confidence[:self._size] = self._confidence[:self._size]
+        enabled = np.zeros(capacity, dtype=bool)
+        enabled[:self._size] = self._enabled[:self._size]
+        users = np.empty(capacity, dtype=object)
+        users[:self._size] = self._users[:self._size]
+        self._matrix, self._confidence, self._enabled, self._users = matrix, confidence, enabled, users
+
+    def _build_ann(self):
+        """构建 HNSW 索引"""
+        try:
+            ann = hnswlib.Index(space="ip", dim=self.dim)
+            ann.init_index(max_elements=max(self._size * 2, 1024), ef_construction=200, M=16)
+            ann.set_ef(max(self.ann_candidates * 2, 50))
+            self._ann = ann
+            self._label_of = {}
+            self._id_of_label = {}
+            self._next_label = 0
+            labels = []
+            for cache_id in self._ids:
+                labels.append(self._assign_label(cache_id))
+            ann.add_items(self.vectors(), np.array(labels))
+            logger.info(f"Built HNSW index with {self._size} entries")
+        except Exception as e:
+            logger.warning(f"Failed to build HNSW index: {e}, using matrix search")
+            self._ann = None
+
+    def _ann_add(self, cache_id: str, vector: np.ndarray):
+        """向 HNSW 索引写入一条向量（更新时先删除旧 label）"""
+        try:
+            old_label = self._label_of.pop(cache_id, None)
+            if old_label is not None:
+                self._id_of_label.pop(old_label, None)
+                self._ann.mark_deleted(old_label)
+            if self._ann.get_current_count() >= self._ann.get_max_elements():
+                self._ann.resize_index(self._ann.get_max_elements() * 2)
+            label = self._assign_label(cache_id)
+            self._ann.add_items(vector.reshape(1, -1), np.array([label]))
+        except Exception as e:
+            logger.warning(f"HNSW add failed: {e}, dropping ANN index")
+            self._ann = None
+
+    def _assign_label(self, cache_id: str) -> int:
+        label = self._next_label
+        self._next_label += 1
+        self._label_of[cache_id] = label
+        self._id_of_label[label] = cache_id
+        return label
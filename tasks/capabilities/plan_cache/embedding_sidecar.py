@@ -0,0 +1,180 @@
+# embedding_sidecar.py
+"""规划缓存 embedding 的持久化旁路文件"""
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每个 agent 目录下的旁路文件名（不以 .yaml 结尾，不会被当作缓存文件加载）
+SIDECAR_INDEX_FILE = ".embeddings.jsonl"
+SIDECAR_VECTORS_PREFIX = ".embeddings-"
+SIDECAR_VECTORS_SUFFIX = ".f32"
+
+
+class EmbeddingSidecar:
+    """
+    Embedding 旁路存储
+
+    以内容哈希为键保存 embedding，避免启动时对每个 YAML 规划重新编码。
+    向量以 float32 行追加写入向量文件；哈希与行号的对应关系
+    以追加日志保存在 .jsonl 文件中，首行记录模型名称、维度和向量文件名。
+    新增条目只追加向量行和一条 add 记录，删除只追加一条 del 记录，不改写已有内容；
+    失效的行由调用方在合适的时机通过 rewrite 压缩。模型名称变化时整个旁路文件失效。
+    load 一次性把向量读入内存，不持有向量文件（Windows 下被映射的文件无法删除，rewrite 需要删除旧文件）。
+    """
+
+    def __init__(self, agent_dir: Path, model_name: str):
+        self.agent_dir = Path(agent_dir)
+        self.model_name = model_name
+        # 最近一次 load 时向量文件中已失效（被删除或被覆盖）的行数
+        self.dead_rows = 0
+
+    @property
+    def index_path(self) -> Path:
+        return self.agent_dir / SIDECAR_INDEX_FILE
+
+    def content_hash(self, text: str) -> str:
+        """计算 embedding 输入文本的内容哈希（包含模型名称）"""
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """
+        读取旁路文件
+
+        Returns:
+            内容哈希 -> embedding。文件缺失或损坏时返回空字典。
+        """
+        self.dead_rows = 0
+        header = self._read_header()
+        if header is None:
+            return {}
+
+        try:
+            dim = int(header["dim"])
+            vectors_path = self.agent_dir / header["vectors"]
+            rows = vectors_path.stat().st_size // (dim * 4) if vectors_path.exists() else 0
+            vectors = (
+                np.fromfile(vectors_path, dtype=np.float32, count=rows * dim).reshape(rows, dim)
+                if rows else np.zeros((0, dim), dtype=np.float32)
+            )
+
+            live: Dict[str, int] = {}
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                next(f, None)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 写入中断留下的残行
+                        continue
+                    if "add" in record:
+                        if record["row"] < rows:
+                            live[record["add"]] = record["row"]
+                    elif "del" in record:
+                        live.pop(record["del"], None)
+            self.dead_rows = rows - len(live)
+            return {h: vectors[row] for h, row in live.items()}
+        except Exception as e:
+            logger.warning(f"Failed to load embedding sidecar from {self.agent_dir}: {e}")
+            return {}
+
+    def append(self, hashes: List[str], vectors: np.ndarray):
+        """
+        追加条目：向量行写入向量文件末尾，并追加对应的 add 记录
+
+        Args:
+            hashes: 内容哈希列表，与 vectors 的行一一对应
+            vectors: embedding 矩阵
+        """
+        if not hashes:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(hashes), -1)
+        header = self._read_header()
+        if header is None or header.get("dim") != vectors.shape[1]:
+            # 旁路文件不存在或已失效（模型 / 维度变化），重新开始
+            self.rewrite(hashes, vectors)
+            return
+
+        try:
+            row_bytes = vectors.shape[1] * 4
+            vectors_path = self.agent_dir / header["vectors"]
+            with open(vectors_path, "ab") as f:
+                start = f.tell() // row_bytes
+                # 丢弃写入中断留下的不完整行
+                f.truncate(start * row_bytes)
+                f.write(vectors.tobytes())
+            self._append_records([{"add": h, "row": start + i} for i, h in enumerate(hashes)])
+        except Exception as e:
+            logger.warning(f"Failed to append embedding sidecar in {self.agent_dir}: {e}")
+
+    def remove(self, hashes: List[str]):
+        """删除条目：只追加 del 记录，向量行留到下次压缩时回收"""
+        if not hashes or self._read_header() is None:
+            return
+        try:
+            self._append_records([{"del": h} for h in hashes])
+        except Exception as e:
+            logger.warning(f"Failed to update embedding sidecar in {self.agent_dir}: {e}")
+
+    def rewrite(self, hashes: List[str], vectors: np.ndarray):
+        """
+        整体重写旁路文件，只保留给定条目（用于压缩）
+
+        新向量文件使用新文件名，写好后原子替换日志文件，再删除旧向量文件，
+        任意时刻中断都不会出现日志与向量文件不匹配。
+        """
+        try:
+            self.agent_dir.mkdir(parents=True, exist_ok=True)
+            vectors = np.asarray(vectors, dtype=np.float32).reshape(len(hashes), -1)
+
+            vectors_name = f"{SIDECAR_VECTORS_PREFIX}{uuid.uuid4().hex[:8]}{SIDECAR_VECTORS_SUFFIX}"
+            with open(self.agent_dir / vectors_name, "wb") as f:
+                f.write(vectors.tobytes())
+            tmp_index = self.index_path.with_name(SIDECAR_INDEX_FILE + ".tmp")
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                header = {"model": self.model_name, "dim": int(vectors.shape[1]), "vectors": vectors_name}
+                f.write(json.dumps(header) + "\n")
+                f.writelines(json.dumps({"add": h, "row": i}) + "\n" for i, h in enumerate(hashes))
+            os.replace(tmp_index, self.index_path)
+
+            for path in self.agent_dir.glob(f"{SIDECAR_VECTORS_PREFIX}*{SIDECAR_VECTORS_SUFFIX}"):
+                if path.name != vectors_name:
+                    try:
+                        path.unlink(missing_ok=True)
+                    except OSError as e:
+                        # 旧文件仍被占用时保留，下次 rewrite 再清理；新日志已生效，不影响本次写入
+                        logger.debug(f"Failed to remove stale embedding vectors {path}: {e}")
+            self.dead_rows = 0
+        except Exception as e:
+            logger.warning(f"Failed to save embedding sidecar to {self.agent_dir}: {e}")
+
+    def _read_header(self) -> Optional[Dict[str, Any]]:
+        """读取日志首行；文件缺失、损坏或模型不一致时返回 None"""
+        if not self.index_path.exists():
+            return None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+        except Exception:
+            return None
+        if header.get("model") != self.model_name or "vectors" not in header:
+            return None
+        return header
+
+    def _append_records(self, records: List[Dict[str, Any]]):
+        with open(self.index_path, "rb+") as f:
+            # 上次写入中断时最后一行可能没有换行，先补齐，避免与新记录粘在一起
+            f.seek(0, os.SEEK_END)
+            prefix = b""
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    prefix = b"\n"
+            f.write(prefix + "".join(json.dumps(r) + "\n" for r in records).encode("utf-8"))
@@ -11,6 +11,8 @@ import numpy as np
 
 from .interface import IPlanCacheCapability
 from .agent_plan_cache import AgentPlanCache
+from .embedding_index import AgentEmbeddingIndex
+from .embedding_sidecar import EmbeddingSidecar
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,9 @@ class PlanCacheStore(IPlanCacheCapability):
 
     使用 YAML 文件 + Embedding 实现规划缓存的存储和检索。
     按 agent_id 分目录存储，支持语义相似度匹配。
+    每个 agent 维护一个 AgentEmbeddingIndex，查询时一次矩阵乘法完成打分。
+    embedding 按内容哈希持久化到 agent 目录下的旁路文件，启动时只对变化的条目批量编码；
+    保存和删除只向旁路文件追加变化的条目，失效条目在启动时压缩。
     """
 
     def __init__(self, cache_dir: str = None, model_name: str = "all-MiniLM-L6-v2"):
@@ -39,8 +44,12 @@ class PlanCacheStore(IPlanCacheCapability):
 
         # 内存缓存: agent_id -> List[AgentPlanCache]
         self._caches: Dict[str, List[AgentPlanCache]] = {}
-        # Embedding 缓存: cache_id -> embedding
-        self._embeddings: Dict[str, np.ndarray] = {}
+        # cache_id -> 缓存对象
+        self._by_id: Dict[str, AgentPlanCache] = {}
+        # 向量索引: agent_id -> AgentEmbeddingIndex
+        self._indexes: Dict[str, AgentEmbeddingIndex] = {}
+        # embedding 输入文本的内容哈希: cache_id -> hash
+        self._content_hashes: Dict[str, str] = {}
 
         # 延迟加载 embedding 模型
         self._model = None
@@ -76,7 +85,9 @@ class PlanCacheStore(IPlanCacheCapability):
     def _load_all_caches(self):
         """从磁盘加载所有缓存"""
         self._caches = {}
-        self._embeddings = {}
+        self._by_id = {}
+        self._indexes = {}
+        self._content_hashes = {}
 
         if not self.cache_dir.exists():
             return
@@ -97,29 +108,118 @@ class PlanCacheStore(IPlanCacheCapability):
                         if data:
                             cache = AgentPlanCache.from_dict(data)
                             self._caches[agent_id].append(cache)
-                            # 计算 embedding
-                            self._compute_embedding(cache)
+                            self._by_id[cache.cache_id] = cache
                 except Exception as e:
                     logger.warning(f"Failed to load cache file {cache_file}: {e}")
 
+            # 加载/补算该 agent 的 embedding
+            self._load_agent_embeddings(agent_id)
+
         total = sum(len(caches) for caches in self._caches.values())
         logger.info(f"Loaded {total} plan caches from {self.cache_dir}")
 
-    def _compute_embedding(self, cache: AgentPlanCache):
-        """计算缓存的 embedding"""
+    def _get_sidecar(self, agent_id: str) -> EmbeddingSidecar:
+        """获取 agent 目录对应的 embedding 旁路存储"""
+        return EmbeddingSidecar(self.cache_dir / agent_id, self._model_name)
+
+    @staticmethod
+    def _embedding_text(cache: AgentPlanCache) -> str:
+        """使用任务描述 + 关键词作为 embedding 输入"""
+        text = cache.task_description
+        if cache.trigger_keywords:
+            text += " " + " ".join(cache.trigger_keywords)
+        return text
+
+    def _load_agent_embeddings(self, agent_id: str):
+        """
+        加载 agent 的 embedding
+
+        命中旁路文件的条目直接复用，其余条目合并为一次 encode 调用并追加到旁路文件；
+        旁路文件中存在不再使用的哈希或失效行多于有效行时整体压缩重写。
+        """
+        caches = self._caches.get(agent_id, [])
+        if not caches:
+            return
+
+        sidecar = self._get_sidecar(agent_id)
+        stored = sidecar.load()
+
+        missing: List[AgentPlanCache] = []
+        for cache in caches:
+            content_hash = sidecar.content_hash(self._embedding_text(cache))
+            self._content_hashes[cache.cache_id] = content_hash
+            vector = stored.get(content_hash)
+            if vector is not None:
+                self._index_embedding(cache, vector)
+            else:
+                missing.append(cache)
+
+        if missing:
+            self._compute_embeddings(missing)
+
+        current = {self._content_hashes[cache.cache_id] for cache in caches}
+        if set(stored) - current or sidecar.dead_rows > len(stored):
+            self._persist_embeddings(agent_id)
+        elif missing:
+            self._append_embeddings(agent_id, missing)
+        logger.debug(
+            f"Agent {agent_id}: {len(caches) - len(missing)} embeddings from sidecar, "
+            f"{len(missing)} encoded"
+        )
+
+    def _compute_embeddings(self, caches: List[AgentPlanCache]):
+        """批量计算缓存的 embedding（一次 encode 调用）"""
         model = self._get_model()
-        if model is None:
+        if model is None or not caches:
             return
 
         try:
-            # 使用任务描述 + 关键词作为 embedding 输入
-            text = cache.task_description
-            if cache.trigger_keywords:
-                text += " " + " ".join(cache.trigger_keywords)
-            embedding = model.encode([text])[0]
-            self._embeddings[cache.cache_id] = embedding
+            embeddings = model.encode([self._embedding_text(c) for c in caches])
+            for cache, embedding in zip(caches, embeddings):
+                self._index_embedding(cache, embedding)
         except Exception as e:
-            logger.warning(f"Failed to compute embedding for cache {cache.cache_id}: {e}")
+            logger.warning(f"Failed to compute embeddings for {len(caches)} caches: {e}")
+
+    def _compute_embedding(self, cache: AgentPlanCache):
+        """计算缓存的 embedding 并追加到旁路文件"""
+        sidecar = self._get_sidecar(cache.agent_id)
+        self._content_hashes[cache.cache_id] = sidecar.content_hash(self._embedding_text(cache))
+        self._compute_embeddings([cache])
+        self._append_embeddings(cache.agent_id, [cache])
+
+    def _append_embeddings(self, agent_id: str, caches: List[AgentPlanCache]):
+        """将已编码的缓存追加到旁路文件"""
+        index = self._indexes.get(agent_id)
+        if index is None:
+            return
+        encoded = [cache.cache_id for cache in caches if cache.cache_id in index]
+        if encoded:
+            self._get_sidecar(agent_id).append(
+                [self._content_hashes[cache_id] for cache_id in encoded],
+                np.stack([index.vector(cache_id) for cache_id in encoded])
+            )
+
+    def _persist_embeddings(self, agent_id: str):
+        """将 agent 索引中的全部 embedding 重写到旁路文件（压缩）"""
+        index = self._indexes.get(agent_id)
+        if index is None:
+            return
+        hashes = [self._content_hashes.get(cache_id, "") for cache_id in index.ids]
+        self._get_sidecar(agent_id).rewrite(hashes, index.vectors())
+
+    def _index_embedding(self, cache: AgentPlanCache, embedding: np.ndarray):
+        """将 embedding 写入所属 agent 的向量索引"""
+        index = self._indexes.get(cache.agent_id)
+        if index is None:
+            index = AgentEmbeddingIndex(dim=int(np.asarray(embedding).size))
+            self._indexes[cache.agent_id] = index
+        index.upsert(
+            cache.cache_id,
+            embedding,
+            confidence=cache.confidence,
+            enabled=not cache.disabled,
+            user_id=cache.user_id
+        )
 
     def _get_cache_file_path(self, agent_id: str, cache_id: str) -> Path:
         """获取缓存文件路径"""
@@ -169,44 +269,19 @@ class PlanCacheStore(IPlanCacheCapability):
         if not candidates:
             return None
 
-        # 过滤：只考虑未禁用的、置信度足够的缓存
-        valid_caches = [
-            c for c in candidates
-            if not c.disabled and c.confidence >= 0.3
-        ]
-
-        if not valid_caches:
-            return None
-
         best_match = None
         best_score = 0.0
 
-        # 1. 尝试语义相似度匹配
-        model = self._get_model()
+        # 1. 尝试语义相似度匹配（余弦相似度 + 用户匹配加分，再按置信度加权）
+        index = self._indexes.get(agent_id)
+        model = self._get_model() if index is not None and len(index) > 0 else None
         if model is not None:
             try:
                 query_embedding = model.encode([task_description])[0]
-
-                for cache in valid_caches:
-                    if cache.cache_id not in self._embeddings:
-                        continue
-
-                    cache_embedding = self._embeddings[cache.cache_id]
-                    # 余弦相似度
-                    similarity = np.dot(query_embedding, cache_embedding) / (
-                        np.linalg.norm(query_embedding) * np.linalg.norm(cache_embedding) + 1e-8
-                    )
-
-                    # 用户匹配加分
-                    if cache.user_id and cache.user_id == user_id:
-                        similarity += 0.1
-
-                    # 置信度加权
-                    weighted_score = similarity * cache.confidence
-
-                    if weighted_score > best_score:
-                        best_score = weighted_score
-                        best_match = cache
+                cache_id, score = index.best_match(query_embedding, user_id=user_id)
+                if cache_id is not None and score > best_score:
+                    best_score = score
+                    best_match = self._by_id.get(cache_id)
 
             except Exception as e:
                 logger.warning(f"Embedding matching failed: {e}, falling back to keyword matching")
@@ -214,6 +289,11 @@ class PlanCacheStore(IPlanCacheCapability):
         # 2. 如果语义匹配分数不够，尝试关键词匹配
         if best_score < threshold:
             task_keywords = set(self._extract_keywords(task_description))
+            # 过滤：只考虑未禁用的、置信度足够的缓存
+            valid_caches = [
+                c for c in candidates
+                if not c.disabled and c.confidence >= 0.3
+            ]
 
             for cache in valid_caches:
                 if not cache.trigger_keywords:
@@ -275,6 +355,7 @@ class PlanCacheStore(IPlanCacheCapability):
         if agent_id not in self._caches:
             self._caches[agent_id] = []
         self._caches[agent_id].append(cache)
+        self._by_id[cache.cache_id] = cache
 
         # 计算 embedding
         self._compute_embedding(cache)
@@ -301,6 +382,11 @@ class PlanCacheStore(IPlanCacheCapability):
         else:
             cache.update_on_failure()
 
+        # 同步索引中的打分元数据
+        index = self._indexes.get(cache.agent_id)
+        if index is not None:
+            index.update_meta(cache.cache_id, cache.confidence, not cache.disabled)
+
         # 保存到磁盘
         file_path = self._get_cache_file_path(cache.agent_id, cache.cache_id)
         try:
@@ -317,11 +403,7 @@ class PlanCacheStore(IPlanCacheCapability):
 
     def get_cache_by_id(self, cache_id: str) -> Optional[AgentPlanCache]:
         """根据 ID 获取缓存"""
-        for caches in self._caches.values():
-            for cache in caches:
-                if cache.cache_id == cache_id:
-                    return cache
-        return None
+        return self._by_id.get(cache_id)
 
     def list_caches(
         self,
@@ -359,9 +441,15 @@ class PlanCacheStore(IPlanCacheCapability):
                 if c.cache_id != cache_id
             ]
 
-        # 删除 embedding
-        if cache_id in self._embeddings:
-            del self._embeddings[cache_id]
+        self._by_id.pop(cache_id, None)
+        content_hash = self._content_hashes.pop(cache_id, None)
+
+        # 删除 embedding（其他缓存仍使用同一内容哈希时保留旁路文件中的条目）
+        index = self._indexes.get(cache.agent_id)
+        if index is not None and index.remove(cache_id) and content_hash not in {
+            self._content_hashes.get(c.cache_id) for c in self._caches.get(cache.agent_id, [])
+        }:
+            self._get_sidecar(cache.agent_id).remove([content_hash])
 
         # 从磁盘删除
         file_path = self._get_cache_file_path(cache.agent_id, cache.cache_id)
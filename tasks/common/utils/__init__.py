@@ -9,7 +9,7 @@ from .config_utils import load_config, save_config
 from .data_validation import validate_input, validate_schema
 
 # 新添加的导入
-from .cache import Cache, LRUCache, MemoryCache, TTLCache, CacheEntry, CacheStats, cache, invalidate_cache
+from .cache import Cache, LRUCache, MemoryCache, TTLCache, ShardedCache, CacheEntry, CacheStats, cache, invalidate_cache, get_cache
 
 # 导出Singleton类的类方法为模块级别的函数
 clear_singletons = Singleton.clear_singletons
@@ -70,10 +70,12 @@ __all__ = [
     "LRUCache",
     "MemoryCache",
     "TTLCache",
+    "ShardedCache",
     "CacheEntry",
     "CacheStats",
     "cache",
     "invalidate_cache",
+    "get_cache",
     # 资源管理
     "ResourceManager",
     "ResourcePool",
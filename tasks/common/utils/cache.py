@@ -1,8 +1,12 @@
 """缓存工具模块"""
+import os
+import asyncio
 import time
+import heapq
+import itertools
 import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Callable, TypeVar, Generic, Tuple, List, Union
+from typing import Any, Dict, Optional, Callable, TypeVar, Generic, Tuple, List, Union, Iterable
 from collections import OrderedDict
 from functools import wraps
 
@@ -15,6 +19,12 @@ K = TypeVar('K')  # 键类型
 V = TypeVar('V')  # 值类型
 T = TypeVar('T')  # 通用类型
 
+# get_cache() 创建新缓存时使用的后端：lru / sharded
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru").lower()
+# 分片缓存的分片数（向上取整为2的幂）与单个命名缓存的默认容量
+CACHE_SHARDS = int(os.getenv("CACHE_SHARDS", "16"))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1000"))
+
 
 class CacheStats:
     """
@@ -101,6 +111,28 @@ class CacheStats:
                 'hit_ratio': self.get_hit_ratio()
             }
 
+    @classmethod
+    def aggregate(cls, stats_list: Iterable['CacheStats']) -> 'CacheStats':
+        """
+        汇总多个统计对象（如分片缓存的各个分片）
+        
+        Args:
+            stats_list: 统计对象列表
+            
+        Returns:
+            新的统计对象，各项计数为输入之和
+        """
+        total = cls()
+        for stats in stats_list:
+            with stats.lock:
+                total.hits += stats.hits
+                total.misses += stats.misses
+                total.adds += stats.adds
+                total.removals += stats.removals
+                total.evictions += stats.evictions
+                total.expirations += stats.expirations
+        return total
+
 
 class CacheEntry(Generic[K, V]):
     """
@@ -693,25 +725,252 @@ class TTLCache(Cache[K, V]):
         self.stats.increment_evictions()
 
 
+class _CacheShard:
+    """
+    分片缓存中的单个分片
+    每个分片有独立的锁、LRU顺序和过期时间堆，统计信息也按分片记录
+    """
+    
+    def __init__(self, max_size: Optional[int]):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()  # 按访问顺序排列，第一项最久未使用
+        self.expiry_heap: List[Tuple[float, int, Any, CacheEntry]] = []  # (过期时间, 序号, 键, 条目)
+        self.counter = itertools.count()
+        self.stats = CacheStats()
+        self.max_size = max_size
+
+
+class ShardedCache(Cache[K, V]):
+    """
+    分片缓存实现
+    按键的哈希值把数据分散到多个分片，每个分片独立加锁，减少多线程下的锁竞争。
+    - 过期：每个分片维护一个按过期时间排序的最小堆，惰性删除已失效的堆项
+    - 驱逐：分片满时先清理已过期的项，仍然满则驱逐该分片最久未使用的项，均摊 O(1)
+    - 统计：按分片记录，get_stats() 返回汇总后的结果
+    """
+    
+    MIN_SHARD_SIZE = 64  # 每个分片的最小容量
+    
+    def __init__(
+        self,
+        name: str = 'sharded',
+        max_size: Optional[int] = 1000,
+        default_ttl: Optional[float] = None,
+        shards: int = 16
+    ):
+        """
+        初始化分片缓存
+        
+        Args:
+            name: 缓存名称
+            max_size: 最大缓存项数量（所有分片合计），None表示无限制
+            default_ttl: 默认生存时间（秒），None表示永不过期
+            shards: 分片数量，会向上取整为2的幂
+        """
+        super().__init__(name)
+        shard_count = 1
+        while shard_count < max(1, shards):
+            shard_count <<= 1
+        if max_size is not None:
+            # 容量按分片均分，容量较小时减少分片，避免哈希不均导致提前驱逐
+            while shard_count > 1 and max_size < shard_count * self.MIN_SHARD_SIZE:
+                shard_count >>= 1
+            per_shard = -(-max_size // shard_count)
+        else:
+            per_shard = None
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._mask = shard_count - 1
+        self._shards = [_CacheShard(per_shard) for _ in range(shard_count)]
+    
+    def _shard_for(self, key: K) -> _CacheShard:
+        return self._shards[hash(key) & self._mask]
+    
+    def get(self, key: K) -> Optional[V]:
+        """
+        获取缓存值
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            缓存的值，如果不存在或已过期则返回None
+        """
+        shard = self._shard_for(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.stats.misses += 1
+                return None
+            
+            if entry.is_expired():
+                del shard.entries[key]
+                shard.stats.expirations += 1
+                shard.stats.misses += 1
+                return None
+            
+            shard.entries.move_to_end(key)
+            entry.update_access()
+            shard.stats.hits += 1
+            return entry.value
+    
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """
+        设置缓存值
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 生存时间（秒），None表示使用默认TTL
+        """
+        effective_ttl = ttl if ttl is not None else self.default_ttl
+        entry = CacheEntry(key, value, effective_ttl)
+        shard = self._shard_for(key)
+        with shard.lock:
+            if key in shard.entries:
+                del shard.entries[key]
+            elif shard.max_size is not None and len(shard.entries) >= shard.max_size:
+                self._purge_expired(shard, entry.created_at)
+                if len(shard.entries) >= shard.max_size:
+                    shard.entries.popitem(last=False)
+                    shard.stats.evictions += 1
+            
+            shard.entries[key] = entry
+            if entry.expires_at is not None:
+                heapq.heappush(shard.expiry_heap, (entry.expires_at, next(shard.counter), key, entry))
+                self._maybe_compact(shard)
+            shard.stats.adds += 1
+    
+    def delete(self, key: K) -> bool:
+        """
+        删除缓存值
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            是否成功删除
+        """
+        shard = self._shard_for(key)
+        with shard.lock:
+            if key in shard.entries:
+                del shard.entries[key]
+                shard.stats.removals += 1
+                return True
+            return False
+    
+    def clear(self) -> None:
+        """清空所有缓存"""
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiry_heap.clear()
+                shard.stats.removals = 0
+    
+    def contains(self, key: K) -> bool:
+        """
+        检查缓存是否包含指定键
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            是否包含指定键
+        """
+        shard = self._shard_for(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return False
+            
+            if entry.is_expired():
+                del shard.entries[key]
+                shard.stats.expirations += 1
+                return False
+            
+            shard.entries.move_to_end(key)
+            entry.update_access()
+            return True
+    
+    def size(self) -> int:
+        """
+        获取缓存大小
+        
+        Returns:
+            缓存中项目的数量
+        """
+        now = time.time()
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                self._purge_expired(shard, now)
+                total += len(shard.entries)
+        return total
+    
+    def get_stats(self) -> CacheStats:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            各分片统计信息的汇总
+        """
+        return CacheStats.aggregate(shard.stats for shard in self._shards)
+    
+    def reset_stats(self) -> None:
+        """重置缓存统计信息"""
+        for shard in self._shards:
+            shard.stats.reset()
+    
+    def _purge_expired(self, shard: _CacheShard, now: float) -> None:
+        """从堆顶开始清理分片中已过期的项（调用方持有分片锁）"""
+        heap = shard.expiry_heap
+        while heap and heap[0][0] < now:
+            _, _, key, entry = heapq.heappop(heap)
+            # 堆项可能已被覆盖或删除，只有仍是当前条目时才清理
+            if shard.entries.get(key) is entry:
+                del shard.entries[key]
+                shard.stats.expirations += 1
+    
+    def _maybe_compact(self, shard: _CacheShard) -> None:
+        """失效的堆项过多时重建堆，避免覆盖写导致堆无限增长（调用方持有分片锁）"""
+        if len(shard.expiry_heap) <= 2 * len(shard.entries) + 32:
+            return
+        shard.expiry_heap = [
+            item for item in shard.expiry_heap
+            if shard.entries.get(item[2]) is item[3]
+        ]
+        heapq.heapify(shard.expiry_heap)
+
+
 # 全局缓存字典，用于存储命名缓存实例
 global_caches: Dict[str, Cache] = {}
 global_caches_lock = threading.RLock()
 
 
-def get_cache(name: str = 'default') -> Cache:
+def _create_cache(name: str) -> Cache:
+    """按 CACHE_BACKEND 配置创建缓存实例"""
+    if CACHE_BACKEND == 'sharded':
+        return ShardedCache(name=name, max_size=CACHE_MAX_SIZE, shards=CACHE_SHARDS)
+    if CACHE_BACKEND != 'lru':
+        logger.warning(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', falling back to lru")
+    return LRUCache(name=name, max_size=CACHE_MAX_SIZE)
+
+
+def get_cache(name: str = 'default', factory: Optional[Callable[[str], Cache]] = None) -> Cache:
     """
     获取或创建一个全局缓存实例
     
     Args:
         name: 缓存名称
+        factory: 缓存不存在时用于创建实例的函数（参数为缓存名称），
+            None表示按 CACHE_BACKEND 配置创建（默认LRU缓存）
         
     Returns:
         缓存实例
     """
     with global_caches_lock:
         if name not in global_caches:
-            # 默认使用LRU缓存
-            global_caches[name] = LRUCache(name=name)
+            global_caches[name] = factory(name) if factory is not None else _create_cache(name)
         return global_caches[name]
 
 
@@ -720,21 +979,87 @@ _cache_decorator_info: Dict[Callable, Dict[str, Any]] = {}
 _cache_decorator_lock = threading.RLock()
 
 
+class _CachedValue:
+    """
+    装饰器写入缓存的值
+    fresh_until 之前为新鲜值；之后到底层缓存过期前为陈旧值，可在后台刷新的同时继续返回
+    """
+    
+    __slots__ = ('value', 'fresh_until')
+    
+    def __init__(self, value: Any, ttl: Optional[float]):
+        self.value = value
+        self.fresh_until = time.time() + ttl if ttl is not None else None
+    
+    def is_stale(self) -> bool:
+        return self.fresh_until is not None and time.time() >= self.fresh_until
+
+
+class _InFlightCall:
+    """同步函数正在进行中的一次计算，同一键的并发调用方等待它的结果"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+    
+    def wait(self) -> Any:
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _freeze_arg(value: Any) -> str:
+    """
+    将参数转换为稳定的键片段
+    字典、列表、集合等不可哈希参数按内容递归展开（字典按键排序），对象实例使用其类型和id
+    """
+    if isinstance(value, dict):
+        items = sorted((str(k), _freeze_arg(v)) for k, v in value.items())
+        return "{" + ",".join(f"{k}={v}" for k, v in items) + "}"
+    if isinstance(value, (list, tuple)):
+        inner = ",".join(_freeze_arg(v) for v in value)
+        return f"[{inner}]" if isinstance(value, list) else f"({inner})"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ",".join(sorted(_freeze_arg(v) for v in value)) + "}"
+    try:
+        if hasattr(value, '__dict__'):
+            return f"{type(value).__name__}@{id(value)}"
+        return str(value)
+    except Exception:
+        # 如果无法序列化，使用对象id
+        return f"object@{id(value)}"
+
+
+def _default_cache_key(func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """默认键生成：函数名 + 位置参数 + 按名称排序的关键字参数"""
+    key_parts = [func.__qualname__]
+    key_parts.extend(_freeze_arg(arg) for arg in args)
+    key_parts.extend(f"{k}={_freeze_arg(v)}" for k, v in sorted(kwargs.items()))
+    return ":".join(key_parts)
+
+
 def cache(
     func: Optional[Callable[..., T]] = None,
     ttl: Optional[float] = None,
     cache_name: str = 'default',
-    key_generator: Optional[Callable[..., str]] = None
+    key_generator: Optional[Callable[..., str]] = None,
+    stale_ttl: Optional[float] = None,
+    single_flight: bool = True
 ) -> Union[Callable[[Callable[..., T]], Callable[..., T]], Callable[..., T]]:
     """
     缓存装饰器
-    缓存函数的返回值，避免重复计算
+    缓存函数的返回值，避免重复计算，同时支持普通函数和协程函数
     
     Args:
         func: 要装饰的函数
         ttl: 缓存生存时间（秒），None表示永不过期
         cache_name: 使用的缓存名称
-        key_generator: 自定义缓存键生成器函数
+        key_generator: 自定义缓存键生成器函数，参数与被装饰函数相同；
+            默认按内容展开字典、列表等不可哈希参数
+        stale_ttl: 过期后仍可返回旧值的时间（秒），期间返回旧值并在后台刷新，None表示不启用
+        single_flight: 同一键并发未命中时是否只执行一次计算，其余调用方等待其结果
         
     Returns:
         装饰后的函数
@@ -751,54 +1076,111 @@ def cache(
                 'ttl': ttl
             }
         
-        @wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> T:
-            # 生成缓存键
+        # 底层缓存保留到陈旧期结束
+        storage_ttl = ttl + stale_ttl if ttl is not None and stale_ttl else ttl
+        # 进行中的计算：同步函数为 _InFlightCall，协程函数为 asyncio.Task
+        inflight: Dict[str, Any] = {}
+        inflight_lock = threading.Lock()
+        
+        def build_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
             if key_generator is not None:
-                cache_key = key_generator(*args, **kwargs)
-            else:
-                # 默认键生成：使用函数名、参数的字符串表示
-                # 注意：这种方式可能不完美，但适用于大多数情况
-                key_parts = [func.__qualname__]
-                
-                # 添加位置参数
-                for arg in args:
-                    # 尝试获取可哈希的表示
-                    try:
-                        # 如果是对象实例，只使用其类型和id
-                        if hasattr(arg, '__dict__'):
-                            key_parts.append(f"{type(arg).__name__}@{id(arg)}")
-                        else:
-                            # 对于基本类型，直接使用
-                            key_parts.append(str(arg))
-                    except Exception:
-                        # 如果无法序列化，使用对象id
-                        key_parts.append(f"object@{id(arg)}")
-                
-                # 添加关键字参数（按键排序确保一致性）
-                for k, v in sorted(kwargs.items()):
-                    try:
-                        if hasattr(v, '__dict__'):
-                            key_parts.append(f"{k}={type(v).__name__}@{id(v)}")
-                        else:
-                            key_parts.append(f"{k}={v}")
-                    except Exception:
-                        key_parts.append(f"{k}=object@{id(v)}")
-                
-                cache_key = ":".join(key_parts)
-            
-            # 尝试从缓存获取
-            result = cache_instance.get(cache_key)
-            if result is not None:
+                return key_generator(*args, **kwargs)
+            return _default_cache_key(func, args, kwargs)
+        
+        def lookup(cache_key: str) -> Optional[_CachedValue]:
+            record = cache_instance.get(cache_key)
+            return record if isinstance(record, _CachedValue) else None
+        
+        def store(cache_key: str, result: Any) -> None:
+            # 与之前一致，None 结果不缓存
+            if result is None:
+                return
+            cache_instance.set(cache_key, _CachedValue(result, ttl), storage_ttl)
+        
+        if asyncio.iscoroutinefunction(func):
+            async def compute_async(cache_key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+                result = await func(*args, **kwargs)
+                store(cache_key, result)
                 return result
             
-            # 执行函数
-            result = func(*args, **kwargs)
+            def on_task_done(cache_key: str, task: 'asyncio.Task') -> None:
+                with inflight_lock:
+                    if inflight.get(cache_key) is task:
+                        del inflight[cache_key]
+                # 取出异常，避免后台刷新失败时出现 "exception was never retrieved"
+                if not task.cancelled() and task.exception() is not None:
+                    logger.debug(f"Cached call {func.__qualname__} failed: {task.exception()}")
             
-            # 存入缓存
-            cache_instance.set(cache_key, result, ttl)
+            def get_task(cache_key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> 'asyncio.Task':
+                loop = asyncio.get_running_loop()
+                with inflight_lock:
+                    task = inflight.get(cache_key)
+                    # 不同事件循环中的任务不能共享
+                    if task is None or not single_flight or task.get_loop() is not loop:
+                        task = loop.create_task(compute_async(cache_key, args, kwargs))
+                        inflight[cache_key] = task
+                        task.add_done_callback(lambda t: on_task_done(cache_key, t))
+                return task
             
-            return result
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> T:
+                cache_key = build_key(args, kwargs)
+                record = lookup(cache_key)
+                if record is not None:
+                    if record.is_stale():
+                        get_task(cache_key, args, kwargs)
+                    return record.value
+                # 计算在独立任务中进行，某个调用方被取消不影响其他等待者
+                return await asyncio.shield(get_task(cache_key, args, kwargs))
+            
+            return async_wrapper
+        
+        def compute_sync(cache_key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+            if not single_flight:
+                result = func(*args, **kwargs)
+                store(cache_key, result)
+                return result
+            
+            with inflight_lock:
+                call = inflight.get(cache_key)
+                leader = call is None
+                if leader:
+                    call = inflight[cache_key] = _InFlightCall()
+            if not leader:
+                return call.wait()
+            
+            try:
+                call.result = func(*args, **kwargs)
+                store(cache_key, call.result)
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with inflight_lock:
+                    inflight.pop(cache_key, None)
+                call.event.set()
+        
+        def refresh_sync(cache_key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+            try:
+                compute_sync(cache_key, args, kwargs)
+            except Exception as e:
+                logger.debug(f"Background refresh of {func.__qualname__} failed: {e}")
+        
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            cache_key = build_key(args, kwargs)
+            record = lookup(cache_key)
+            if record is not None:
+                if record.is_stale():
+                    with inflight_lock:
+                        refreshing = cache_key in inflight
+                    if not refreshing:
+                        threading.Thread(
+                            target=refresh_sync, args=(cache_key, args, kwargs), daemon=True
+                        ).start()
+                return record.value
+            return compute_sync(cache_key, args, kwargs)
         
         return wrapper
     
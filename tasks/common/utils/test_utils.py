@@ -4,6 +4,7 @@
 """
 
 import unittest
+import asyncio
 import time
 import threading
 from datetime import datetime, timedelta
@@ -26,6 +27,7 @@ from . import (
     LRUCache,
     MemoryCache,
     TTLCache,
+    ShardedCache,
     cache,
     
     # 资源管理
@@ -219,6 +221,35 @@ class TestCache(unittest.TestCase):
         # 应该仍然存在，因为TTL被重置了
         self.assertEqual(cache.get("key3"), "new_value3")
     
+    def test_sharded_cache(self):
+        """测试分片缓存"""
+        cache = ShardedCache(max_size=8, default_ttl=0.5)
+        
+        for i in range(8):
+            cache.set(f"key{i}", i)
+        self.assertEqual(cache.size(), 8)
+        
+        # 覆盖写不应触发驱逐
+        cache.set("key0", "new_value0")
+        self.assertEqual(cache.get("key0"), "new_value0")
+        self.assertEqual(cache.get_stats().evictions, 0)
+        
+        # 超出容量时驱逐对应分片中最久未使用的项
+        for i in range(8, 16):
+            cache.set(f"key{i}", i)
+        self.assertLessEqual(cache.size(), 8)
+        self.assertGreater(cache.get_stats().evictions, 0)
+        
+        # 等待默认TTL过期
+        time.sleep(0.6)
+        self.assertIsNone(cache.get("key15"))
+        self.assertGreater(cache.get_stats().expirations, 0)
+        
+        # 各分片统计汇总
+        stats = cache.get_stats()
+        self.assertEqual(stats.adds, 17)
+        self.assertGreater(stats.hits, 0)
+    
     def test_cache_decorator(self):
         """测试缓存装饰器"""
         call_count = [0]
@@ -250,6 +281,30 @@ class TestCache(unittest.TestCase):
         result4 = cached_function(10, 20)
         self.assertEqual(result4, 30)
         self.assertEqual(call_count[0], 3)  # 调用次数增加
+    
+    def test_async_cache_decorator_single_flight(self):
+        """测试协程缓存装饰器的并发合并"""
+        call_count = [0]
+        
+        @cache(ttl=5)
+        async def cached_coroutine(params):
+            call_count[0] += 1
+            await asyncio.sleep(0.1)
+            return params["value"] * 2
+        
+        async def run():
+            # 并发未命中只执行一次，字典参数按内容生成键
+            results = await asyncio.gather(*[
+                cached_coroutine({"value": 21, "tag": "a"}) for _ in range(10)
+            ])
+            self.assertEqual(results, [42] * 10)
+            self.assertEqual(call_count[0], 1)
+            
+            result = await cached_coroutine({"tag": "a", "value": 21})
+            self.assertEqual(result, 42)
+            self.assertEqual(call_count[0], 1)
+        
+        asyncio.run(run())
 
 
 class TestResourceManagement(unittest.TestCase):
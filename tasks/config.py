@@ -6,6 +6,10 @@ import os
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://121.36.203.36:10008")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "12345678")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None  # None 表示服务端默认库
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
 
 # Redis 配置（从环境变量读取）
 REDIS_HOST = os.getenv("REDIS_HOST", "121.36.203.36")
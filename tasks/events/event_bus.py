@@ -3,10 +3,11 @@
  - 对外提供同步接口（如 publish_task_event） 
  - 内部通过后台线程 + asyncio loop 异步发送 HTTP 请求 
  - 支持缓冲、重试、解耦 
+ - 发送失败或队列溢出的事件落盘（SQLite WAL），重启后按序重放 
  - 队列可未来替换为 Redis（只需改 queue 实现） 
  """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set
 import logging
 import httpx
 import uuid
@@ -14,8 +15,8 @@ import os
 from datetime import datetime
 import asyncio
 import threading
-import queue
 import time
+import zlib
 from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime, date
@@ -25,10 +26,27 @@ from pydantic import BaseModel
 
 # 导入信号状态枚举
 from common.signal.signal_status import SignalStatus
+from .spill_log import EventSpillLog
+from .signal_feed import get_signal_feed
 
 # 从环境变量获取 events 服务地址
 EVENTS_SERVICE_URL = os.getenv('EVENTS_SERVICE_URL', 'http://localhost:8000') 
 
+# 批量发送配置：批量模式开关、单批最大事件数、合并窗口（毫秒）、并发通道数
+EVENTS_BATCH_MODE = os.getenv('EVENTS_BATCH_MODE', 'true').lower() in ('1', 'true', 'yes')
+EVENTS_BATCH_SIZE = int(os.getenv('EVENTS_BATCH_SIZE', '50'))
+EVENTS_BATCH_INTERVAL_MS = int(os.getenv('EVENTS_BATCH_INTERVAL_MS', '20'))
+EVENTS_MAX_IN_FLIGHT = int(os.getenv('EVENTS_MAX_IN_FLIGHT', '4'))
+
+# 溢出日志配置：日志路径（默认在 tasks/execution_cache 下，与启动目录无关；设为空字符串关闭）、重放调度间隔、最大重试间隔、失败后的熔断窗口（秒）
+EVENTS_SPILL_PATH = os.getenv(
+    'EVENTS_SPILL_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'execution_cache', 'event_spill.db')
+)
+EVENTS_REPLAY_INTERVAL = float(os.getenv('EVENTS_REPLAY_INTERVAL', '0.5'))
+EVENTS_RETRY_MAX_DELAY = float(os.getenv('EVENTS_RETRY_MAX_DELAY', '60'))
+EVENTS_UNHEALTHY_WINDOW = float(os.getenv('EVENTS_UNHEALTHY_WINDOW', '5'))
+
 
 class EventType(Enum): 
     TASK_EVENT = "task_event" 
@@ -41,6 +59,12 @@ class QueuedEvent:
     payload: Dict[str, Any]  # 包含所有必要参数 
     retry_count: int = 0 
     max_retries: int = 3 
+    seq: int = 0  # 入队序号，溢出日志按该序号重放
+    lane: int = 0  # 所属发送通道
+
+
+# 通道内的重放标记：消费者收到后从溢出日志重放本通道到期的事件
+_REPLAY = object()
 
 
 class EventPublisher: 
@@ -48,6 +72,12 @@ class EventPublisher:
     轻量级事件发布 SDK 
     - 同步方法仅入队，非阻塞 
     - 后台线程异步消费并发送 HTTP 请求 
+    - 事件按 trace_id 分配到固定的发送通道（lane），同一 trace 内保持顺序，
+      不同通道并发发送，单个慢请求只阻塞自己的通道
+    - 批量模式下每个通道将最多 batch_size 个事件 / batch_interval_ms 毫秒内的事件
+      合并为一次 /events/batch 请求
+    - 通道已满或发送失败的事件写入本地溢出日志（SQLite WAL），由独立的重试调度
+      按序重放；有积压的 trace 后续事件也进入日志排队，保证顺序且不阻塞健康流量
     """
 
     def __init__( 
@@ -56,14 +86,37 @@ class EventPublisher:
         logger: Optional[logging.Logger] = None, 
         max_queue_size: int = 10_000, 
         shutdown_timeout: float = 5.0, 
+        batch_mode: Optional[bool] = None,
+        batch_size: int = EVENTS_BATCH_SIZE,
+        batch_interval_ms: int = EVENTS_BATCH_INTERVAL_MS,
+        max_in_flight: int = EVENTS_MAX_IN_FLIGHT,
+        spill_path: Optional[str] = EVENTS_SPILL_PATH,
     ): 
         """初始化事件总线""" 
         self.base_url = lifecycle_base_url.rstrip("/") 
         self.log = logger or logging.getLogger(f"{__name__}.{self.__class__.__name__}") 
         self.shutdown_timeout = shutdown_timeout 
 
-        # 内存队列（未来可替换为 RedisQueue） 
-        self._queue: queue.Queue[QueuedEvent] = queue.Queue(maxsize=max_queue_size) 
+        # 批量发送配置
+        self.batch_mode = EVENTS_BATCH_MODE if batch_mode is None else batch_mode
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = max(0, batch_interval_ms) / 1000.0
+        self.max_in_flight = max(1, max_in_flight)
+
+        # 每个通道一个 asyncio 队列（在后台 loop 中创建），总容量为 max_queue_size
+        self._lane_capacity = max(1, max_queue_size // self.max_in_flight)
+        self._lanes: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        # 每个通道正在发送的事件（seq -> 事件），关闭超时时写入溢出日志
+        self._in_flight: Dict[int, Dict[int, QueuedEvent]] = {}
+
+        # 溢出日志（为空则关闭，退回到通道内重试 + 丢弃）
+        self.spill_path = spill_path
+        self._spill: Optional[EventSpillLog] = None
+        self._spilled_traces: Dict[str, int] = {}  # trace_id -> 日志中未送达的事件数
+        self._replay_scheduled: Set[int] = set()
+        self._unhealthy_until = 0.0  # 最近发送失败后，在此之前新事件直接写入日志
+        self._seq = 0
 
         # 后台线程和 asyncio loop 
         self._loop: Optional[asyncio.AbstractEventLoop] = None 
@@ -74,17 +127,24 @@ class EventPublisher:
         # 启动后台消费者线程 
         self._start_background_worker() 
 
-        self.log.info(f"EventPublisher initialized with base URL: {lifecycle_base_url}") 
+        self.log.info(
+            f"EventPublisher initialized with base URL: {lifecycle_base_url} "
+            f"(batch_mode={self.batch_mode}, lanes={self.max_in_flight}, spill={self._spill is not None})"
+        )
 
     def _start_background_worker(self): 
         """启动后台线程运行 asyncio loop""" 
         def run_loop(): 
             self._loop = asyncio.new_event_loop() 
             asyncio.set_event_loop(self._loop) 
+            self._lanes = [asyncio.Queue(maxsize=self._lane_capacity) for _ in range(self.max_in_flight)]
+            self._open_spill_log()
             self._running.set() 
             try: 
                 self._loop.run_until_complete(self._consume_queue()) 
             finally: 
+                if self._spill is not None:
+                    self._spill.close()
                 self._loop.close() 
                 self._shutdown_complete.set() 
 
@@ -92,41 +152,298 @@ class EventPublisher:
         self._thread.start() 
         self._running.wait()  # 等待 loop 就绪 
 
+    def _open_spill_log(self):
+        """打开溢出日志并恢复上次未送达的事件（在后台线程中执行）"""
+        if not self.spill_path:
+            return
+        try:
+            self._spill = EventSpillLog(self.spill_path, logger=self.log)
+            self._spill.reassign_lanes(self._lane_of)
+            self._spilled_traces = self._spill.trace_counts()
+            self._seq = self._spill.max_seq()
+            pending = sum(self._spilled_traces.values())
+            if pending:
+                self.log.info(f"Recovered {pending} undelivered events from spill log {self.spill_path}")
+        except Exception as e:
+            self.log.warning(f"Failed to open event spill log {self.spill_path}: {e}, spilling disabled")
+            self._spill = None
+
+    def _lane_of(self, trace_id: str) -> int:
+        """trace_id 到通道的稳定映射（跨进程重启保持一致）"""
+        return zlib.crc32((trace_id or "").encode("utf-8")) % self.max_in_flight
+
+    def _next_seq(self) -> int:
+        self._seq = max(self._seq + 1, time.time_ns())
+        return self._seq
+
     async def _consume_queue(self): 
-        """异步消费队列中的事件""" 
-        client = httpx.AsyncClient(timeout=10.0) 
+        """为每个通道启动一个消费协程，并启动溢出日志的重试调度""" 
+        client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        )
+        scheduler = asyncio.ensure_future(self._replay_scheduler()) if self._spill is not None else None
         try: 
-            while True: 
-                try: 
-                    # 使用 asyncio 的方式从 queue 中取（需包装） 
-                    item = await asyncio.get_event_loop().run_in_executor(None, self._queue.get, True, 1.0) 
-                    if item is None:  # 用于触发退出 
-                        break 
-                except queue.Empty: 
-                    continue 
-
-                try: 
-                    if item.event_type == EventType.TASK_EVENT: 
-                        await self._send_event_request_internal(client, item.payload) 
-                    elif item.event_type == EventType.SPLIT_REQUEST: 
-                        await self._send_split_request_internal(client, item.payload) 
-                    self._queue.task_done() 
-                except Exception as e: 
-                    self.log.error(f"Failed to process queued event: {e}", exc_info=True) 
-                    # 重试机制 
-                    if item.retry_count < item.max_retries: 
-                        item.retry_count += 1 
-                        delay = (2 ** item.retry_count) * 0.5  # 指数退避 
-                        await asyncio.sleep(delay) 
-                        self._queue.put_nowait(item) 
-                    else: 
-                        self.log.error(f"Event dropped after {item.max_retries} retries: {item.payload}") 
-                        self._queue.task_done() 
+            self._workers = [
+                asyncio.ensure_future(self._consume_lane(index, lane, client))
+                for index, lane in enumerate(self._lanes)
+            ]
+            await asyncio.gather(*self._workers, return_exceptions=True)
         except asyncio.CancelledError: 
             pass 
         finally: 
+            if scheduler is not None:
+                scheduler.cancel()
             await client.aclose() 
 
+    async def _consume_lane(self, index: int, lane: asyncio.Queue, client: httpx.AsyncClient):
+        """
+        消费单个通道：裂变请求单独发送，普通事件在批量模式下合并发送
+        """
+        carry = None
+        while True:
+            item = carry if carry is not None else await lane.get()
+            carry = None
+            if item is None:  # 用于触发退出
+                lane.task_done()
+                break
+
+            if item is _REPLAY:
+                self._replay_scheduled.discard(index)
+                await self._replay_lane(index, client)
+                lane.task_done()
+                continue
+
+            if self._should_spill(item):
+                self._spill_events([item], failed=False)
+                lane.task_done()
+                continue
+
+            if item.event_type == EventType.SPLIT_REQUEST or not self.batch_mode:
+                self._in_flight.setdefault(index, {})[item.seq] = item
+                await self._deliver_one(client, item)
+                lane.task_done()
+                continue
+
+            batch = [item]
+            carry = self._drain_lane(lane, batch)
+            # 队列中没有更多事件时，等待一个合并窗口再收集一次
+            if carry is None and len(batch) < self.batch_size and self.batch_interval > 0:
+                await asyncio.sleep(self.batch_interval)
+                carry = self._drain_lane(lane, batch)
+
+            self._in_flight.setdefault(index, {}).update((queued.seq, queued) for queued in batch)
+            await self._deliver_batch(client, batch)
+            for _ in batch:
+                lane.task_done()
+
+    def _drain_lane(self, lane: asyncio.Queue, batch: List[QueuedEvent]):
+        """
+        非阻塞地从通道收集事件直到批次已满
+
+        Returns:
+            遇到需要单独处理的条目（裂变请求、需写入日志的事件、重放标记或退出信号）时返回该条目，否则返回 None
+        """
+        while len(batch) < self.batch_size:
+            try:
+                item = lane.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+            if item is None or item is _REPLAY or item.event_type == EventType.SPLIT_REQUEST or self._should_spill(item):
+                return item
+            batch.append(item)
+        return None
+
+    def _should_spill(self, item: QueuedEvent) -> bool:
+        """该 trace 在日志中仍有积压，或服务刚刚发送失败时，新事件直接写入日志"""
+        if self._spill is None:
+            return False
+        if self._spilled_traces.get(item.payload.get("trace_id") or ""):
+            return True
+        return time.monotonic() < self._unhealthy_until
+
+    async def _send(self, client: httpx.AsyncClient, item: QueuedEvent):
+        """发送单个事件（失败时抛出异常）"""
+        if item.event_type == EventType.TASK_EVENT:
+            await self._send_event_request_internal(client, item.payload)
+        elif item.event_type == EventType.SPLIT_REQUEST:
+            await self._send_split_request_internal(client, item.payload)
+
+    async def _deliver_one(self, client: httpx.AsyncClient, item: QueuedEvent):
+        """发送单个事件，失败时写入溢出日志；未启用日志时在本通道内指数退避重试"""
+        while True:
+            try:
+                await self._send(client, item)
+                self._settle([item])
+                return
+            except Exception as e:
+                self.log.error(f"Failed to process queued event: {e}", exc_info=True)
+                if self._spill is not None:
+                    self._mark_unhealthy()
+                    self._spill_events([item], failed=True)
+                    self._settle([item])
+                    return
+                if item.retry_count >= item.max_retries:
+                    self.log.error(f"Event dropped after {item.max_retries} retries: {item.payload}")
+                    self._settle([item])
+                    return
+                item.retry_count += 1
+                await asyncio.sleep(self._backoff(item.retry_count))  # 指数退避
+
+    async def _deliver_batch(self, client: httpx.AsyncClient, batch: List[QueuedEvent]):
+        """批量发送事件，批量接口不可用时降级为逐条发送"""
+        if len(batch) == 1 or not self.batch_mode:
+            for item in batch:
+                await self._deliver_one(client, item)
+            return
+
+        retry_count = 0
+        max_retries = min(item.max_retries for item in batch)
+        while True:
+            try:
+                supported = await self._send_event_batch_internal(client, [item.payload for item in batch])
+                if not supported:
+                    for item in batch:
+                        await self._deliver_one(client, item)
+                self._settle(batch)
+                return
+            except Exception as e:
+                self.log.error(f"Failed to process event batch ({len(batch)} events): {e}")
+                if self._spill is not None:
+                    self._mark_unhealthy()
+                    self._spill_events(batch, failed=True)
+                    self._settle(batch)
+                    return
+                if retry_count >= max_retries:
+                    self.log.error(f"Event batch dropped after {max_retries} retries: {len(batch)} events")
+                    self._settle(batch)
+                    return
+                retry_count += 1
+                await asyncio.sleep(self._backoff(retry_count))  # 指数退避
+
+    def _settle(self, items: List[QueuedEvent]):
+        """事件已送达、已写入溢出日志或已丢弃，不再属于发送中"""
+        for item in items:
+            self._in_flight.get(item.lane, {}).pop(item.seq, None)
+
+    # ======================== 
+    # 溢出日志与重放 
+    # ======================== 
+
+    @staticmethod
+    def _backoff(retry_count: int) -> float:
+        return min(EVENTS_RETRY_MAX_DELAY, (2 ** retry_count) * 0.5)
+
+    def _mark_unhealthy(self):
+        self._unhealthy_until = time.monotonic() + EVENTS_UNHEALTHY_WINDOW
+
+    def _spill_events(self, items: List[QueuedEvent], failed: bool):
+        """
+        将事件写入溢出日志
+
+        Args:
+            items: 事件列表
+            failed: 是否因发送失败写入（是则增加重试次数并推迟下次尝试）
+        """
+        now = time.time()
+        for item in items:
+            trace_id = item.payload.get("trace_id") or ""
+            retry_count = item.retry_count + 1 if failed else item.retry_count
+            try:
+                self._spill.append(
+                    seq=item.seq,
+                    lane=item.lane,
+                    trace_id=trace_id,
+                    event_type=item.event_type.value,
+                    payload=self.serialize_payload(item.payload),
+                    retry_count=retry_count,
+                    next_attempt_at=now + self._backoff(retry_count) if failed else now,
+                )
+                self._spilled_traces[trace_id] = self._spilled_traces.get(trace_id, 0) + 1
+            except Exception as e:
+                self.log.error(f"Failed to spill event, dropping: {e} - {item.payload}")
+
+    async def _replay_scheduler(self):
+        """独立的重试调度：为有到期事件的通道投递重放标记"""
+        while True:
+            try:
+                await asyncio.sleep(EVENTS_REPLAY_INTERVAL)
+                now = time.time()
+                for index, due in self._spill.next_due().items():
+                    if due > now or index in self._replay_scheduled or index >= len(self._lanes):
+                        continue
+                    try:
+                        self._lanes[index].put_nowait(_REPLAY)
+                        self._replay_scheduled.add(index)
+                    except asyncio.QueueFull:
+                        pass  # 通道繁忙，下一轮再试
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.log.error(f"Event replay scheduler error: {e}")
+
+    async def _replay_lane(self, index: int, client: httpx.AsyncClient):
+        """
+        按 seq 顺序重放本通道到期的事件
+
+        同一 trace 只有前面的事件送达后才会发送后面的事件；
+        网络错误时更新该事件的重试时间并结束本轮（服务可能不可用）；
+        其他错误（如负载无法发送）计入失败次数，超过 max_retries 后移入死信表，不再阻塞后续事件。
+        """
+        entries = self._spill.fetch_lane(index, self.batch_size)
+        blocked: Set[str] = set()
+        now = time.time()
+        delivered = 0
+        for entry in entries:
+            if entry.trace_id in blocked:
+                continue
+            if entry.next_attempt_at > now:
+                blocked.add(entry.trace_id)
+                continue
+
+            retry_count = entry.retry_count + 1
+            try:
+                item = QueuedEvent(
+                    event_type=EventType(entry.event_type),
+                    payload=entry.payload,
+                    retry_count=entry.retry_count,
+                    seq=entry.seq,
+                    lane=index,
+                )
+                await self._send(client, item)
+            except httpx.TransportError as e:
+                self._spill.reschedule(entry.seq, retry_count, time.time() + self._backoff(retry_count))
+                self._mark_unhealthy()
+                self.log.warning(f"Replay of spilled event failed (retry {retry_count}): {e}")
+                return
+            except Exception as e:
+                failures = entry.failures + 1
+                if failures > QueuedEvent.max_retries:
+                    self._spill.dead_letter(entry.seq, str(e))
+                    self._forget_spilled(entry.trace_id)
+                    self.log.error(f"Spilled event moved to dead letters after {failures} failures: {e} - seq {entry.seq}")
+                    continue
+                self._spill.reschedule(entry.seq, retry_count, time.time() + self._backoff(retry_count), failures)
+                blocked.add(entry.trace_id)
+                self.log.warning(f"Replay of spilled event failed (failure {failures}): {e}")
+                continue
+
+            self._spill.remove(entry.seq)
+            delivered += 1
+            self._forget_spilled(entry.trace_id)
+
+        if delivered:
+            self._unhealthy_until = 0.0
+            self.log.info(f"Replayed {delivered} spilled events on lane {index}")
+
+    def _forget_spilled(self, trace_id: str):
+        """日志中移除一条记录后更新该 trace 的积压计数"""
+        remaining = self._spilled_traces.get(trace_id, 1) - 1
+        if remaining > 0:
+            self._spilled_traces[trace_id] = remaining
+        else:
+            self._spilled_traces.pop(trace_id, None)
+
     # ======================== 
     # 内部 async 方法（仅供后台使用） 
     # ======================== 
@@ -169,6 +486,29 @@ class EventPublisher:
             self.log.error(f"Failed to send event: {str(e)}") 
             raise 
 
+    async def _send_event_batch_internal(self, client: httpx.AsyncClient, payloads: List[Dict]) -> bool:
+        """
+        批量通道：一次请求发送多个状态事件
+
+        Returns:
+            bool: 服务端是否支持批量接口（不支持时关闭批量模式）
+        """
+        url = f"{self.base_url}/api/v1/traces/events/batch"
+        try:
+            resp = await client.post(url, json={"events": self.serialize_payload(payloads)})
+            if resp.status_code in (404, 405):
+                self.log.warning("Lifecycle service does not support batch events, falling back to single requests")
+                self.batch_mode = False
+                return False
+            if resp.status_code >= 400:
+                self.log.error(f"Event batch report failed: {resp.status_code} - {resp.text}")
+            else:
+                self.log.debug(f"Lifecycle event batch sent: {len(payloads)} events")
+            return True
+        except Exception as e:
+            self.log.error(f"Failed to send event batch: {str(e)}")
+            raise
+
     # ======================== 
     # 同步入口（对外 API） 
     # ======================== 
@@ -253,11 +593,27 @@ class EventPublisher:
             self.log.error(f"Failed to enqueue event: {e}", exc_info=True) 
 
     def _enqueue(self, event: QueuedEvent): 
-        """安全入队，丢弃策略：如果队列满则记录警告并丢弃""" 
-        try: 
-            self._queue.put_nowait(event) 
-        except queue.Full: 
-            self.log.warning("Event queue is full. Dropping event.") 
+        """线程安全地投递到事件所属通道""" 
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._lanes:
+            self.log.warning("EventPublisher is not running. Dropping event.")
+            return
+        event.lane = self._lane_of(event.payload.get("trace_id") or "")
+        try:
+            loop.call_soon_threadsafe(self._put_nowait, event)
+        except RuntimeError:
+            self.log.warning("EventPublisher loop is closed. Dropping event.")
+
+    def _put_nowait(self, event: QueuedEvent):
+        """在后台 loop 中执行的入队操作：通道满时写入溢出日志，未启用日志时丢弃"""
+        event.seq = self._next_seq()
+        try:
+            self._lanes[event.lane].put_nowait(event)
+        except asyncio.QueueFull:
+            if self._spill is not None:
+                self._spill_events([event], failed=False)
+            else:
+                self.log.warning("Event queue is full. Dropping event.")
 
     # ======================== 
     # 保留原有 async 接口（供内部或测试使用） 
@@ -361,6 +717,7 @@ class EventPublisher:
     def get_signal_status(self, trace_id: str) -> Dict[str, Any]: 
         """ 
         获取跟踪链路的当前信号状态 
+        优先查进程内信号表（由信号广播维护，无网络往返），信号订阅不可用或 Redis 中没有信号键时降级为 HTTP 查询 
         
         Args: 
             trace_id: 跟踪链路ID 
@@ -372,6 +729,23 @@ class EventPublisher:
             httpx.RequestError: 如果请求失败 
             httpx.HTTPStatusError: 如果返回非200状态码 
         """ 
+        feed = get_signal_feed()
+        if feed is not None:
+            try:
+                signal = feed.get_signal(trace_id)
+                if signal is not None:
+                    return {"trace_id": trace_id, "global_signal": signal.value, "signal": signal}
+            except Exception as e:
+                self.log.warning(f"Signal feed lookup failed for trace_id {trace_id}, falling back to HTTP: {e}")
+                feed = None
+        result = self._fetch_signal_status(trace_id)
+        if feed is not None:
+            # 信号键已过期时以 events 服务（数据库）的结果为准，回填本地信号表
+            feed.remember(trace_id, result['signal'])
+        return result
+
+    def _fetch_signal_status(self, trace_id: str) -> Dict[str, Any]:
+        """通过 events 服务 HTTP 接口查询信号状态"""
         url = f"{self.base_url}/api/v1/traces/{trace_id}/status" 
         with httpx.Client(timeout=10.0) as client: 
             try: 
@@ -442,23 +816,40 @@ class EventPublisher:
         # 停止生产 
         self._running.clear() 
 
-        # 等待队列处理完毕（最多 timeout 秒） 
-        try: 
-            self._queue.join() 
-        except Exception: 
-            pass 
-
-        # 发送退出信号 
+        # 等待队列处理完毕（最多 timeout 秒）后发送退出信号 
         if self._loop and self._thread.is_alive(): 
-            asyncio.run_coroutine_threadsafe(self._stop_consume(), self._loop) 
+            try:
+                future = asyncio.run_coroutine_threadsafe(self._stop_consume(timeout), self._loop)
+                future.result(timeout=timeout + 1.0)
+            except Exception:
+                pass
 
         # 等待线程结束 
         self._shutdown_complete.wait(timeout=timeout) 
         self.log.info("EventPublisher shutdown complete.") 
 
-    async def _stop_consume(self): 
-        # 插入 None 作为 poison pill 
-        await asyncio.get_event_loop().run_in_executor(None, self._queue.put_nowait, None) 
+    async def _stop_consume(self, timeout: float): 
+        try:
+            await asyncio.wait_for(asyncio.gather(*(lane.join() for lane in self._lanes)), timeout)
+        except asyncio.TimeoutError:
+            self.log.warning("EventPublisher shutdown timed out with pending events")
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            # 发送中和未发送的事件写入溢出日志，下次启动时重放（发送中的事件可能已送达，重放时会重复）
+            if self._spill is not None:
+                for in_flight in self._in_flight.values():
+                    self._spill_events(list(in_flight.values()), failed=False)
+                    in_flight.clear()
+                for lane in self._lanes:
+                    while not lane.empty():
+                        item = lane.get_nowait()
+                        if isinstance(item, QueuedEvent):
+                            self._spill_events([item], failed=False)
+            return
+        # 每个通道插入 None 作为 poison pill 
+        for lane in self._lanes:
+            lane.put_nowait(None)
 
     def __del__(self): 
         if self._running.is_set(): 
@@ -0,0 +1,197 @@
+"""
+控制信号订阅（进程内信号表）
+- events 服务 SignalService.send_signal 写入 Redis 键 trace_signal:{trace_id}，并在信号频道上广播
+- 后台线程订阅信号频道，把收到的信号写入本地信号表，Actor 检查信号时直接查表，无网络往返
+- 首次查询某个 trace 时从 Redis 键回填；表项超过 ttl 后重新回填，兜底订阅期间可能丢失的广播
+- Redis 键有过期时间，键不存在不代表没有信号，此时由调用方查询 events 服务（数据库）后通过 remember 回填
+- 订阅连接断开时清空信号表，重连之前的查询都直接读 Redis 键
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from common.signal.signal_status import SignalStatus
+
+# 信号订阅配置：开关、频道名（需与 events 服务 signal_channel 一致）、表项有效期（秒）、最多缓存的 trace 数
+SIGNAL_FEED_ENABLED = os.getenv('SIGNAL_FEED_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SIGNAL_FEED_CHANNEL = os.getenv('SIGNAL_FEED_CHANNEL', 'trace_signals')
+SIGNAL_FEED_TTL = float(os.getenv('SIGNAL_FEED_TTL', '30'))
+SIGNAL_FEED_MAX_TRACES = int(os.getenv('SIGNAL_FEED_MAX_TRACES', '10000'))
+
+# 与 events 服务 SignalService._get_cache_key 保持一致
+SIGNAL_KEY_PREFIX = "trace_signal:"
+
+
+def _parse_signal(value: Optional[str]) -> SignalStatus:
+    if not value:
+        return SignalStatus.NORMAL
+    try:
+        return SignalStatus(value)
+    except ValueError:
+        return SignalStatus.NORMAL
+
+
+class SignalTable:
+    """trace_id -> 信号 的本地表，线程安全，按 LRU 淘汰"""
+
+    def __init__(self, ttl: float = SIGNAL_FEED_TTL, max_traces: int = SIGNAL_FEED_MAX_TRACES):
+        self.ttl = ttl
+        self.max_traces = max_traces
+        self._entries: "OrderedDict[str, Tuple[SignalStatus, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, trace_id: str) -> Optional[SignalStatus]:
+        """返回未过期的信号，不存在或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(trace_id)
+            if entry is None:
+                return None
+            signal, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[trace_id]
+                return None
+            self._entries.move_to_end(trace_id)
+            return signal
+
+    def put(self, trace_id: str, signal: SignalStatus, overwrite: bool = True) -> None:
+        """
+        写入信号
+        overwrite=False 用于回填：期间已经收到的广播比回填读到的值更新，不能被覆盖
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(trace_id)
+            if not overwrite and entry is not None and entry[1] >= now:
+                return
+            self._entries[trace_id] = (signal, now + self.ttl)
+            self._entries.move_to_end(trace_id)
+            while len(self._entries) > self.max_traces:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SignalFeed:
+    """
+    信号订阅器
+    get_signal 先查本地表，未命中时读一次 Redis 键并回填；订阅断开期间不回填，避免缓存过期数据
+    Redis 键不存在时返回 None，不缓存
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        channel: str = SIGNAL_FEED_CHANNEL,
+        ttl: float = SIGNAL_FEED_TTL,
+        max_traces: int = SIGNAL_FEED_MAX_TRACES,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.redis = redis_client
+        self.channel = channel
+        self.table = SignalTable(ttl=ttl, max_traces=max_traces)
+        self.log = logger or logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="signal-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def get_signal(self, trace_id: str) -> Optional[SignalStatus]:
+        """
+        查询 trace 的当前信号（Redis 不可用时抛出异常，由调用方降级）
+        Redis 键不存在（从未发送信号或键已过期）时返回 None，由调用方查询权威来源
+        """
+        signal = self.table.get(trace_id)
+        if signal is not None:
+            return signal
+        value = self.redis.get(f"{SIGNAL_KEY_PREFIX}{trace_id}")
+        if value is None:
+            return None
+        signal = _parse_signal(value)
+        self.remember(trace_id, signal)
+        return signal
+
+    def remember(self, trace_id: str, signal: SignalStatus) -> None:
+        """回填从权威来源读到的信号；期间收到的广播更新，不覆盖"""
+        if self.connected:
+            self.table.put(trace_id, signal, overwrite=False)
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                self._connected.set()
+                self.log.info(f"Subscribed to signal channel {self.channel}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._apply(message["data"])
+            except Exception as e:
+                self.log.warning(f"Signal feed disconnected: {e}, retrying in {backoff:.0f}s")
+            finally:
+                # 断开期间可能错过广播，已缓存的信号不再可信
+                self._connected.clear()
+                self.table.clear()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _apply(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+            trace_id = message["trace_id"]
+        except (ValueError, KeyError, TypeError):
+            self.log.warning(f"Ignoring malformed signal message: {data!r}")
+            return
+        signal = _parse_signal(message.get("signal"))
+        self.table.put(trace_id, signal)
+        self.log.info(f"Signal for trace {trace_id} updated to {signal.value}")
+
+
+_signal_feed: Optional[SignalFeed] = None
+_signal_feed_lock = threading.Lock()
+
+
+def get_signal_feed() -> Optional[SignalFeed]:
+    """获取进程内的信号订阅器（首次调用时启动），未启用或 Redis 不可用时返回 None"""
+    global _signal_feed
+    if not SIGNAL_FEED_ENABLED:
+        return None
+    if _signal_feed is None:
+        with _signal_feed_lock:
+            if _signal_feed is None:
+                try:
+                    from external.database.redis_client import RedisClient
+                    feed = SignalFeed(RedisClient().client)
+                    feed.start()
+                    _signal_feed = feed
+                except Exception as e:
+                    logging.getLogger(__name__).warning(f"Signal feed unavailable: {e}")
+                    return None
+    return _signal_feed
@@ -0,0 +1,178 @@
+"""
+事件溢出日志（SQLite WAL）
+- 通道队列已满或发送失败的事件追加写入本地 SQLite
+- 进程重启后仍可按 seq 顺序重放
+- 每条记录独立维护重试次数和下次尝试时间
+- 非网络原因（如负载无法序列化）发送失败超过上限的记录移入 dead_events，不再阻塞同一通道的后续事件
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+
+@dataclass
+class SpilledEvent:
+    seq: int
+    lane: int
+    trace_id: str
+    event_type: str
+    payload: Dict[str, Any]
+    retry_count: int
+    next_attempt_at: float
+    failures: int = 0
+
+
+class EventSpillLog:
+    """
+    仅追加的事件溢出日志
+
+    所有方法只应在 EventPublisher 的后台 loop 线程中调用。
+    """
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.log = logger or logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spilled_events (
+                seq INTEGER PRIMARY KEY,
+                lane INTEGER NOT NULL,
+                trace_id TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                retry_count INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_spilled_events_lane_seq ON spilled_events (lane, seq)"
+        )
+        # 旧版日志文件没有 failures 列（非网络原因的失败次数）
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(spilled_events)")}
+        if "failures" not in columns:
+            self._conn.execute("ALTER TABLE spilled_events ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_events (
+                seq INTEGER PRIMARY KEY,
+                trace_id TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                retry_count INTEGER NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                dead_at REAL NOT NULL
+            )
+            """
+        )
+
+    def append(
+        self,
+        seq: int,
+        lane: int,
+        trace_id: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        retry_count: int = 0,
+        next_attempt_at: Optional[float] = None,
+    ) -> None:
+        """追加一条事件（seq 相同则覆盖，用于重试时更新）"""
+        now = time.time()
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO spilled_events
+                (seq, lane, trace_id, event_type, payload, retry_count, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                seq, lane, trace_id, event_type,
+                json.dumps(payload, ensure_ascii=False, default=str),
+                retry_count,
+                now if next_attempt_at is None else next_attempt_at,
+                now,
+            ),
+        )
+
+    def fetch_lane(self, lane: int, limit: int) -> List[SpilledEvent]:
+        """按 seq 顺序读取某个通道最早的若干条记录"""
+        rows = self._conn.execute(
+            """
+            SELECT seq, lane, trace_id, event_type, payload, retry_count, next_attempt_at, failures
+            FROM spilled_events WHERE lane = ? ORDER BY seq LIMIT ?
+            """,
+            (lane, limit),
+        ).fetchall()
+        return [
+            SpilledEvent(seq, lane_, trace_id, event_type, json.loads(payload), retry_count, next_attempt_at, failures)
+            for seq, lane_, trace_id, event_type, payload, retry_count, next_attempt_at, failures in rows
+        ]
+
+    def remove(self, seq: int) -> None:
+        self._conn.execute("DELETE FROM spilled_events WHERE seq = ?", (seq,))
+
+    def reschedule(self, seq: int, retry_count: int, next_attempt_at: float, failures: Optional[int] = None) -> None:
+        """更新重试次数和下次尝试时间；failures 为 None 时保持不变"""
+        self._conn.execute(
+            "UPDATE spilled_events SET retry_count = ?, next_attempt_at = ?, failures = COALESCE(?, failures) WHERE seq = ?",
+            (retry_count, next_attempt_at, failures, seq),
+        )
+
+    def dead_letter(self, seq: int, error: str) -> None:
+        """将记录移入 dead_events（同一事务内）"""
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO dead_events
+                    (seq, trace_id, event_type, payload, retry_count, error, created_at, dead_at)
+                SELECT seq, trace_id, event_type, payload, retry_count, ?, created_at, ?
+                FROM spilled_events WHERE seq = ?
+                """,
+                (error, time.time(), seq),
+            )
+            self._conn.execute("DELETE FROM spilled_events WHERE seq = ?", (seq,))
+
+    def next_due(self) -> Dict[int, float]:
+        """每个通道最早的下次尝试时间"""
+        rows = self._conn.execute(
+            "SELECT lane, MIN(next_attempt_at) FROM spilled_events GROUP BY lane"
+        ).fetchall()
+        return {lane: due for lane, due in rows}
+
+    def trace_counts(self) -> Dict[str, int]:
+        """每个 trace 尚未送达的记录数"""
+        rows = self._conn.execute(
+            "SELECT trace_id, COUNT(*) FROM spilled_events GROUP BY trace_id"
+        ).fetchall()
+        return {trace_id: count for trace_id, count in rows}
+
+    def max_seq(self) -> int:
+        row = self._conn.execute("SELECT MAX(seq) FROM spilled_events").fetchone()
+        return row[0] or 0
+
+    def reassign_lanes(self, lane_of) -> None:
+        """通道数量变化后（如重启时修改了配置）重新计算每条记录的通道"""
+        traces = [row[0] for row in self._conn.execute("SELECT DISTINCT trace_id FROM spilled_events")]
+        for trace_id in traces:
+            self._conn.execute(
+                "UPDATE spilled_events SET lane = ? WHERE trace_id = ?", (lane_of(trace_id), trace_id)
+            )
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception as e:
+            self.log.warning(f"Failed to close spill log: {e}")
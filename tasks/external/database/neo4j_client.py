@@ -1,97 +1,170 @@
 """Neo4j客户端封装"""
-from neo4j import GraphDatabase, Driver
-from typing import Any, List, Dict, Optional
-from config import NEO4J_URI , NEO4J_USER, NEO4J_PASSWORD
+import threading
+from neo4j import GraphDatabase, Driver, READ_ACCESS, WRITE_ACCESS
+from typing import Any, List, Dict, Optional, Tuple, Callable
+from config import (
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_DATABASE,
+    NEO4J_MAX_POOL_SIZE, NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+    NEO4J_MAX_CONNECTION_LIFETIME,
+)
 
 
 class Neo4jClient:
     """
     Neo4j客户端封装，提供基础的Neo4j操作方法
+
+    相同连接参数的客户端共享同一个驱动（驱动内部即连接池），
+    读操作以 READ 模式路由（集群下可分发到只读副本），写操作以 WRITE 模式路由到主节点。
     """
-    
-    def __init__(self, uri: str=NEO4J_URI, user: str=NEO4J_USER, password: str=NEO4J_PASSWORD):
+
+    _shared_drivers: Dict[Tuple[str, str, str, int], Driver] = {}
+    _shared_refs: Dict[Tuple[str, str, str, int], int] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, uri: str=NEO4J_URI, user: str=NEO4J_USER, password: str=NEO4J_PASSWORD,
+                 database: Optional[str] = NEO4J_DATABASE,
+                 max_pool_size: int = NEO4J_MAX_POOL_SIZE):
         """
         初始化Neo4j客户端
-        
+
         Args:
-            config: Neo4j配置
-                - uri: Neo4j连接URI
-                - user: 用户名
-                - password: 密码
+            uri: Neo4j连接URI
+            user: 用户名
+            password: 密码
+            database: 数据库名称，None表示服务端默认库
+            max_pool_size: 连接池最大连接数
         """
-    
+
         self.uri = uri
         self.user = user
         self.password = password
+        self.database = database
+        self.max_pool_size = max_pool_size
         self.driver: Optional[Driver] = None
-    
+
+    @property
+    def _pool_key(self) -> Tuple[str, str, str, int]:
+        # 密码和连接池大小不同的客户端不能共用驱动（驱动创建后认证信息和池大小不可变）
+        return (self.uri, self.user, self.password, self.max_pool_size)
+
     def connect(self) -> None:
         """
-        建立Neo4j连接
+        建立Neo4j连接（复用相同连接参数的共享驱动）
         """
-        self.driver = GraphDatabase.driver(
-            self.uri,
-            auth=(self.user, self.password)
-        )
-    
+        if self.driver:
+            return
+        pool_key = self._pool_key
+        with Neo4jClient._shared_lock:
+            driver = Neo4jClient._shared_drivers.get(pool_key)
+            if driver is None:
+                driver = GraphDatabase.driver(
+                    self.uri,
+                    auth=(self.user, self.password),
+                    max_connection_pool_size=self.max_pool_size,
+                    connection_acquisition_timeout=NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+                )
+                Neo4jClient._shared_drivers[pool_key] = driver
+            Neo4jClient._shared_refs[pool_key] = Neo4jClient._shared_refs.get(pool_key, 0) + 1
+        self.driver = driver
+
     def disconnect(self) -> None:
         """
-        断开Neo4j连接
+        断开Neo4j连接（最后一个使用共享驱动的客户端断开时才真正关闭）
         """
-        if self.driver:
-            self.driver.close()
-            self.driver = None
-    
-    def execute_query(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        if not self.driver:
+            return
+        pool_key = self._pool_key
+        with Neo4jClient._shared_lock:
+            refs = Neo4jClient._shared_refs.get(pool_key, 1) - 1
+            if refs <= 0:
+                Neo4jClient._shared_refs.pop(pool_key, None)
+                Neo4jClient._shared_drivers.pop(pool_key, None)
+                self.driver.close()
+            else:
+                Neo4jClient._shared_refs[pool_key] = refs
+        self.driver = None
+
+    def _session(self, access_mode: str = WRITE_ACCESS):
+        if not self.driver:
+            self.connect()
+        return self.driver.session(database=self.database, default_access_mode=access_mode)
+
+    @staticmethod
+    def _run_transaction(session, access_mode: str, work: Callable) -> Any:
+        """以托管事务执行（瞬时错误由驱动自动重试），兼容 4.x/5.x 驱动的方法名"""
+        if access_mode == READ_ACCESS:
+            runner = getattr(session, 'execute_read', None) or session.read_transaction
+        else:
+            runner = getattr(session, 'execute_write', None) or session.write_transaction
+        return runner(work)
+
+    def execute_query(self, query: str, parameters: Optional[Dict[str, Any]] = None,
+                      read_only: bool = False) -> List[Dict[str, Any]]:
         """
         执行Cypher查询
-        
+
         Args:
             query: Cypher查询语句
             parameters: 查询参数
-            
+            read_only: 是否为只读查询（以 READ 模式路由并使用托管读事务）
+
         Returns:
             List[Dict[str, Any]]: 查询结果
         """
-        if not self.driver:
-            self.connect()
-        
-        with self.driver.session() as session:
+        if read_only:
+            with self._session(READ_ACCESS) as session:
+                return self._run_transaction(
+                    session, READ_ACCESS,
+                    lambda tx: [record.data() for record in tx.run(query, parameters or {})]
+                )
+
+        with self._session() as session:
             result = session.run(query, parameters or {})
             return [record.data() for record in result]
-    
+
     def execute_write(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Any:
         """
         执行写操作
-        
+
         Args:
             query: Cypher查询语句
             parameters: 查询参数
-            
+
         Returns:
             Any: 查询结果
         """
-        if not self.driver:
-            self.connect()
-        
-        with self.driver.session() as session:
-            result = session.write_transaction(lambda tx: tx.run(query, parameters or {}).single())
+        with self._session(WRITE_ACCESS) as session:
+            result = self._run_transaction(session, WRITE_ACCESS, lambda tx: tx.run(query, parameters or {}).single())
             return result.data() if result else None
-    
+
     def execute_read(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Any:
         """
         执行读操作
-        
+
         Args:
             query: Cypher查询语句
             parameters: 查询参数
-            
+
         Returns:
             Any: 查询结果
         """
-        if not self.driver:
-            self.connect()
-        
-        with self.driver.session() as session:
-            result = session.read_transaction(lambda tx: tx.run(query, parameters or {}).single())
+        with self._session(READ_ACCESS) as session:
+            result = self._run_transaction(session, READ_ACCESS, lambda tx: tx.run(query, parameters or {}).single())
             return result.data() if result else None
+
+    def execute_batch(self, statements: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[List[Dict[str, Any]]]:
+        """
+        在同一个写事务中依次执行多条语句（全部成功或全部回滚）
+
+        Args:
+            statements: (Cypher语句, 参数) 列表
+
+        Returns:
+            List[List[Dict[str, Any]]]: 每条语句的查询结果
+        """
+        def work(tx):
+            return [[record.data() for record in tx.run(query, parameters or {})] for query, parameters in statements]
+
+        with self._session(WRITE_ACCESS) as session:
+            return self._run_transaction(session, WRITE_ACCESS, work)
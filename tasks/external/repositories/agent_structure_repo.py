@@ -5,11 +5,34 @@ import time
 import functools
 import networkx as nx
 from ..database.neo4j_client import Neo4jClient
+from .influence_cache import InfluencedSubgraphCache
 
 
 # 定义泛型类型
 T = TypeVar('T')
 
+# 结构版本号节点：所有改变树结构的写操作都会递增该版本号，供内存快照判断是否过期
+TREE_VERSION_NAME = 'agent_tree'
+_BUMP_TREE_VERSION = """
+WITH count(*) AS _changed
+MERGE (v:AgentTreeVersion {name: $tree_version_name})
+SET v.version = coalesce(v.version, 0) + 1
+"""
+
+# 节点属性版本号：只修改节点属性、不改变树结构的写操作递增该版本号（树快照不需要重新加载）
+PROPS_VERSION_NAME = 'agent_props'
+_BUMP_PROPS_VERSION = """
+WITH count(*) AS _changed
+MERGE (v:AgentTreeVersion {name: $props_version_name})
+SET v.version = coalesce(v.version, 0) + 1
+"""
+
+# DEPENDS_ON 关系不由本仓储维护，其变化无法通过版本号发现，相关子图只缓存较短时间
+DEPENDS_ON_CACHE_TTL = 30.0
+
+# 进程内共享的影响子图缓存（多个仓储实例的写操作都能触发失效）
+_INFLUENCE_CACHE = InfluencedSubgraphCache()
+
 
 def retry_decorator(max_retries: int = 3, retry_interval: float = 1.0, exceptions: tuple = (Exception,)) -> Callable[[Callable[..., T]], Callable[..., T]]:
     """
@@ -77,7 +100,7 @@ class AgentStructureRepository:
         RETURN parent.id as parent_id
         LIMIT 1
         """
-        parent_result = self.neo4j_client.execute_query(parent_query, {'agent_id': agent_id})
+        parent_result = self.neo4j_client.execute_query(parent_query, {'agent_id': agent_id}, read_only=True)
         parent_id = parent_result[0]['parent_id'] if parent_result else None
         
         # 查询子节点
@@ -86,13 +109,80 @@ class AgentStructureRepository:
         WHERE r.hidden IS NULL
         RETURN child.id as child_id
         """
-        children_result = self.neo4j_client.execute_query(children_query, {'agent_id': agent_id})
+        children_result = self.neo4j_client.execute_query(children_query, {'agent_id': agent_id}, read_only=True)
         child_ids = [record['child_id'] for record in children_result]
         
         return {
             'parent': parent_id,
             'children': child_ids
         }
+
+    @retry_decorator()
+    def load_tree_adjacency(self) -> Dict[str, Any]:
+        """
+        一次性加载整个 HAS_CHILD 图
+
+        Returns:
+            {'nodes': [agent_id, ...], 'edges': [(parent_id, child_id), ...]}
+        """
+        query = """
+        MATCH (a:Agent)
+        OPTIONAL MATCH (a)-[r:HAS_CHILD]->(child)
+        WHERE r.hidden IS NULL
+        RETURN a.id AS node_id, collect(child.id) AS children
+        """
+        results = self.neo4j_client.execute_query(query, read_only=True)
+
+        nodes = []
+        edges = []
+        for record in results:
+            node_id = record['node_id']
+            if node_id is None:
+                continue
+            nodes.append(node_id)
+            edges.extend((node_id, child_id) for child_id in record['children'] if child_id is not None)
+        return {'nodes': nodes, 'edges': edges}
+
+    @retry_decorator()
+    def get_structure_version(self) -> int:
+        """
+        获取树结构版本号
+
+        Returns:
+            版本号，从未修改过时为0
+        """
+        query = """
+        MATCH (v:AgentTreeVersion {name: $tree_version_name})
+        RETURN v.version AS version
+        """
+        result = self.neo4j_client.execute_query(query, {'tree_version_name': TREE_VERSION_NAME}, read_only=True)
+        if not result or result[0]['version'] is None:
+            return 0
+        return int(result[0]['version'])
+
+    def _read_structure_version(self) -> Optional[int]:
+        """
+        读取影响子图缓存使用的版本号（不重试，失败返回None）
+
+        子图结果同时包含结构和节点属性，取结构版本号与属性版本号之和；
+        本进程每次写操作恰好使其中一个 +1，与缓存记录的本地写入保持一致。
+        """
+        query = """
+        MATCH (v:AgentTreeVersion)
+        WHERE v.name IN [$tree_version_name, $props_version_name]
+        RETURN sum(coalesce(v.version, 0)) AS version
+        """
+        try:
+            result = self.neo4j_client.execute_query(query, {
+                'tree_version_name': TREE_VERSION_NAME,
+                'props_version_name': PROPS_VERSION_NAME
+            }, read_only=True)
+        except Exception as e:
+            logging.warning(f"Failed to read agent structure version: {e}")
+            return None
+        if not result or result[0]['version'] is None:
+            return 0
+        return int(result[0]['version'])
     
     @retry_decorator()
     def load_all_agents(self) -> List[Dict[str, Any]]:
@@ -117,7 +207,7 @@ class AgentStructureRepository:
         MATCH (a:Agent)
         RETURN a.id as agent_id, properties(a) as all_props
         """
-        results = self.neo4j_client.execute_query(query)
+        results = self.neo4j_client.execute_query(query, read_only=True)
         
         agents = []
         for record in results:
@@ -149,11 +239,13 @@ class AgentStructureRepository:
             MATCH (parent {id: $parent_id})
             MATCH (child {id: $child_id})
             MERGE (parent)-[:HAS_CHILD]->(child)
-            """
+            """ + _BUMP_TREE_VERSION
             self.neo4j_client.execute_write(query, {
                 'parent_id': parent_id,
-                'child_id': child_id
+                'child_id': child_id,
+                'tree_version_name': TREE_VERSION_NAME
             })
+            _INFLUENCE_CACHE.invalidate_nodes(parent_id)
             return True
         except Exception:
             return False
@@ -173,7 +265,7 @@ class AgentStructureRepository:
         MATCH (a:Agent {id: $agent_id})
         RETURN a.id as agent_id, a.meta as meta
         """
-        result = self.neo4j_client.execute_query(query, {'agent_id': agent_id})
+        result = self.neo4j_client.execute_query(query, {'agent_id': agent_id}, read_only=True)
         if not result:
             return None
         
@@ -201,14 +293,21 @@ class AgentStructureRepository:
             MATCH (a:Agent {id: $agent_id})-[r]-()
             DELETE r
             """
-            self.neo4j_client.execute_write(query_remove_relationships, {'agent_id': agent_id})
             
             # 再删除Agent节点
             query_remove_node = """
             MATCH (a:Agent {id: $agent_id})
             DELETE a
-            """
-            self.neo4j_client.execute_write(query_remove_node, {'agent_id': agent_id})
+            """ + _BUMP_TREE_VERSION
+            # 两步在同一个事务中完成
+            self.neo4j_client.execute_batch([
+                (query_remove_relationships, {'agent_id': agent_id}),
+                (query_remove_node, {
+                    'agent_id': agent_id,
+                    'tree_version_name': TREE_VERSION_NAME
+                }),
+            ])
+            _INFLUENCE_CACHE.invalidate_nodes(agent_id)
             
             return True
         except Exception:
@@ -237,12 +336,13 @@ class AgentStructureRepository:
             query = """
             CREATE (a:Agent {id: $agent_id})
             SET a += $meta_data
-            RETURN a
-            """
+            """ + _BUMP_TREE_VERSION
             self.neo4j_client.execute_write(query, {
                 'agent_id': agent_id,
-                'meta_data': meta_data
+                'meta_data': meta_data,
+                'tree_version_name': TREE_VERSION_NAME
             })
+            _INFLUENCE_CACHE.invalidate_empty()
             return agent_id
         except Exception:
             return None
@@ -271,15 +371,17 @@ class AgentStructureRepository:
             current_meta.update(updates)
             
             # 修改查询：使用 += 操作符来更新平铺的属性
+            # 节点属性会进入子图结果，递增属性版本号让其他进程的子图缓存失效（树结构未变，不递增结构版本号）
             query = """
             MATCH (a:Agent {id: $node_id})
             SET a += $meta_data
-            RETURN a
-            """
+            """ + _BUMP_PROPS_VERSION
             self.neo4j_client.execute_write(query, {
                 'node_id': node_id,
-                'meta_data': current_meta # 这里的字典会被展开成属性
+                'meta_data': current_meta, # 这里的字典会被展开成属性
+                'props_version_name': PROPS_VERSION_NAME
             })
+            _INFLUENCE_CACHE.invalidate_nodes(node_id)
             return True
         except Exception:
             return False
@@ -299,15 +401,20 @@ class AgentStructureRepository:
         - 对于多跳情况，使用可达路径中的最大影响强度作为边权重
         - SCC 在该子图内部计算（Python 端）
         """
-        # Step 1: 查询所有满足条件的路径，并提取节点和边
+        cache_key = ("scc", root_code, float(threshold), int(max_hops))
+        cached = _INFLUENCE_CACHE.get(cache_key, self._read_structure_version)
+        if cached is not None:
+            return cached
+
+        # 一次展开同时得到节点和边（边为 root -> 可达节点，权重取所有路径中的最大影响强度）
         # 关键：只保留 hidden 为 null 或 false 的关系
-        node_query = """
+        query = """
         MATCH (start:Agent {code: $rootCode})
         CALL apoc.path.expandConfig(start, {
             relationshipFilter: 'HAS_CHILD>',
             minLevel: 0,
             maxLevel: $maxHops,
-            uniqueness: 'NODE_GLOBAL',
+            uniqueness: 'RELATIONSHIP_GLOBAL',
             filter: 'RELATIONSHIP_GLOBAL',
             filterStartNode: false,
             relationshipFilterFunction: '
@@ -318,73 +425,51 @@ class AgentStructureRepository:
             reduce(acc = 1.0, r IN relationships(path) | 
                 acc * coalesce(r.strength, 0.5)) AS totalStrength
         WHERE totalStrength >= $threshold
-        UNWIND nodes(path) AS node
-        WITH DISTINCT node.id AS node_id, node AS node_props
-        RETURN DISTINCT node_id, node_props
-        """
-
-        edge_query = """
-        MATCH (start:Agent {code: $rootCode})
-        CALL apoc.path.expandConfig(start, {
-            relationshipFilter: 'HAS_CHILD>',
-            minLevel: 1,
-            maxLevel: $maxHops,
-            uniqueness: 'RELATIONSHIP_GLOBAL',
-            filter: 'RELATIONSHIP_GLOBAL',
-            filterStartNode: false,
-            relationshipFilterFunction: '
-                (r) => r.hidden IS NULL OR r.hidden = false
-            '
-        }) YIELD path
-        WITH startNode(path) AS from_node, endNode(path) AS to_node,
-            reduce(acc = 1.0, r IN relationships(path) | 
-                acc * coalesce(r.strength, 0.5)) AS totalStrength
-        WITH from_node.id AS from_id, to_node.id AS to_id, max(totalStrength) AS maxTotalStrength
-        WHERE maxTotalStrength >= $threshold
-        RETURN DISTINCT from_id, to_id, maxTotalStrength
+        WITH collect(path) AS paths,
+            collect(CASE WHEN length(path) > 0
+                THEN {from_id: startNode(path).id, to_id: endNode(path).id, strength: totalStrength}
+            END) AS edge_rows
+        UNWIND paths AS p
+        UNWIND nodes(p) AS node
+        WITH edge_rows, collect(DISTINCT node) AS node_list
+        RETURN [n IN node_list | {node_id: n.id, props: properties(n), is_agent: 'Agent' IN labels(n)}] AS nodes,
+            edge_rows AS edges
         """
 
         try:
-            # 加载所有 agent 用于属性合并
-            all_agents = self.load_all_agents()
-            agent_map = {agent.get('agent_id'): agent for agent in all_agents}
-
-            # 执行节点查询
-            node_records = self.neo4j_client.execute_query(
-                node_query,
-                {'rootCode': root_code, 'threshold': threshold, 'maxHops': max_hops}
+            records = self.neo4j_client.execute_query(
+                query,
+                {'rootCode': root_code, 'threshold': threshold, 'maxHops': max_hops},
+                read_only=True
             )
+            record = records[0] if records else {"nodes": [], "edges": []}
+
             node_set = set()
             node_properties = {}
-            for rec in node_records:
+            for rec in record["nodes"]:
                 nid = rec.get("node_id")
                 if nid is None:
                     continue
                 node_set.add(nid)
-                props = dict(rec["node_props"]) if isinstance(rec["node_props"], dict) else {}
+                props = dict(rec["props"]) if isinstance(rec.get("props"), dict) else {}
                 if "id" in props:
                     del props["id"]
-                if nid in agent_map:
-                    full_props = agent_map[nid].copy()
-                    full_props.update(props)
-                    node_properties[nid] = full_props
-                else:
-                    node_properties[nid] = props
-
-            # 执行边查询
-            edge_records = self.neo4j_client.execute_query(
-                edge_query,
-                {'rootCode': root_code, 'threshold': threshold, 'maxHops': max_hops}
-            )
-            edges = []
-            for rec in edge_records:
-                f, t, w = rec["from_id"], rec["to_id"], rec["maxTotalStrength"]
-                if f in node_set and t in node_set:
-                    edges.append((f, t, float(w)))
+                # Agent 节点与 load_all_agents 的格式保持一致
+                node_properties[nid] = {'agent_id': nid, **props} if rec.get("is_agent") else props
+
+            # 同一对节点取最大影响强度
+            edge_strength: Dict[tuple, float] = {}
+            for rec in record["edges"]:
+                f, t, w = rec["from_id"], rec["to_id"], float(rec["strength"])
+                if f in node_set and t in node_set and w > edge_strength.get((f, t), float("-inf")):
+                    edge_strength[(f, t)] = w
+            edges = [(f, t, w) for (f, t), w in edge_strength.items()]
 
             if not node_set:
                 logging.warning(f"No influenced nodes found for root {root_code}")
-                return {"nodes": [], "edges": []}
+                result = {"nodes": [], "edges": []}
+                _INFLUENCE_CACHE.put(cache_key, result)
+                return result
 
             # 构建 NetworkX 图并计算 SCC
             subgraph = nx.DiGraph()
@@ -412,10 +497,12 @@ class AgentStructureRepository:
                 for (f, t, w) in edges
             ]
 
-            return {
+            result = {
                 "nodes": nodes_result,
                 "edges": edges_result
             }
+            _INFLUENCE_CACHE.put(cache_key, result)
+            return result
 
         except Exception as e:
             logging.error(f"Error in get_influenced_subgraph_with_scc: {e}", exc_info=True)
@@ -446,6 +533,12 @@ class AgentStructureRepository:
             if not root_codes:
                 return {"nodes": [], "edges": []}
 
+            # DEPENDS_ON 关系的变化不会递增版本号，缓存项按 DEPENDS_ON_CACHE_TTL 过期
+            cache_key = ("multi", tuple(sorted(root_codes)), float(threshold), int(max_hops))
+            cached = _INFLUENCE_CACHE.get(cache_key, self._read_structure_version)
+            if cached is not None:
+                return cached
+
             # Cypher 查询：合并多个根的子图，确保边在子图内部
             query = """
             UNWIND $root_codes AS root_id
@@ -475,7 +568,7 @@ class AgentStructureRepository:
                 result = self.neo4j_client.execute_query(query, {
                     'root_codes': root_codes,
                     'max_hops': max_hops
-                })
+                }, read_only=True)
                 
                 if not result:
                     return {"nodes": [], "edges": []}
@@ -531,10 +624,12 @@ class AgentStructureRepository:
                         "properties": props
                     })
 
-                return {
+                result = {
                     "nodes": final_nodes,
                     "edges": raw_edges
                 }
+                _INFLUENCE_CACHE.put(cache_key, result, ttl=DEPENDS_ON_CACHE_TTL)
+                return result
 
             except Exception as e:
                 logging.error(f"Failed to fetch subgraph for {root_codes}: {e}", exc_info=True)
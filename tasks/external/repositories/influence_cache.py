@@ -0,0 +1,124 @@
+"""影响子图缓存，按受影响区域增量失效"""
+from typing import Dict, Any, Optional, Callable, Hashable, Set
+from collections import OrderedDict
+import copy
+import logging
+import threading
+import time
+
+
+class InfluencedSubgraphCache:
+    """
+    影响子图缓存
+
+    缓存键为 (查询类型, 根节点, threshold, max_hops)，值为已经计算好 scc_id 的子图。
+    每个缓存项记录其包含的节点，结构变化时只失效包含受影响节点的缓存项：
+    - 新增边 parent->child：只可能扩大包含 parent 的子图
+    - 更新/删除节点：只影响包含该节点的子图
+    - 新建节点：只可能让之前"根节点不存在"的空结果失效
+    其他进程的修改通过结构版本号发现（最多每 check_interval 秒检查一次），版本变化时整体清空。
+    依赖无法观察到的关系（如 DEPENDS_ON）的缓存项可以在写入时指定 ttl，到期后自动失效。
+    """
+
+    def __init__(self, check_interval: float = 5.0, max_entries: int = 512):
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._node_keys: Dict[str, Set[Hashable]] = {}
+        self._version: Optional[int] = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, version_fetcher: Optional[Callable[[], Optional[int]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存（返回副本，调用方可以自由修改）
+
+        Args:
+            key: 缓存键
+            version_fetcher: 读取当前结构版本号的函数，返回None表示未知
+        """
+        if version_fetcher is not None:
+            self._sync_version(version_fetcher)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] is not None and time.monotonic() >= entry["expires_at"]:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry["result"])
+
+    def put(self, key: Hashable, result: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            result: 子图结果
+            ttl: 过期时间（秒），None 表示只依赖失效机制
+        """
+        node_ids = frozenset(node["node_id"] for node in result.get("nodes", []))
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {"result": copy.deepcopy(result), "nodes": node_ids, "expires_at": expires_at}
+            for node_id in node_ids:
+                self._node_keys.setdefault(node_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate_nodes(self, *node_ids: str) -> None:
+        """失效包含任一指定节点的缓存项，并记录一次本地结构修改"""
+        with self._lock:
+            keys = set()
+            for node_id in node_ids:
+                keys |= self._node_keys.get(node_id, set())
+            for key in keys:
+                self._drop(key)
+            self._note_local_write()
+        if keys:
+            logging.debug(f"Invalidated {len(keys)} influenced subgraph cache entries for {node_ids}")
+
+    def invalidate_empty(self) -> None:
+        """失效所有空结果（新建节点后，之前找不到的根节点可能已存在）"""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if not entry["nodes"]]:
+                self._drop(key)
+            self._note_local_write()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._node_keys.clear()
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for node_id in entry["nodes"]:
+            keys = self._node_keys.get(node_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._node_keys[node_id]
+
+    def _note_local_write(self) -> None:
+        # 本进程的写操作会让结构版本号 +1，同步本地记录避免无谓的整体清空
+        if self._version is not None:
+            self._version += 1
+
+    def _sync_version(self, version_fetcher: Callable[[], Optional[int]]) -> None:
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        version = version_fetcher()
+        with self._lock:
+            self._last_check = time.monotonic()
+            if version is None:
+                return
+            if self._version is not None and version != self._version:
+                logging.info(f"Agent structure version changed {self._version} -> {version}, clearing influenced subgraph cache")
+                self._entries.clear()
+                self._node_keys.clear()
+            self._version = version
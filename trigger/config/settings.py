@@ -98,6 +98,11 @@ class Settings:
         # 消息队列配置
         # 支持的值: "redis", "rabbitmq"
         self.message_broker_type = os.getenv("MESSAGE_BROKER_TYPE", self._config_data.get("message_broker_type", "redis"))
+        # 每个主题的并发处理数，以及消费者一次预取（未确认）的消息上限
+        self.message_consume_concurrency = int(os.getenv("MESSAGE_CONSUME_CONCURRENCY", str(self._config_data.get("message_consume_concurrency", 8))))
+        self.message_prefetch = int(os.getenv("MESSAGE_PREFETCH", str(self._config_data.get("message_prefetch", 16))))
+        # 消息处理失败后的最大重试次数（Redis 实现，超过后转入死信队列）
+        self.message_max_retries = int(os.getenv("MESSAGE_MAX_RETRIES", str(self._config_data.get("message_max_retries", 3))))
         
         # 外部系统配置
         self.EXTERNAL_SYSTEM_URL = os.getenv("EXTERNAL_SYSTEM_URL", self._config_data.get("external_system_url", "http://localhost:8004"))
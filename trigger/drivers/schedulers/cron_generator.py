@@ -1,5 +1,6 @@
 from croniter import croniter
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import List, Optional
 import asyncio
 import logging
@@ -11,6 +12,24 @@ from external.db.session import dialect
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1024)
+def _compile_cron(expr: str) -> croniter:
+    """解析 CRON 表达式并缓存（无效表达式抛出 ValueError，不会被缓存）"""
+    return croniter(expr)
+
+
+@lru_cache(maxsize=1024)
+def _check_cron(expr: str) -> bool:
+    """校验 CRON 表达式并缓存结果（包括无效的结果，调度器不会每秒重复解析无效表达式）"""
+    if len(expr.strip().split()) != 5:
+        return False
+    try:
+        _compile_cron(expr)
+        return True
+    except ValueError:
+        return False
+
+
 class CronGenerator:
     """
     CRON 表达式生成器，用于生成和解析 CRON 表达式
@@ -21,14 +40,7 @@ class CronGenerator:
         """
         验证 CRON 表达式是否有效
         """
-        parts = expr.strip().split()
-        if len(parts) != 5:
-            return False
-        try:
-            croniter(expr)
-            return True
-        except ValueError:
-            return False
+        return _check_cron(expr)
 
     @staticmethod
     def get_next_run_time(expr: str, base_time: Optional[datetime] = None) -> datetime:
@@ -45,7 +57,10 @@ class CronGenerator:
                 # 转为 UTC
                 base_time = base_time.astimezone(timezone.utc)
 
-        next_run = croniter(expr, base_time).get_next(datetime)
+        # 复用已解析的表达式，只重置起始时间（同步调用，事件循环内不会交叉使用）
+        cron = _compile_cron(expr)
+        cron.set_current(base_time, force=True)
+        next_run = cron.get_next(datetime)
         
         # croniter 会保持 base_time 的时区属性，但我们再保险一层
         if next_run.tzinfo is None:
@@ -110,65 +125,73 @@ class CronGenerator:
         return f"{minute} {hour} {day_of_month} * *"
 
 
-async def cron_scheduler(lifecycle_svc: LifecycleService, async_session_factory):
+async def cron_scheduler(lifecycle_svc: LifecycleService, async_session_factory, tick_interval: float = 1.0):
     """
-    CRON 调度器：每分钟运行一次，精确触发符合时间点的 CRON 任务
+    CRON 调度器：每秒查询一次 next_fire_at 已到期的定义并触发（走 next_fire_at 索引）
+    - next_fire_at 为空表示新建或修改过的定义，按 last_triggered_at 计算后写回
+    - 触发前以 next_fire_at 为条件推进到下一次执行时间，多个副本同时运行时只有一个会触发
+    - 启动 trace 失败时把 next_fire_at 退回到本次触发时间，下一轮重试，不会丢失本次触发
     """
     while True:
-        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)  # 对齐到整分钟
+        now = datetime.now(timezone.utc).replace(microsecond=0)  # 对齐到整秒
         
         try:
             # 每次循环创建一个新的会话
             async with async_session_factory() as db_session:
                 def_repo = create_task_definition_repo(db_session, dialect)
-                cron_defs = await def_repo.list_active_cron()
+                due_defs = await def_repo.list_due_cron(now)
 
-                for defn in cron_defs:
+                for defn in due_defs:
                     if not defn.cron_expr or not CronGenerator.is_valid_cron(defn.cron_expr):
                         continue
 
+                    fire_at = None
+
                     try:
-                        # 1. 获取完整的任务定义（包含last_triggered_at字段）
-                        full_defn = await def_repo.get(defn.id)
-                        
-                        # 2. 计算下一次应触发时间（基于last_triggered_at或默认值）
-                        # 这里需要从数据库直接获取last_triggered_at，目前full_defn是领域模型，不包含该字段
-                        # 所以我们直接从数据库查询
-                        from external.db.models import TaskDefinitionDB
-                        from sqlalchemy import select
-                        
-                        stmt = select(TaskDefinitionDB.last_triggered_at).where(TaskDefinitionDB.id == defn.id)
-                        result = await db_session.execute(stmt)
-                        last_triggered_at = result.scalar_one_or_none()
+                        next_fire_at = defn.next_fire_at
+                        if next_fire_at is None:
+                            # 计算下一次应触发时间（基于last_triggered_at或默认值）
+                            base_time = defn.last_triggered_at or (now - timedelta(days=7))
+                            next_run = CronGenerator.get_next_run_time(defn.cron_expr, base_time)
+                            if next_run > now:
+                                await def_repo.advance_next_fire_at(defn.id, None, next_run)
+                                continue
+
+                        # 推进到下一次执行时间并记录本次触发时间，推进失败说明已被其他副本触发
+                        next_run = CronGenerator.get_next_run_time(defn.cron_expr, now)
+                        if not await def_repo.advance_next_fire_at(defn.id, next_fire_at, next_run, triggered_at=now):
+                            continue
+                        fire_at = next_fire_at or now
+
+                        logger.info(f"Triggering CRON task {defn.id} at {now}, next_run is {next_run}")
                         
-                        base_time = last_triggered_at or (now - timedelta(days=7))
-                        next_run = CronGenerator.get_next_run_time(defn.cron_expr, base_time)
-
-                        # 3. 如果当前时间 >= 下次运行时间，则触发
-                        if now >= next_run:
-                            logger.info(f"Triggering CRON task {defn.id} at {now}, next_run was {next_run}")
-                            
-                            # 启动新 trace
-                            await lifecycle_svc.start_new_trace(
-                                session=db_session,
-                                def_id=defn.id,
-                                input_params={},
-                                trigger_type="CRON"
-                            )
-
-                            # 4. 更新数据库中的last_triggered_at为本次触发时间（now）
-                            await def_repo.update_last_triggered_at(defn.id, now)
-                            
-                            # 5. 防止同一分钟内重复触发
-                            await asyncio.sleep(0.1)
+                        # 启动新 trace
+                        await lifecycle_svc.start_new_trace(
+                            session=db_session,
+                            def_id=defn.id,
+                            input_params={},
+                            trigger_type="CRON"
+                        )
 
                     except Exception as e:
                         logger.error(f"Error processing CRON definition {defn.id}: {e}", exc_info=True)
+                        if fire_at is not None:
+                            await _restore_fire(db_session, def_repo, defn.id, next_run, fire_at)
 
         except Exception as e:
             logger.error(f"Error in cron_scheduler loop: {e}", exc_info=True)
 
-        # Sleep 到下一整分钟
-        next_minute = (now + timedelta(minutes=1)).replace(second=0, microsecond=0)
-        sleep_sec = (next_minute - datetime.now(timezone.utc)).total_seconds()
-        await asyncio.sleep(max(1.0, sleep_sec))
\ No newline at end of file
+        # Sleep 到下一整秒
+        next_tick = now + timedelta(seconds=tick_interval)
+        sleep_sec = (next_tick - datetime.now(timezone.utc)).total_seconds()
+        await asyncio.sleep(max(0.1, sleep_sec))
+
+
+async def _restore_fire(db_session: AsyncSession, def_repo, def_id: str, next_run: datetime, fire_at: datetime) -> None:
+    """已推进 next_fire_at 但启动 trace 失败：退回到本次触发时间（仍为 next_run 时才退回），下一轮重新触发"""
+    try:
+        await db_session.rollback()
+        if await def_repo.advance_next_fire_at(def_id, next_run, fire_at):
+            logger.info(f"CRON task {def_id} will retry the fire at {fire_at}")
+    except Exception as e:
+        logger.error(f"Failed to restore next_fire_at of CRON definition {def_id}: {e}", exc_info=True)
@@ -9,6 +9,7 @@ from external.db.session import get_db
 from external.db.impl import create_task_definition_repo, create_task_instance_repo, create_scheduled_task_repo
 from external.db.session import dialect
 from services.lifecycle_service import LifecycleService
+from services.schedule_timer import get_schedule_timer, due_timestamp
 from events.event_publisher import event_publisher
 from drivers.schedulers.cron_generator import CronGenerator
 
@@ -481,6 +482,7 @@ async def update_scheduled_task(
         updated = await repo.update_scheduled_task(task_id, **update_params)
         if not updated:
             raise HTTPException(status_code=404, detail=f"Scheduled task {task_id} not found")
+        get_schedule_timer().add(updated.id, due_timestamp(updated.scheduled_time, updated.execute_after))
         return updated
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -508,6 +510,7 @@ async def reschedule_task(
         )
         if not rescheduled:
             raise HTTPException(status_code=404, detail=f"Scheduled task {task_id} not found")
+        get_schedule_timer().add(rescheduled.id, due_timestamp(rescheduled.scheduled_time, rescheduled.execute_after))
         return rescheduled
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -527,6 +530,7 @@ async def cancel_scheduled_task(
 
     success = await repo.cancel_task(task_id)
     if success:
+        get_schedule_timer().discard(task_id)
         return TaskControlResponse(
             success=True,
             message=f"Successfully cancelled scheduled task {task_id}",
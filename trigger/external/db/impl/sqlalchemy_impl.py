@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_, or_
+from sqlalchemy import select, update, and_, or_, case
 
 from ..repo import TaskDefinitionRepo, TaskInstanceRepo, ScheduledTaskRepo
 from ..models import TaskDefinitionDB, TaskInstanceDB, ScheduledTaskDB
@@ -52,6 +52,35 @@ class SQLAlchemyTaskDefinitionRepo(TaskDefinitionRepo):
         await self.session.execute(stmt)
         await self.session.commit()
     
+    async def list_due_cron(self, now: datetime) -> List[TaskDefinitionDB]:
+        stmt = select(TaskDefinitionDB).where(
+            and_(
+                TaskDefinitionDB.is_active == True,
+                or_(
+                    TaskDefinitionDB.next_fire_at <= now,
+                    TaskDefinitionDB.next_fire_at.is_(None)
+                ),
+                TaskDefinitionDB.cron_expr != None
+            )
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def advance_next_fire_at(self, def_id: str, expected: Optional[datetime], next_fire_at: datetime, triggered_at: Optional[datetime] = None) -> bool:
+        values = {"next_fire_at": next_fire_at}
+        if triggered_at is not None:
+            values["last_triggered_at"] = triggered_at
+        current = TaskDefinitionDB.next_fire_at.is_(None) if expected is None else TaskDefinitionDB.next_fire_at == expected
+        stmt = update(TaskDefinitionDB).where(
+            and_(
+                TaskDefinitionDB.id == def_id,
+                current
+            )
+        ).values(**values)
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount > 0
+    
     async def deactivate(self, def_id: str) -> None:
         stmt = update(TaskDefinitionDB).where(
             TaskDefinitionDB.id == def_id
@@ -65,7 +94,8 @@ class SQLAlchemyTaskDefinitionRepo(TaskDefinitionRepo):
         stmt = update(TaskDefinitionDB).where(
             TaskDefinitionDB.id == def_id
         ).values(
-            is_active=True
+            is_active=True,
+            next_fire_at=None
         )
         await self.session.execute(stmt)
         await self.session.commit()
@@ -80,6 +110,9 @@ class SQLAlchemyTaskDefinitionRepo(TaskDefinitionRepo):
             return await self.get(def_id)
 
         update_values['updated_at'] = datetime.now(timezone.utc)
+        if 'cron_expr' in update_values or 'is_active' in update_values:
+            # 触发规则变化，由 cron_scheduler 重新计算下一次触发时间
+            update_values['next_fire_at'] = None
 
         stmt = update(TaskDefinitionDB).where(
             TaskDefinitionDB.id == def_id
@@ -204,17 +237,7 @@ class SQLAlchemyScheduledTaskRepo(ScheduledTaskRepo):
         """获取待处理的调度任务"""
         stmt = (
             select(ScheduledTaskDB)
-            .where(
-                and_(
-                    ScheduledTaskDB.status == "PENDING",
-                    ScheduledTaskDB.scheduled_time <= before_time,
-                    or_(
-                        ScheduledTaskDB.execute_after.is_(None),
-                        ScheduledTaskDB.execute_after <= before_time
-                    ),
-                    ScheduledTaskDB.cancelled_at.is_(None)
-                )
-            )
+            .where(self._is_due(before_time))
             .order_by(
                 ScheduledTaskDB.priority.desc(),
                 ScheduledTaskDB.scheduled_time.asc()
@@ -225,6 +248,139 @@ class SQLAlchemyScheduledTaskRepo(ScheduledTaskRepo):
         result = await self.session.execute(stmt)
         return result.scalars().all()
     
+    @staticmethod
+    def _is_due(before_time: datetime):
+        """待处理、未取消且在 before_time 之前到期"""
+        return and_(
+            ScheduledTaskDB.status == "PENDING",
+            ScheduledTaskDB.scheduled_time <= before_time,
+            or_(
+                ScheduledTaskDB.execute_after.is_(None),
+                ScheduledTaskDB.execute_after <= before_time
+            ),
+            ScheduledTaskDB.cancelled_at.is_(None)
+        )
+
+    async def get_pending_due_times(self, before_time: datetime) -> List[Tuple[str, datetime, Optional[datetime]]]:
+        """只取时间列，走 (status, scheduled_time) 索引"""
+        stmt = select(
+            ScheduledTaskDB.id,
+            ScheduledTaskDB.scheduled_time,
+            ScheduledTaskDB.execute_after
+        ).where(
+            and_(
+                ScheduledTaskDB.status == "PENDING",
+                ScheduledTaskDB.scheduled_time <= before_time,
+                ScheduledTaskDB.cancelled_at.is_(None)
+            )
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def claim_due_tasks(
+        self,
+        before_time: datetime,
+        owner: str,
+        lease_seconds: int,
+        limit: int = 100,
+        task_ids: Optional[List[str]] = None
+    ) -> List[ScheduledTaskDB]:
+        if task_ids is not None and not task_ids:
+            return []
+        due = select(ScheduledTaskDB.id).where(self._is_due(before_time))
+        if task_ids is not None:
+            due = due.where(ScheduledTaskDB.id.in_(task_ids))
+        # 其他扫描器已锁定的行直接跳过（SQLite 不支持行锁，由单条 UPDATE 保证原子性）
+        due = (
+            due.order_by(ScheduledTaskDB.priority.desc(), ScheduledTaskDB.scheduled_time.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        claim = (
+            update(ScheduledTaskDB)
+            .values(
+                status="SCHEDULED",
+                lease_owner=owner,
+                lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        if self.session.bind.dialect.update_returning:
+            # SQLite / PostgreSQL：UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING，一条语句完成
+            stmt = claim.where(
+                ScheduledTaskDB.id.in_(due),
+                ScheduledTaskDB.status == "PENDING"
+            ).returning(ScheduledTaskDB)
+            claimed = list((await self.session.scalars(stmt)).all())
+        else:
+            # MySQL：SELECT ... FOR UPDATE SKIP LOCKED 锁住的行在提交前只属于本事务
+            ids = list((await self.session.execute(due)).scalars().all())
+            claimed = []
+            if ids:
+                await self.session.execute(claim.where(ScheduledTaskDB.id.in_(ids)))
+                result = await self.session.execute(select(ScheduledTaskDB).where(ScheduledTaskDB.id.in_(ids)))
+                claimed = list(result.scalars().all())
+        await self.session.commit()
+
+        claimed.sort(key=lambda task: (-(task.priority or 0), task.scheduled_time))
+        return claimed
+
+    async def release_claims(self, task_ids: List[str], owner: str) -> None:
+        if not task_ids:
+            return
+        stmt = (
+            update(ScheduledTaskDB)
+            .where(
+                and_(
+                    ScheduledTaskDB.id.in_(task_ids),
+                    ScheduledTaskDB.lease_owner == owner
+                )
+            )
+            .values(lease_expires_at=None)
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def requeue_claims(self, task_ids: List[str], owner: str, error_msg: str) -> None:
+        if not task_ids:
+            return
+        exhausted = ScheduledTaskDB.retry_count + 1 >= ScheduledTaskDB.max_retries
+        stmt = (
+            update(ScheduledTaskDB)
+            .where(
+                and_(
+                    ScheduledTaskDB.id.in_(task_ids),
+                    ScheduledTaskDB.lease_owner == owner,
+                    ScheduledTaskDB.status == "SCHEDULED"
+                )
+            )
+            .values(
+                status=case((exhausted, "FAILED"), else_="PENDING"),
+                retry_count=ScheduledTaskDB.retry_count + 1,
+                error_msg=error_msg,
+                lease_owner=None,
+                lease_expires_at=None
+            )
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def recover_expired_claims(self, now: datetime) -> int:
+        stmt = (
+            update(ScheduledTaskDB)
+            .where(
+                and_(
+                    ScheduledTaskDB.status == "SCHEDULED",
+                    ScheduledTaskDB.lease_expires_at < now
+                )
+            )
+            .values(status="PENDING", lease_owner=None, lease_expires_at=None)
+        )
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount
+
     async def update_status(self, task_id: str, status: str) -> bool:
         """更新调度任务状态"""
         stmt = (
@@ -18,10 +18,16 @@ class TaskDefinitionDB(Base):
     loop_config = Column(JSON, default={})
     is_active = Column(Boolean, default=True)
     last_triggered_at = Column(DateTime(timezone=True), nullable=True)
+    # 下一次 CRON 触发时间，触发时推进；为空表示需要由 cron_scheduler 按 last_triggered_at 重新计算
+    next_fire_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
     is_temporary = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index('idx_task_definitions_active_next_fire', 'is_active', 'next_fire_at'),
+    )
+
 class TaskInstanceDB(Base):
     __tablename__ = "task_instances"
 
@@ -78,10 +84,15 @@ class ScheduledTaskDB(Base):
     retry_count = Column(Integer, default=0)
     cancelled_at = Column(DateTime(timezone=True), nullable=True)
     external_status_pushed = Column(Boolean, default=False)
+
+    # 扫描器租约：认领时写入，消息发出后清空 lease_expires_at；过期未清空的任务会被退回 PENDING
+    lease_owner = Column(String(128), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
     
     # 索引
     __table_args__ = (
         Index('idx_scheduled_tasks_status_scheduled_time', 'status', 'scheduled_time'),
+        Index('idx_scheduled_tasks_status_lease', 'status', 'lease_expires_at'),
         Index('idx_scheduled_tasks_trace_id', 'trace_id'),
         {'extend_existing': True}
     )
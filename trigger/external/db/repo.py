@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone
 
 
@@ -39,6 +39,19 @@ class TaskDefinitionRepo(ABC):
     async def update_last_triggered_at(self, def_id: str, last_triggered_at: datetime) -> None:
         """更新任务的最后触发时间"""
         pass
+
+    @abstractmethod
+    async def list_due_cron(self, now: datetime) -> List[any]:
+        """获取 next_fire_at 已到期或尚未计算的活跃 CRON 任务定义"""
+        pass
+
+    @abstractmethod
+    async def advance_next_fire_at(self, def_id: str, expected: Optional[datetime], next_fire_at: datetime, triggered_at: Optional[datetime] = None) -> bool:
+        """
+        仅当 next_fire_at 仍为 expected 时将其更新为 next_fire_at（传入 triggered_at 时同时记录触发时间）
+        返回是否更新成功，用于多个调度器之间互斥地触发同一次执行
+        """
+        pass
     
     @abstractmethod
     async def deactivate(self, def_id: str) -> None:
@@ -103,6 +116,41 @@ class ScheduledTaskRepo(ABC):
         """获取待处理的调度任务"""
         pass
     
+    @abstractmethod
+    async def get_pending_due_times(self, before_time: datetime) -> List[Tuple[str, datetime, Optional[datetime]]]:
+        """获取计划时间在 before_time 之前的待处理任务的 (id, scheduled_time, execute_after)，用于加载调度定时器"""
+        pass
+
+    @abstractmethod
+    async def claim_due_tasks(
+        self,
+        before_time: datetime,
+        owner: str,
+        lease_seconds: int,
+        limit: int = 100,
+        task_ids: Optional[List[str]] = None
+    ) -> List[any]:
+        """
+        原子地认领一批已到期的待处理任务：标记为 SCHEDULED 并写入租约，返回认领到的任务
+        多个扫描器并发认领时每个任务只会被其中一个认领到
+        """
+        pass
+
+    @abstractmethod
+    async def release_claims(self, task_ids: List[str], owner: str) -> None:
+        """消息已发出，结束租约（任务保持 SCHEDULED）"""
+        pass
+
+    @abstractmethod
+    async def requeue_claims(self, task_ids: List[str], owner: str, error_msg: str) -> None:
+        """消息发送失败，记一次重试并退回 PENDING（超过最大重试次数则置为 FAILED）"""
+        pass
+
+    @abstractmethod
+    async def recover_expired_claims(self, now: datetime) -> int:
+        """把租约已过期仍未结束的任务退回 PENDING（认领后进程退出的情况），返回退回的数量"""
+        pass
+
     @abstractmethod
     async def update_status(self, task_id: str, status: str) -> None:
         """更新调度任务状态"""
@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy import inspect, text
 from datetime import datetime, timezone
 from typing import AsyncGenerator
 import os
@@ -48,3 +49,18 @@ async def create_tables():
     from .models import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns, Base.metadata)
+
+
+def _add_missing_columns(sync_conn, metadata):
+    """已有表上补齐新增的可空列和索引（create_all 不会修改已存在的表）"""
+    inspector = inspect(sync_conn)
+    for table in metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
@@ -11,9 +11,18 @@ def get_message_broker() -> MessageBroker:
     上层调用者不需要知道具体实现类
     """
     if settings.message_broker_type == "redis":
-        return RedisMessageBroker(settings.redis_url)
+        return RedisMessageBroker(
+            settings.redis_url,
+            consume_concurrency=settings.message_consume_concurrency,
+            consume_batch_size=settings.message_prefetch,
+            max_retries=settings.message_max_retries
+        )
     elif settings.message_broker_type == "rabbitmq":
-        return RabbitMQDelayedMessageBroker(settings.rabbitmq_url)
+        return RabbitMQDelayedMessageBroker(
+            settings.rabbitmq_url,
+            prefetch=settings.message_prefetch,
+            consume_concurrency=settings.message_consume_concurrency
+        )
     else:
         raise ValueError(f"Unsupported message broker type: {settings.message_broker_type}")
 
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 
 class MessageBroker(ABC):
@@ -8,4 +8,9 @@ class MessageBroker(ABC):
     @abstractmethod
     async def publish_delayed(self, topic: str, message: Dict[str, Any], delay_sec: int) -> None: ...
     @abstractmethod
-    async def consume(self, topic: str, handler: callable) -> None: ...
\ No newline at end of file
+    async def consume(self, topic: str, handler: callable) -> None: ...
+
+    async def publish_many(self, topic: str, messages: List[Dict[str, Any]]) -> None:
+        """批量发送，返回时所有消息均已被接收；默认逐条发送，实现类可覆盖为一次往返"""
+        for message in messages:
+            await self.publish(topic, message)
@@ -1,69 +1,343 @@
 import json
 import asyncio
-from typing import Callable, Any
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Any, List, Optional
 from redis.asyncio import Redis
 from .base import MessageBroker
 
+logger = logging.getLogger(__name__)
+
+# 到期的延迟消息从有序集合移入主题队列（成员带 33 位唯一前缀，避免相同消息互相覆盖）
+_PROMOTE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(items) do
+    redis.call('LPUSH', KEYS[2], string.sub(member, 34))
+    redis.call('ZREM', KEYS[1], member)
+end
+local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {#items, head[2] or false}
+"""
+
+# 处理失败：记一次尝试，未超过上限时延迟重投，超过上限时转入死信队列
+_RETRY_SCRIPT = """
+local attempts = redis.call('HINCRBY', KEYS[3], ARGV[2], 1)
+redis.call('LREM', KEYS[1], 1, ARGV[1])
+if attempts > tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    redis.call('LPUSH', KEYS[4], ARGV[1])
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[5] .. ARGV[1])
+redis.call('SADD', KEYS[5], ARGV[6])
+return attempts
+"""
+
+# 把处理中列表里的消息按原顺序放回主题队列队尾（下一次最先被取出）
+_REQUEUE_SCRIPT = """
+local moved = 0
+while true do
+    local message = redis.call('LPOP', KEYS[1])
+    if not message then
+        break
+    end
+    redis.call('RPUSH', KEYS[2], message)
+    moved = moved + 1
+end
+return moved
+"""
+
+# 回收心跳已过期的消费者：其处理中列表里的消息放回主题队列
+_RECOVER_SCRIPT = """
+local moved = 0
+for _, consumer in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('EXISTS', ARGV[1] .. consumer) == 0 then
+        local processing = ARGV[2] .. consumer
+        while true do
+            local message = redis.call('LPOP', processing)
+            if not message then
+                break
+            end
+            redis.call('RPUSH', KEYS[2], message)
+            moved = moved + 1
+        end
+        redis.call('SREM', KEYS[1], consumer)
+    end
+end
+return moved
+"""
+
 
 class RedisMessageBroker(MessageBroker):
-    """基于Redis的消息队列实现"""
-    
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
+    """
+    基于Redis的消息队列实现
+    - 主题队列为 List：生产者 LPUSH，消费者 BLMOVE 到自己的处理中列表，处理成功后 LREM 确认
+    - 处理失败的消息延迟重投，超过 max_retries 次转入 {topic}:dead
+    - 消费者定期续约心跳，心跳过期的消费者（进程退出）处理中的消息会被放回主题队列
+    - 延迟消息写入有序集合 {topic}:delayed（score 为到期毫秒时间戳），由单个搬运协程用 Lua 原子地移入主题队列
+    """
+
+    DELAYED_TOPICS_KEY = "broker:delayed_topics"
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        consume_concurrency: int = 8,
+        consume_batch_size: int = 16,
+        max_retries: int = 3,
+        retry_delay_sec: float = 5.0,
+        delay_poll_interval: float = 1.0,
+        heartbeat_ttl: float = 30
+    ):
         self.redis_url = redis_url
         self.redis = None
-    
+        self.consume_concurrency = max(1, consume_concurrency)
+        self.consume_batch_size = max(1, consume_batch_size)
+        self.max_retries = max_retries
+        self.retry_delay_sec = retry_delay_sec
+        self.delay_poll_interval = delay_poll_interval
+        self.heartbeat_ttl = heartbeat_ttl
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._scripts = {}
+        self._mover: Optional[asyncio.Task] = None
+        self._mover_wakeup: Optional[asyncio.Event] = None
+
     async def __aenter__(self):
         await self.connect()
         return self
-    
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
-    
+
     async def connect(self):
         """连接到Redis服务器"""
         self.redis = await Redis.from_url(self.redis_url, decode_responses=True)
-    
+
     async def close(self):
         """关闭Redis连接"""
+        if self._mover:
+            self._mover.cancel()
+            self._mover = None
         if self.redis:
             await self.redis.close()
-    
+
     async def publish(self, topic: str, message: dict) -> None:
         """发送消息到指定主题"""
         if not self.redis:
             await self.connect()
         await self.redis.lpush(topic, json.dumps(message))
-    
+
+    async def publish_many(self, topic: str, messages: List[dict]) -> None:
+        """批量发送：一次 LPUSH 写入全部消息，按列表顺序被消费"""
+        if not messages:
+            return
+        if not self.redis:
+            await self.connect()
+        await self.redis.lpush(topic, *(json.dumps(message) for message in messages))
+
     async def publish_delayed(self, topic: str, message: dict, delay_sec: int) -> None:
         """
-        发送延迟消息
-        实际生产中建议用 Redis ZSET 实现，这里简化演示使用 asyncio.sleep
+        发送延迟消息：写入有序集合，重启后不丢失，到期后由搬运协程移入主题队列
         """
         if not self.redis:
             await self.connect()
-        
-        async def _delayed_publish():
-            await asyncio.sleep(delay_sec)
-            await self.redis.lpush(topic, json.dumps(message))
-        
-        asyncio.create_task(_delayed_publish())
-    
+        due_ms = int((time.time() + delay_sec) * 1000)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._delayed_key(topic), {self._delayed_member(json.dumps(message)): due_ms})
+            pipe.sadd(self.DELAYED_TOPICS_KEY, topic)
+            await pipe.execute()
+        self._ensure_mover()
+        # 可能比搬运协程当前等待的最早到期时间更早
+        self._mover_wakeup.set()
+
     async def consume(self, topic: str, handler: Callable) -> None:
-        """消费指定主题的消息"""
+        """
+        消费指定主题的消息：一次阻塞取一条，再在同一次往返中批量取出已就绪的消息，
+        交给 consume_concurrency 个并发处理协程
+        """
         if not self.redis:
             await self.connect()
-        
+        self._ensure_mover()
+
+        processing = self._processing_key(topic, self.consumer_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.consume_batch_size)
+        workers = [
+            asyncio.create_task(self._consume_worker(topic, processing, queue, handler))
+            for _ in range(self.consume_concurrency)
+        ]
+        heartbeat = asyncio.create_task(self._heartbeat(topic))
+        try:
+            while True:
+                try:
+                    data = await self.redis.blmove(topic, processing, 1, "RIGHT", "LEFT")
+                    if data is None:
+                        continue
+                    batch = [data]
+                    extra = min(self.consume_batch_size - 1, queue.maxsize - queue.qsize() - 1)
+                    if extra > 0:
+                        async with self.redis.pipeline(transaction=False) as pipe:
+                            for _ in range(extra):
+                                pipe.lmove(topic, processing, "RIGHT", "LEFT")
+                            batch.extend(item for item in await pipe.execute() if item is not None)
+                    for item in batch:
+                        await queue.put(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error fetching messages from {topic}: {e}")
+                    # 短暂休眠后继续
+                    await asyncio.sleep(0.1)
+        finally:
+            heartbeat.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(heartbeat, *workers, return_exceptions=True)
+            # 未处理完的消息放回主题队列，由其他消费者继续处理
+            try:
+                await self._run_script(_REQUEUE_SCRIPT, [processing, topic], [])
+                await self.redis.srem(self._consumers_key(topic), self.consumer_id)
+            except Exception as e:
+                logger.warning(f"Failed to requeue in-flight messages of {topic}: {e}")
+
+    async def _consume_worker(self, topic: str, processing: str, queue: asyncio.Queue, handler: Callable) -> None:
         while True:
+            data = await queue.get()
             try:
-                # 使用 BRPOP 阻塞式获取消息，超时1秒
-                result = await self.redis.brpop(topic, timeout=1)
-                if result:
-                    _, data = result
-                    msg = json.loads(data)
-                    await handler(msg)
+                await handler(json.loads(data))
             except asyncio.CancelledError:
-                break
+                raise
             except Exception as e:
-                print(f"Error processing message: {e}")
-                # 短暂休眠后继续
-                await asyncio.sleep(0.1)
\ No newline at end of file
+                logger.error(f"Error processing message from {topic}: {e}")
+                await self._retry(topic, processing, data)
+                continue
+            await self._ack(topic, processing, data)
+
+    async def _ack(self, topic: str, processing: str, data: str) -> None:
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lrem(processing, 1, data)
+                pipe.hdel(self._attempts_key(topic), self._digest(data))
+                await pipe.execute()
+        except Exception as e:
+            # 确认失败时消息留在处理中列表，消费者退出后会被重投
+            logger.warning(f"Failed to ack message from {topic}: {e}")
+
+    async def _retry(self, topic: str, processing: str, data: str) -> None:
+        try:
+            attempts = await self._run_script(
+                _RETRY_SCRIPT,
+                [processing, self._delayed_key(topic), self._attempts_key(topic), self._dead_key(topic), self.DELAYED_TOPICS_KEY],
+                [
+                    data,
+                    self._digest(data),
+                    self.max_retries,
+                    int((time.time() + self.retry_delay_sec) * 1000),
+                    self._delayed_member(""),
+                    topic,
+                ]
+            )
+            if not attempts:
+                logger.error(f"Message from {topic} failed {self.max_retries + 1} times, moved to {self._dead_key(topic)}")
+            else:
+                self._mover_wakeup.set()
+        except Exception as e:
+            logger.warning(f"Failed to requeue message from {topic}: {e}")
+
+    async def _heartbeat(self, topic: str) -> None:
+        """续约本消费者的心跳，并回收心跳已过期的消费者"""
+        consumers_key = self._consumers_key(topic)
+        while True:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self._heartbeat_key(topic, self.consumer_id), 1, px=int(self.heartbeat_ttl * 1000))
+                    pipe.sadd(consumers_key, self.consumer_id)
+                    await pipe.execute()
+                recovered = await self._run_script(
+                    _RECOVER_SCRIPT,
+                    [consumers_key, topic],
+                    [self._heartbeat_key(topic, ""), self._processing_key(topic, "")]
+                )
+                if recovered:
+                    logger.warning(f"Requeued {recovered} messages of {topic} from expired consumers")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Consumer heartbeat failed for {topic}: {e}")
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+
+    def _ensure_mover(self) -> None:
+        if self._mover is None or self._mover.done():
+            self._mover_wakeup = asyncio.Event()
+            self._mover = asyncio.create_task(self._move_delayed())
+
+    async def _move_delayed(self) -> None:
+        """
+        搬运协程：把所有主题中到期的延迟消息移入主题队列
+        每个进程一个；多个进程同时搬运也不会重复投递（Lua 原子执行）
+        """
+        batch = 500
+        while True:
+            timeout = self.delay_poll_interval
+            try:
+                self._mover_wakeup.clear()
+                now_ms = int(time.time() * 1000)
+                for topic in await self.redis.smembers(self.DELAYED_TOPICS_KEY):
+                    moved, next_due = await self._run_script(
+                        _PROMOTE_SCRIPT, [self._delayed_key(topic), topic], [now_ms, batch]
+                    )
+                    if moved >= batch:
+                        timeout = 0
+                    elif next_due:
+                        timeout = min(timeout, (float(next_due) - now_ms) / 1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error moving delayed messages: {e}")
+            if timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._mover_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_script(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        registered = self._scripts.get(script)
+        if registered is None:
+            registered = self._scripts[script] = self.redis.register_script(script)
+        return await registered(keys=keys, args=args)
+
+    @staticmethod
+    def _delayed_member(data: str) -> str:
+        return f"{uuid.uuid4().hex}|{data}"
+
+    @staticmethod
+    def _digest(data: str) -> str:
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    @staticmethod
+    def _delayed_key(topic: str) -> str:
+        return f"{topic}:delayed"
+
+    @staticmethod
+    def _attempts_key(topic: str) -> str:
+        return f"{topic}:attempts"
+
+    @staticmethod
+    def _dead_key(topic: str) -> str:
+        return f"{topic}:dead"
+
+    @staticmethod
+    def _consumers_key(topic: str) -> str:
+        return f"{topic}:consumers"
+
+    @staticmethod
+    def _heartbeat_key(topic: str, consumer_id: str) -> str:
+        return f"{topic}:consumer:{consumer_id}"
+
+    @staticmethod
+    def _processing_key(topic: str, consumer_id: str) -> str:
+        return f"{topic}:processing:{consumer_id}"
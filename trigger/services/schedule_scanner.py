@@ -3,10 +3,16 @@ from datetime import datetime, timezone, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 import json
 import logging
+import os
+import socket
+import time
+import uuid
+from typing import Optional
 
 from external.db.impl import create_scheduled_task_repo
 from external.db.session import dialect, async_session_factory
 from external.messaging.base import MessageBroker
+from .schedule_timer import ScheduleTimer, get_schedule_timer, due_timestamp
 
 logger = logging.getLogger(__name__)
 def get_root_agent_id(definition_id: str) -> str:
@@ -25,11 +31,32 @@ def get_root_agent_id(definition_id: str) -> str:
 
 
 class ScheduleScanner:
-    """调度扫描器 - 发现需要执行的任务并推送到外部系统"""
+    """
+    调度扫描器 - 发现需要执行的任务并推送到外部系统
+
+    到期时间由进程内的 ScheduleTimer（最小堆）维护，扫描器在最早到期时刻被唤醒，分发精度不受扫描间隔限制。
+    数据库仍是唯一可信来源：每隔 scan_interval 秒把 preload_horizon 秒内到期的待处理任务加载进定时器，
+    兜底其他进程写入或直接改库的任务；分发前在数据库中按 ID 认领（写入租约），
+    已取消、已被处理或已被其他副本认领的任务不会被分发，因此可以同时运行多个副本。
+    """
     
-    def __init__(self, broker: MessageBroker, scan_interval: int = 10):
+    def __init__(
+        self,
+        broker: MessageBroker,
+        scan_interval: int = 10,
+        preload_horizon: int = 3600,
+        batch_size: int = 100,
+        lease_seconds: int = 60,
+        timer: Optional[ScheduleTimer] = None
+    ):
         self.broker = broker
         self.scan_interval = scan_interval
+        self.preload_horizon = preload_horizon
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        # 租约持有者标识，多个 trigger 副本各自认领不同的任务
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.timer = timer or get_schedule_timer()
         self.is_running = False
     
     async def start(self):
@@ -37,10 +64,14 @@ class ScheduleScanner:
         self.is_running = True
         logger.info("Schedule scanner started")
         
+        next_sync = 0.0
         while self.is_running:
             try:
-                await self._scan_pending_tasks()
-                await asyncio.sleep(self.scan_interval)
+                if time.monotonic() >= next_sync:
+                    await self._load_from_db()
+                    next_sync = time.monotonic() + self.scan_interval
+                await self._dispatch_due_tasks()
+                await self.timer.wait(next_sync - time.monotonic())
             except Exception as e:
                 logger.error(f"Error in schedule scanner: {e}", exc_info=True)
                 await asyncio.sleep(60)  # 出错时等待更长时间
@@ -51,59 +82,83 @@ class ScheduleScanner:
         logger.info("Schedule scanner stopped")
     
     async def _scan_pending_tasks(self):
-        """扫描待处理任务"""
+        """扫描待处理任务：从数据库加载后立即分发已到期的任务"""
+        await self._load_from_db()
+        await self._dispatch_due_tasks()
+
+    async def _load_from_db(self):
+        """退回租约过期的任务，再把 preload_horizon 秒内到期的待处理任务登记到定时器"""
         async with async_session_factory() as session:
             repo = create_scheduled_task_repo(session, dialect)
+            recovered = await repo.recover_expired_claims(datetime.now(timezone.utc))
+            if recovered:
+                logger.warning(f"Recovered {recovered} scheduled tasks with expired leases")
+            horizon = datetime.now(timezone.utc) + timedelta(seconds=self.preload_horizon)
+            rows = await repo.get_pending_due_times(before_time=horizon)
+
+        for task_id, scheduled_time, execute_after in rows:
+            self.timer.add(task_id, due_timestamp(scheduled_time, execute_after))
+        logger.debug(f"Loaded {len(rows)} pending tasks due before {horizon}, {len(self.timer)} in timer")
+
+    async def _dispatch_due_tasks(self):
+        """
+        分发定时器中已到期的任务：每批先在数据库中原子认领，再批量发送
+        发送成功后结束租约；发送失败的任务退回 PENDING，由下次加载重新登记
+        """
+        while True:
+            task_ids = self.timer.pop_due(limit=self.batch_size)
+            if not task_ids:
+                return
 
-            # 查找需要执行的任务
-            now = datetime.now(timezone.utc)
-            logger.debug(f"Scanning for pending tasks before {now}")
-            pending_tasks = await repo.get_pending_tasks(
-                before_time=now,
-                limit=100
-            )
-
-            logger.info(f"Found {len(pending_tasks)} pending tasks to process")
-            
-            for task in pending_tasks:
+            async with async_session_factory() as session:
+                repo = create_scheduled_task_repo(session, dialect)
+                claimed = await repo.claim_due_tasks(
+                    before_time=datetime.now(timezone.utc),
+                    owner=self.owner,
+                    lease_seconds=self.lease_seconds,
+                    limit=len(task_ids),
+                    task_ids=task_ids
+                )
+                if not claimed:
+                    continue
+
+                claimed_ids = [task.id for task in claimed]
                 try:
-                    # 更新状态为已调度
-                    await repo.update_status(task.id, "SCHEDULED")
-
-                    # 从 input_params 中提取 user_id
-                    input_params = task.input_params or {}
-                    user_id = input_params.get("_user_id", "system")
-
-                    # 获取根节点 agent_id
-                    agent_id = get_root_agent_id(task.definition_id)
-
-                    # 构建执行消息（匹配 tasks 端 callback 期望的格式）
-                    execute_msg = {
-                        "msg_type": "START_TASK",
-                        "task_id": task.trace_id or str(task.id),  # 使用 trace_id 作为任务标识
-                        "user_input": input_params.get("description", ""),  # 任务描述作为 user_input
-                        "user_id": user_id,
-                        "agent_id": agent_id,  # 根节点 agent_id
-                        # 附加调度相关信息
-                        "schedule_meta": {
-                            "definition_id": task.definition_id,
-                            "scheduled_time": task.scheduled_time.isoformat(),
-                            "round_index": task.round_index,
-                            "schedule_config": task.schedule_config,
-                            "input_params": input_params
-                        }
-                    }
-                    
                     # 推送到消息队列
-                    await self.broker.publish("work.excute", execute_msg)
-                    
-                    logger.debug(f"Scheduled task {task.id} for execution")
-                    
+                    await self.broker.publish_many("work.excute", [self._build_execute_msg(task) for task in claimed])
                 except Exception as e:
-                    logger.error(f"Failed to schedule task {task.id}: {e}")
-                    
+                    logger.error(f"Failed to schedule {len(claimed_ids)} tasks: {e}")
                     # 记录重试
-                    await repo.record_retry(task.id, str(e))
+                    await repo.requeue_claims(claimed_ids, self.owner, str(e))
+                    continue
+
+                await repo.release_claims(claimed_ids, self.owner)
+                logger.info(f"Scheduled {len(claimed_ids)} tasks for execution")
+
+    def _build_execute_msg(self, task) -> dict:
+        # 从 input_params 中提取 user_id
+        input_params = task.input_params or {}
+        user_id = input_params.get("_user_id", "system")
+
+        # 获取根节点 agent_id
+        agent_id = get_root_agent_id(task.definition_id)
+
+        # 构建执行消息（匹配 tasks 端 callback 期望的格式）
+        return {
+            "msg_type": "START_TASK",
+            "task_id": task.trace_id or str(task.id),  # 使用 trace_id 作为任务标识
+            "user_input": input_params.get("description", ""),  # 任务描述作为 user_input
+            "user_id": user_id,
+            "agent_id": agent_id,  # 根节点 agent_id
+            # 附加调度相关信息
+            "schedule_meta": {
+                "definition_id": task.definition_id,
+                "scheduled_time": task.scheduled_time.isoformat(),
+                "round_index": task.round_index,
+                "schedule_config": task.schedule_config,
+                "input_params": input_params
+            }
+        }
     
     async def scan_and_dispatch_immediate(self):
         """立即扫描并分发任务（用于手动触发）"""
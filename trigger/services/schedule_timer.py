@@ -0,0 +1,109 @@
+"""
+调度定时器（进程内最小堆）
+- 按到期时间维护待执行的调度任务，ScheduleScanner 在最早到期时刻被唤醒并分发
+- SchedulerService 写入调度任务后登记到这里，扫描器启动和兜底扫描时从数据库加载
+- 堆只是时间索引，分发前仍以数据库中的任务状态为准；重复登记同一任务以最后一次为准
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+def to_timestamp(value: datetime) -> float:
+    """数据库中不带时区的时间按 UTC 处理"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def due_timestamp(scheduled_time: datetime, execute_after: Optional[datetime] = None) -> float:
+    """任务的实际到期时间：scheduled_time 与 execute_after 中较晚的一个"""
+    due = to_timestamp(scheduled_time)
+    if execute_after is not None:
+        due = max(due, to_timestamp(execute_after))
+    return due
+
+
+class ScheduleTimer:
+    """
+    调度任务的到期时间堆（在事件循环线程中使用）
+    更新到期时间时不从堆中删除旧项，弹出时与 _due 对比丢弃过期项
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def add(self, task_id: str, due: float) -> None:
+        """登记或更新任务的到期时间（Unix 时间戳，秒）"""
+        if self._due.get(task_id) == due:
+            return
+        earliest = self.next_due()
+        self._due[task_id] = due
+        heapq.heappush(self._heap, (due, next(self._seq), task_id))
+        # 比当前最早的任务还早，唤醒等待中的扫描器重新计算等待时间
+        if self._wakeup is not None and (earliest is None or due < earliest):
+            self._wakeup.set()
+
+    def discard(self, task_id: str) -> None:
+        self._due.pop(task_id, None)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """弹出已到期的任务 ID，按到期时间先后排列"""
+        now = time.time() if now is None else now
+        task_ids: List[str] = []
+        while self._heap and (limit is None or len(task_ids) < limit):
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, task_id = heapq.heappop(self._heap)
+            del self._due[task_id]
+            task_ids.append(task_id)
+        return task_ids
+
+    async def wait(self, timeout: float) -> None:
+        """等待到最早的任务到期、有更早的任务登记或超时"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.clear()
+        next_due = self.next_due()
+        if next_due is not None:
+            timeout = min(timeout, next_due - time.time())
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _drop_stale(self) -> None:
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        # 大量更新后旧项过多时整体重建
+        if len(heap) > 2 * len(self._due) + 1024:
+            self._heap = [(due, next(self._seq), task_id) for task_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+
+_schedule_timer: Optional[ScheduleTimer] = None
+
+
+def get_schedule_timer() -> ScheduleTimer:
+    """获取进程内的调度定时器（API 写入与扫描器共用）"""
+    global _schedule_timer
+    if _schedule_timer is None:
+        _schedule_timer = ScheduleTimer()
+    return _schedule_timer
@@ -8,6 +8,7 @@ from common.models import ScheduleType, TaskStatus, ScheduledTask
 from external.db.impl import create_scheduled_task_repo, create_task_definition_repo
 from external.db.session import dialect
 from external.messaging.base import MessageBroker
+from .schedule_timer import get_schedule_timer, due_timestamp
 
 
 class SchedulerService:
@@ -48,6 +49,8 @@ class SchedulerService:
         
         # 保存到数据库，只负责写
         db_task = await repo.create(scheduled_task)
+        # 登记到进程内定时器，到期时由 ScheduleScanner 立即分发
+        get_schedule_timer().add(db_task.id, due_timestamp(scheduled_time))
         return db_task.id
     
     async def schedule_immediate(
@@ -43,7 +43,7 @@ def load_updates(path: str) -> List[Dict[str, Any]]:
 
 
 def update_batch(
-    driver,
+    session,
     rows: List[Dict[str, Any]],
     report_missing: bool,
 ) -> Tuple[int, List[int]]:
@@ -59,25 +59,24 @@ def update_batch(
         RETURN count(n) AS updated
         """
 
-    with driver.session() as session:
-        result = session.run(update_query, {"rows": rows})
-        record = result.single()
-        updated = record["updated"] if record else 0
-
-        if report_missing:
-            # 查询哪些 identity 实际存在
-            find_query = """
-            UNWIND $identities AS iid
-            MATCH (n) WHERE id(n) = iid
-            RETURN id(n) AS identity
-            """
-            identities = [r["identity"] for r in rows]
-            found_result = session.run(find_query, {"identities": identities})
-            found_set = {record["identity"] for record in found_result}
-
-            missing_identities = [
-                r["identity"] for r in rows if r["identity"] not in found_set
-            ]
+    # 每批一个托管写事务（瞬时错误由驱动自动重试）
+    record = session.execute_write(lambda tx: tx.run(update_query, {"rows": rows}).single())
+    updated = record["updated"] if record else 0
+
+    if report_missing:
+        # 查询哪些 identity 实际存在
+        find_query = """
+        UNWIND $identities AS iid
+        MATCH (n) WHERE id(n) = iid
+        RETURN id(n) AS identity
+        """
+        identities = [r["identity"] for r in rows]
+        found_result = session.run(find_query, {"identities": identities})
+        found_set = {record["identity"] for record in found_result}
+
+        missing_identities = [
+            r["identity"] for r in rows if r["identity"] not in found_set
+        ]
 
     return updated, missing_identities
 
@@ -85,7 +84,7 @@ def update_batch(
 def main() -> int:
     # 直接定义参数值，无需控制台传入
     json_path = "records (1)(4).json"
-    batch_size = 200
+    batch_size = 1000
     report_missing = False
     
     # Neo4j 连接信息
@@ -110,11 +109,13 @@ def main() -> int:
         total_updated = 0
         all_missing = []
 
-        for i in range(0, len(rows), batch_size):
-            batch = rows[i : i + batch_size]
-            updated, missing = update_batch(driver, batch, report_missing)
-            total_updated += updated
-            all_missing.extend(missing)
+        # 所有批次复用同一个会话
+        with driver.session() as session:
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i : i + batch_size]
+                updated, missing = update_batch(session, batch, report_missing)
+                total_updated += updated
+                all_missing.extend(missing)
 
         print(f"✅ Updated nodes: {total_updated}/{len(rows)}")
         if report_missing and all_missing: